@@ -0,0 +1,78 @@
+"""
+Runs every benchmark and prints one JSON document, tagged with the commit and environment it was measured on.
+
+    python -m benchmarks [--quick] [--output results.json]
+
+Compare two result files from different releases to spot regressions; --quick uses smaller sizes for a smoke run.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks import (bench_balancer, bench_dns, bench_engine, bench_http_proxy, bench_pac, bench_parser,
+                        bench_router, bench_startup, bench_storage, bench_subscription, bench_tunnel, bench_ui)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(quick: bool) -> dict:
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "ss_local": shutil.which('ss-local') is not None,
+        "ss_server": shutil.which('ss-server') is not None,
+        "benchmarks": [],
+    }
+    suites = [
+        ("tunnel", lambda: bench_tunnel.run(3 if quick else 10, 10 if quick else 50, 8 if quick else 32)),
+        ("parse_access_key", lambda: bench_parser.run(10_000 if quick else 100_000)),
+        ("storage", lambda: bench_storage.run([10, 1000] if quick else [10, 1000, 100_000], 2 if quick else 5)),
+        ("subscription", lambda: bench_subscription.run(1000 if quick else 10_000, 1.0, "base64")),
+        ("pac", lambda: bench_pac.run(5000 if quick else 50_000, 500 if quick else 5000, 100_000)),
+        ("router", lambda: bench_router.run(10_000 if quick else 100_000, 5000 if quick else 50_000, 100_000,
+                                            50 if quick else 200)),
+        ("engine_throughput", lambda: asyncio.run(bench_engine.run(8 if quick else 64, 4, "chacha20-ietf-poly1305"))),
+        ("startup", lambda: bench_startup.run(3 if quick else 10, 1000)),
+        ("server_list_ui", lambda: bench_ui.run([1000] if quick else [1000, 10_000], 10_000)),
+        ("balancer_throughput", lambda: asyncio.run(bench_balancer.run(3, 6 if quick else 12, 4 if quick else 16,
+                                                                       bench_balancer.POLICIES[0]))),
+        ("http_proxy_throughput", lambda: asyncio.run(bench_http_proxy.run(2 if quick else 4, 8 if quick else 64,
+                                                                           3))),
+        ("dns", lambda: asyncio.run(bench_dns.run(2000, 5000 if quick else 20_000, 40, 32))),
+    ]
+    for name, suite in suites:
+        print(f"Running {name}...", file=sys.stderr)
+        try:
+            results["benchmarks"].append(suite())
+        except Exception as e:
+            results["benchmarks"].append({"benchmark": name, "error": str(e) or e.__class__.__name__})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Use smaller sizes for a fast smoke run.")
+    parser.add_argument("--output", help="Also write the results to this file.")
+    args = parser.parse_args()
+    output = json.dumps(run(args.quick), indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Measures aggregate download throughput through the load balancer against a single tunnel.
+
+Every upstream server and tunnel runs in its own process (ss-server/ss-local when installed, otherwise the
+stand-ins from benchmarks/testbed.py), so the numbers reflect the balancer rather than one shared event loop.
+
+    python -m benchmarks.bench_balancer [--backends 3] [--streams 12] [--size-mb 16] [--policy round-robin]
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import time
+
+from benchmarks.testbed import download_through_socks
+from core.balancer import LoadBalancer, POLICIES
+from core.prober import wait_for_listener
+from utils.network import allocate_port
+
+PASSWORD = "benchmark"
+METHOD = "chacha20-ietf-poly1305"
+
+
+async def spawn(*args) -> tuple:
+    """Starts a testbed stand-in in a subprocess and returns (process, port)."""
+    process = await asyncio.create_subprocess_exec(sys.executable, '-m', 'benchmarks.testbed', *args,
+                                                   stdout=subprocess.PIPE)
+    port = int((await process.stdout.readline()).decode())
+    return process, port
+
+
+async def spawn_tunnel(local_port: int, server_port: int):
+    if shutil.which('ss-local'):
+        process = await asyncio.create_subprocess_exec(
+            'ss-local', '-s', '127.0.0.1', '-p', str(server_port), '-l', str(local_port), '-k', PASSWORD,
+            '-m', METHOD, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        await wait_for_listener(local_port, process, 5)
+        return process
+    process, _ = await spawn('tunnel', str(local_port), str(server_port), PASSWORD, METHOD)
+    return process
+
+
+async def measure(proxy_port: int, target_port: int, size: int, streams: int) -> dict:
+    start = time.perf_counter()
+    await asyncio.gather(*(download_through_socks(proxy_port, target_port, size) for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "mb_per_s": round(size * streams / elapsed / 1e6, 2)}
+
+
+async def run(backends: int, streams: int, size_mb: int, policy: str) -> dict:
+    size = size_mb * 1_000_000
+    processes = []
+    http_process, target_port = await spawn('http')
+    processes.append(http_process)
+
+    tunnel_ports = []
+    for _ in range(backends):
+        server_process, server_port = await spawn('ss-server', PASSWORD, METHOD)
+        port = allocate_port()
+        processes += [server_process, await spawn_tunnel(port, server_port)]
+        tunnel_ports.append(port)
+
+    results = {"benchmark": "balancer_throughput", "policy": policy, "backends": backends, "streams": streams,
+               "size_mb": size_mb, "single_tunnel": await measure(tunnel_ports[0], target_port, size, streams)}
+
+    balancer = LoadBalancer(allocate_port(), policy, [f"http://127.0.0.1:{target_port}/"])
+    await balancer.start()
+    for index, tunnel_port in enumerate(tunnel_ports):
+        balancer.add_backend(str(index), tunnel_port)
+    results["balanced"] = await measure(balancer.listen_port, target_port, size, streams)
+    results["connections_per_backend"] = [b["total_connections"] for b in balancer.snapshot()]
+    await balancer.stop()
+
+    for process in processes:
+        process.terminate()
+        await process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--streams", type=int, default=12)
+    parser.add_argument("--size-mb", type=int, default=16)
+    parser.add_argument("--policy", choices=POLICIES, default=POLICIES[0])
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.backends, args.streams, args.size_mb, args.policy)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Measures the tunneled DNS resolver: answer latency from the cache against lookups through the tunnel, the hit rate
+on a workload where a few names are asked for far more often than the rest, and how many upstream lookups
+coalescing saves when many clients ask for the same name at once.
+
+The upstream resolver is a local DNS-over-TCP stand-in, reached through a plain SOCKS5 server, that answers after
+--rtt-ms to model the tunnel's round trip; clients query the resolver over UDP as a system resolver would.
+
+    python -m benchmarks.bench_dns [--names 2000] [--queries 20000] [--rtt-ms 40] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+import time
+
+from benchmarks.testbed import start_plain_socks_server, summarize
+from core.dns_proxy import HEADER, DnsResolver
+from utils.network import allocate_port, release_port
+
+TYPE_A = 1
+
+
+def make_query(name: str, query_id: int = 0) -> bytes:
+    question = b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\x00"
+    return HEADER.pack(query_id, 0x0100, 1, 0, 0, 0) + question + struct.pack("!HH", TYPE_A, 1)
+
+
+async def start_upstream(rtt: float):
+    """
+    Starts the DNS-over-TCP stand-in and returns (server, port, lookups), where lookups counts the queries it
+    answered. Names starting with "nx" do not exist; every other name has one A record with a TTL of an hour.
+    """
+    lookups = [0]
+
+    async def answer(writer, query: bytes):
+        await asyncio.sleep(rtt)
+        lookups[0] += 1
+        question = query[12:]
+        if question[1:3] == b"nx":
+            soa = (b"\xc0\x0c" + struct.pack("!HHIH", 6, 1, 300, 22) + b"\x00\x00"
+                   + struct.pack("!IIIII", 1, 3600, 600, 86400, 300))
+            response = HEADER.pack(int.from_bytes(query[:2], 'big'), 0x8183, 1, 0, 1, 0) + question + soa
+        else:
+            record = b"\xc0\x0c" + struct.pack("!HHIH", TYPE_A, 1, 3600, 4) + bytes([10, 0, 0, 1])
+            response = HEADER.pack(int.from_bytes(query[:2], 'big'), 0x8180, 1, 1, 0, 0) + question + record
+        writer.write(len(response).to_bytes(2, 'big') + response)
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                length = int.from_bytes(await reader.readexactly(2), 'big')
+                asyncio.create_task(answer(writer, await reader.readexactly(length)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1], lookups
+
+
+class Client(asyncio.DatagramProtocol):
+    """A UDP stub resolver that matches responses to its outstanding queries by ID."""
+
+    def __init__(self):
+        self.transport = None
+        self.pending = {}
+        self.next_id = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        future = self.pending.pop(int.from_bytes(data[:2], 'big'), None)
+        if future and not future.done():
+            future.set_result(data)
+
+    async def query(self, name: str) -> float:
+        """Resolves one name and returns the time it took in ms."""
+        self.next_id = (self.next_id + 1) % 65536
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        start = time.perf_counter()
+        self.transport.sendto(make_query(name, self.next_id))
+        await asyncio.wait_for(future, 10)
+        return (time.perf_counter() - start) * 1000
+
+
+async def run_workload(client: Client, names: list, weights: list, queries: int, concurrency: int) -> list:
+    rng = random.Random(7)
+    picks = rng.choices(names, weights, k=queries)
+    latencies = []
+
+    async def worker(offset: int):
+        for name in picks[offset::concurrency]:
+            latencies.append(await client.query(name))
+
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return latencies
+
+
+async def measure(socks_port: int, upstream_port: int, lookups: list, names: list, weights: list, queries: int,
+                  concurrency: int, cache_size: int) -> dict:
+    resolver = DnsResolver(allocate_port(), socks_port, servers=(("127.0.0.1", upstream_port),),
+                           cache_size=cache_size)
+    await resolver.start()
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(Client, remote_addr=('127.0.0.1', resolver.listen_port))
+    try:
+        lookups[0] = 0
+        cold = [await client.query(f"cold{i}.example.com") for i in range(20)]
+        hot = [await client.query(f"cold{i % 20}.example.com") for i in range(200)]
+
+        lookups[0] = 0
+        before = dict(resolver.counts)
+        latencies = await run_workload(client, names, weights, queries, concurrency)
+        workload_lookups = lookups[0]
+        hits = resolver.counts["cache_hits"] - before["cache_hits"]
+        misses = resolver.counts["misses"] - before["misses"]
+
+        lookups[0] = 0
+        burst = [await task for task in [asyncio.ensure_future(client.query("burst.example.com"))
+                                         for _ in range(100)]]
+        return {"cold_query_ms": summarize(cold), "cached_query_ms": summarize(hot),
+                "workload": {"queries": queries, "hit_rate": round(hits / (hits + misses), 3),
+                             "upstream_lookups": workload_lookups, "query_ms": summarize(latencies)},
+                "burst": {"queries": len(burst), "upstream_lookups": lookups[0]},
+                "resolver_stats": resolver.stats()}
+    finally:
+        transport.close()
+        await resolver.stop()
+        release_port(resolver.listen_port)
+
+
+async def run(names: int, queries: int, rtt_ms: float, concurrency: int) -> dict:
+    upstream, upstream_port, lookups = await start_upstream(rtt_ms / 1000)
+    socks_server, socks_port = await start_plain_socks_server()
+    # Popularity follows Zipf's law, as it does for real lookups; one name in ten does not exist.
+    domains = [f"{'nx' if i % 10 == 9 else 'host'}{i}.example.com" for i in range(names)]
+    weights = [1 / (rank + 1) for rank in range(names)]
+    try:
+        return {"benchmark": "dns", "names": names, "rtt_ms": rtt_ms, "concurrency": concurrency,
+                "cached": await measure(socks_port, upstream_port, lookups, domains, weights, queries, concurrency,
+                                        10_000),
+                # Every entry is evicted as it is stored, leaving only coalescing of identical in-flight queries.
+                "uncached": await measure(socks_port, upstream_port, lookups, domains, weights, queries, concurrency,
+                                          0)}
+    finally:
+        # Let the SOCKS5 server see the resolvers' upstream connections close before it goes away.
+        await asyncio.sleep(0.1)
+        socks_server.close()
+        upstream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=20_000)
+    parser.add_argument("--rtt-ms", type=float, default=40)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.names, args.queries, args.rtt_ms, args.concurrency)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
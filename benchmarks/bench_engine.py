@@ -0,0 +1,95 @@
+"""
+Compares the throughput of the built-in Shadowsocks engine with ss-local on loopback.
+
+Both clients talk to the same upstream: the real ss-server if it is installed, otherwise the Python stand-in from
+benchmarks/testbed.py (which is then usually the bottleneck, so compare the two clients relative to each other).
+
+    python -m benchmarks.bench_engine [--size-mb 64] [--streams 4] [--method chacha20-ietf-poly1305]
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import subprocess
+import time
+
+from benchmarks.testbed import download_through_socks, start_http_target, start_ss_server
+from core.prober import wait_for_listener
+from core.ss_engine import NativeTunnel
+from utils.network import allocate_port
+
+PASSWORD = "benchmark"
+
+
+async def measure(proxy_port: int, target_port: int, size: int, streams: int) -> dict:
+    start = time.perf_counter()
+    await asyncio.gather(*(download_through_socks(proxy_port, target_port, size) for _ in range(streams)))
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "mb_per_s": round(size * streams / elapsed / 1e6, 2)}
+
+
+async def start_upstream(method: str):
+    """Returns (port, cleanup coroutine function) for the real ss-server or the Python stand-in."""
+    if shutil.which('ss-server'):
+        port = allocate_port()
+        process = await asyncio.create_subprocess_exec(
+            'ss-server', '-s', '127.0.0.1', '-p', str(port), '-k', PASSWORD, '-m', method,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        await wait_for_listener(port, process, 5)
+
+        async def cleanup():
+            process.terminate()
+            await process.wait()
+
+        return port, "ss-server", cleanup
+    server, port = await start_ss_server(PASSWORD, method)
+
+    async def cleanup():
+        server.close()
+
+    return port, "python-stand-in", cleanup
+
+
+async def run(size_mb: int, streams: int, method: str) -> dict:
+    size = size_mb * 1_000_000
+    http_server, target_port = await start_http_target()
+    upstream_port, upstream_kind, cleanup = await start_upstream(method)
+    config = {"server": "127.0.0.1", "server_port": upstream_port, "password": PASSWORD, "method": method}
+    results = {"benchmark": "engine_throughput", "method": method, "upstream": upstream_kind,
+               "size_mb": size_mb, "streams": streams}
+
+    native = NativeTunnel(config, allocate_port())
+    await native.start()
+    results["native"] = await measure(native.local_port, target_port, size, streams)
+    await native.stop()
+
+    if shutil.which('ss-local'):
+        local_port = allocate_port()
+        process = await asyncio.create_subprocess_exec(
+            'ss-local', '-s', '127.0.0.1', '-p', str(upstream_port), '-l', str(local_port),
+            '-k', PASSWORD, '-m', method, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        await wait_for_listener(local_port, process, 5)
+        results["ss_local"] = await measure(local_port, target_port, size, streams)
+        process.terminate()
+        await process.wait()
+    else:
+        results["ss_local"] = None
+
+    await cleanup()
+    http_server.close()
+    # Let the relays see EOF and finish before asyncio.run() cancels what is left.
+    await asyncio.sleep(0.1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--method", default="chacha20-ietf-poly1305")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.size_mb, args.streams, args.method)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
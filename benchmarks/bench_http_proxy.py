@@ -0,0 +1,87 @@
+"""
+Measures download throughput through the HTTP proxy front-end against the SOCKS5 port it bridges into.
+
+The target, the SOCKS5 server standing in for the tunnel and the HTTP proxy each run in their own process, so
+the difference between "socks" and the proxy modes is the cost of the extra hop. The proxy is measured relaying
+CONNECT tunnels with os.splice() where available ("connect_zero_copy") and with pooled buffers ("connect_pooled"),
+and forwarding plain http:// requests; "socks_via_streams" puts the same hop in front of the SOCKS5 port as an
+asyncio streams relay (the PortForwarder), for comparison. Throughput is shared with the stand-ins on small
+machines, so each mode also reports the CPU time its hop process spent per megabyte relayed.
+
+    python -m benchmarks.bench_http_proxy [--streams 4] [--size-mb 64] [--runs 3]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import psutil
+
+from benchmarks.testbed import download_through_http_proxy, download_through_socks, spawn_stand_in, summarize
+from core.relay import CAN_SPLICE
+
+
+def cpu_seconds(process) -> float:
+    times = psutil.Process(process.pid).cpu_times()
+    return times.user + times.system
+
+
+async def measure(download, size: int, streams: int, runs: int, hop=None) -> dict:
+    """Runs the downloads and reports throughput and, if given, the CPU time of the hop process per MB."""
+    rates = []
+    cpu_before = cpu_seconds(hop) if hop else 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        await asyncio.gather(*(download() for _ in range(streams)))
+        rates.append(size * streams / (time.perf_counter() - start) / 1e6)
+    result = {"mb_per_s": summarize(rates)}
+    if hop:
+        result["hop_cpu_ms_per_mb"] = round((cpu_seconds(hop) - cpu_before) * 1000 / (size * streams * runs / 1e6), 3)
+    return result
+
+
+async def run(streams: int, size_mb: int, runs: int) -> dict:
+    size = size_mb * 1_000_000
+    target, target_port = spawn_stand_in('http')
+    socks_server, socks_port = spawn_stand_in('socks')
+    zero_copy, zero_copy_port = spawn_stand_in('http-proxy', str(socks_port), 'zero-copy')
+    pooled, pooled_port = spawn_stand_in('http-proxy', str(socks_port), 'pooled')
+    forwarder, forwarder_port = spawn_stand_in('forwarder', str(socks_port))
+    try:
+        results = {"benchmark": "http_proxy_throughput", "streams": streams, "size_mb": size_mb,
+                   "splice_available": CAN_SPLICE,
+                   "socks": await measure(lambda: download_through_socks(socks_port, target_port, size),
+                                          size, streams, runs),
+                   "socks_via_streams": await measure(
+                       lambda: download_through_socks(forwarder_port, target_port, size), size, streams, runs,
+                       forwarder),
+                   "connect_zero_copy": await measure(
+                       lambda: download_through_http_proxy(zero_copy_port, target_port, size), size, streams, runs,
+                       zero_copy),
+                   "connect_pooled": await measure(
+                       lambda: download_through_http_proxy(pooled_port, target_port, size), size, streams, runs,
+                       pooled),
+                   "forward": await measure(
+                       lambda: download_through_http_proxy(zero_copy_port, target_port, size, tunnel=False),
+                       size, streams, runs, zero_copy)}
+    finally:
+        for process in (target, socks_server, zero_copy, pooled, forwarder):
+            process.terminate()
+            process.wait()
+    baseline = results["socks"]["mb_per_s"]["median"]
+    for mode in ("socks_via_streams", "connect_zero_copy", "connect_pooled", "forward"):
+        results[mode]["relative_to_socks"] = round(results[mode]["mb_per_s"]["median"] / baseline, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.streams, args.size_mb, args.runs)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures split-tunneling rule compilation and lookups: the time to compile large rule lists into the PAC file, its
+size, and the cost of one lookup in Python and, when Node.js is installed, of FindProxyForURL itself compared with
+a PAC that checks the domains one by one as hand-written PAC files do.
+
+    python -m benchmarks.bench_pac [--domains 50000] [--networks 5000] [--lookups 100000]
+"""
+import argparse
+import ipaddress
+import json
+import random
+import shutil
+import subprocess
+import time
+
+from benchmarks.testbed import summarize
+from core.pac import compile_pac, generate_pac
+from core.rules import BUILTIN_DIRECT, DIRECT, PROXY, RuleSet
+
+# Evaluated by Node: times FindProxyForURL over the host list and prints the mean in microseconds.
+NODE_HARNESS = """
+var hosts = %(hosts)s;
+for (var w = 0; w < 1000; w++) FindProxyForURL("", hosts[w %% hosts.length]);
+var start = process.hrtime.bigint();
+for (var i = 0; i < %(lookups)d; i++) FindProxyForURL("", hosts[i %% hosts.length]);
+console.log(Number(process.hrtime.bigint() - start) / 1000 / %(lookups)d);
+"""
+
+LINEAR_PAC = """var DIRECT_DOMAINS = %(domains)s;
+function FindProxyForURL(url, host) {
+    for (var i = 0; i < DIRECT_DOMAINS.length; i++) {
+        if (dnsDomainIs(host, DIRECT_DOMAINS[i])) return "DIRECT";
+    }
+    return "SOCKS5 127.0.0.1:1080";
+}
+function dnsDomainIs(host, domain) {
+    return host === domain || host.slice(-domain.length - 1) === "." + domain;
+}
+"""
+
+
+def make_rules(domains: int, networks: int, seed: int = 1) -> tuple:
+    rng = random.Random(seed)
+    tlds = ("com", "net", "org", "cn", "io", "de")
+    names = [f"site{i}-{rng.randrange(10 ** 6)}.{rng.choice(tlds)}" for i in range(domains)]
+    blocks = [str(ipaddress.ip_network((rng.getrandbits(32), rng.choice((16, 20, 24))), strict=False))
+              for _ in range(networks)]
+    return names, blocks
+
+
+def make_hosts(names: list, count: int = 1000, seed: int = 2) -> list:
+    """A mix of subdomains of listed domains and unlisted hosts, as a browser would look up."""
+    rng = random.Random(seed)
+    return [f"www.{rng.choice(names)}" if rng.random() < 0.5 else f"cdn{rng.randrange(10 ** 6)}.example.com"
+            for _ in range(count)]
+
+
+def time_node(pac: str, hosts: list, lookups: int) -> float:
+    script = pac + NODE_HARNESS % {"hosts": json.dumps(hosts), "lookups": lookups}
+    # Large rule lists exceed the argument length limit, so the script goes in on stdin.
+    output = subprocess.run(['node'], input=script, capture_output=True, text=True, check=True).stdout
+    return round(float(output), 3)
+
+
+def run(domains: int, networks: int, lookups: int) -> dict:
+    names, blocks = make_rules(domains, networks)
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        rules = RuleSet()
+        rules.add_lines(BUILTIN_DIRECT, DIRECT)
+        rules.add_lines(names, DIRECT)
+        rules.add_lines(blocks[::2], DIRECT)
+        rules.add_lines(blocks[1::2], PROXY)
+        rules.finish()
+        compiled = compile_pac(rules)
+        samples.append((time.perf_counter() - start) * 1000)
+    hosts = make_hosts(names)
+
+    start = time.perf_counter()
+    for i in range(lookups):
+        rules.match(hosts[i % len(hosts)])
+    python_us = (time.perf_counter() - start) * 1e6 / lookups
+
+    results = {"benchmark": "pac", "domains": domains, "networks": networks, "stats": rules.stats(),
+               "compile_ms": summarize(samples), "pac_bytes": len(compiled.encode()),
+               "python_lookup_us": round(python_us, 3)}
+    if shutil.which('node'):
+        results["pac_lookup_us"] = time_node(generate_pac(rules, 1080), hosts, lookups)
+        linear = LINEAR_PAC % {"domains": json.dumps(names)}
+        results["linear_pac_lookup_us"] = time_node(linear, hosts, max(lookups // 100, 100))
+    else:
+        results["pac_lookup_us"] = {"skipped": "node is not installed"}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--domains", type=int, default=50_000)
+    parser.add_argument("--networks", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.domains, args.networks, args.lookups), indent=2))
+
+
+if __name__ == '__main__':
+    main()
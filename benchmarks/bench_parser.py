@@ -0,0 +1,46 @@
+"""
+Measures how many access keys per second parse_access_key() handles.
+
+    python -m benchmarks.bench_parser [--keys 100000]
+"""
+import argparse
+import base64
+import json
+import time
+
+from core.parser import parse_access_key
+
+
+def make_keys(count: int) -> list:
+    """Builds a mix of plain, named and Outline-style keys with distinct servers and passwords."""
+    keys = []
+    for i in range(count):
+        user_info = base64.urlsafe_b64encode(f"chacha20-ietf-poly1305:password-{i}".encode()).decode().rstrip('=')
+        key = f"ss://{user_info}@10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{8000 + i % 1000}"
+        if i % 3 == 1:
+            key += f"/?name=Server%20{i}"
+        elif i % 3 == 2:
+            key += "/?outline=1"
+        keys.append(key)
+    return keys
+
+
+def run(count: int) -> dict:
+    keys = make_keys(count)
+    start = time.perf_counter()
+    for key in keys:
+        parse_access_key(key)
+    elapsed = time.perf_counter() - start
+    return {"benchmark": "parse_access_key", "keys": count, "seconds": round(elapsed, 4),
+            "keys_per_s": round(count / elapsed), "us_per_key": round(elapsed / count * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.keys), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Measures the routing relay's rule index: compiling large rule lists, opening the compiled index (what every launch
+pays once the rules are unchanged) against parsing the rule files again, lookups in the mapped index, and the time
+to open a connection through the relay compared with connecting directly.
+
+    python -m benchmarks.bench_router [--domains 100000] [--networks 50000] [--lookups 100000] [--connects 200]
+"""
+import argparse
+import asyncio
+import contextlib
+import ipaddress
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_pac import make_hosts, make_rules
+from benchmarks.testbed import start_http_target, summarize
+from core.router import RoutingRelay
+from core.rule_index import open_index
+from core.rules import load_rules
+from core.socks import open_connection
+from utils.network import allocate_port, release_port
+
+
+def write_rules(rules_dir: Path, names: list, blocks: list):
+    """Lays the rules out as a user would: hand-written lists plus a large address list in direct/."""
+    (rules_dir / "direct").mkdir(parents=True)
+    (rules_dir / "direct.txt").write_text("\n".join(names[::2]) + "\n")
+    (rules_dir / "proxy.txt").write_text("\n".join(names[1::4]) + "\n")
+    (rules_dir / "block.txt").write_text("\n".join(names[3::4]) + "\n")
+    (rules_dir / "direct" / "geoip.txt").write_text("\n".join(blocks) + "\n")
+
+
+def time_lookups(index, hosts: list, lookups: int) -> float:
+    start = time.perf_counter()
+    for i in range(lookups):
+        index.match(hosts[i % len(hosts)])
+    return round((time.perf_counter() - start) * 1e6 / lookups, 3)
+
+
+async def time_connects(rules_dir: Path, index_file: Path, connects: int) -> dict:
+    """Opens connections to a local target directly and through the relay, which routes 127.0.0.1 direct."""
+    target, target_port = await start_http_target()
+    router = RoutingRelay(allocate_port(), rules_dir=rules_dir, index_file=index_file)
+    # The relay logs the loaded rules with print(); keep stdout for the JSON result.
+    with contextlib.redirect_stdout(sys.stderr):
+        await router.start()
+    direct, relayed = [], []
+    try:
+        for _ in range(connects):
+            start = time.perf_counter()
+            _, writer = await asyncio.open_connection('127.0.0.1', target_port)
+            direct.append((time.perf_counter() - start) * 1000)
+            writer.close()
+
+            start = time.perf_counter()
+            _, writer = await open_connection(router.listen_port, '127.0.0.1', target_port)
+            relayed.append((time.perf_counter() - start) * 1000)
+            writer.close()
+            await writer.wait_closed()
+        # Let the relay's last connection see the close before the server goes away.
+        await asyncio.sleep(0.1)
+    finally:
+        await router.stop()
+        release_port(router.listen_port)
+        target.close()
+    return {"direct_connect_ms": summarize(direct), "relay_connect_ms": summarize(relayed)}
+
+
+def run(domains: int, networks: int, lookups: int, connects: int) -> dict:
+    names, blocks = make_rules(domains, networks)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        rules_dir, index_file = Path(temp_dir) / "rules", Path(temp_dir) / "rules.idx"
+        write_rules(rules_dir, names, blocks)
+
+        compile_samples, open_samples, parse_samples = [], [], []
+        for _ in range(3):
+            index_file.unlink(missing_ok=True)
+            start = time.perf_counter()
+            open_index(rules_dir, index_file).close()
+            compile_samples.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            load_rules(rules_dir)
+            parse_samples.append((time.perf_counter() - start) * 1000)
+        for _ in range(20):
+            start = time.perf_counter()
+            open_index(rules_dir, index_file).close()
+            open_samples.append((time.perf_counter() - start) * 1000)
+
+        index = open_index(rules_dir, index_file)
+        try:
+            hosts = make_hosts(names)
+            rng = random.Random(3)
+            addresses = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(1000)]
+            results = {"benchmark": "router", "domains": domains, "networks": networks, "stats": index.stats(),
+                       "compile_ms": summarize(compile_samples), "open_ms": summarize(open_samples),
+                       "parse_rule_files_ms": summarize(parse_samples),
+                       "domain_lookup_us": time_lookups(index, hosts, lookups),
+                       "address_lookup_us": time_lookups(index, addresses, lookups)}
+        finally:
+            index.close()
+        results.update(asyncio.run(time_connects(rules_dir, index_file, connects)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--domains", type=int, default=100_000)
+    parser.add_argument("--networks", type=int, default=50_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--connects", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.domains, args.networks, args.lookups, args.connects), indent=2))
+
+
+if __name__ == '__main__':
+    main()
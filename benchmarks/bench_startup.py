@@ -0,0 +1,89 @@
+"""
+Measures cold start: launches ProxyPal with --profile-startup in a fresh home directory and records each startup
+phase, the time from launch to first paint and to a fully interactive window.
+
+The target for the py2app bundle is a first paint within FIRST_PAINT_BUDGET_MS of launch; measure the bundle with
+--command dist/ProxyPal.app/Contents/MacOS/ProxyPal after `python setup.py py2app`.
+
+    python -m benchmarks.bench_startup [--runs 5] [--servers 1000] [--command PATH]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_parser import make_keys
+from benchmarks.testbed import summarize
+from core import storage
+from core.parser import parse_access_key
+
+FIRST_PAINT_BUDGET_MS = 1000
+MAIN_SCRIPT = Path(__file__).resolve().parent.parent / "main.py"
+
+
+def seed(home: Path, servers: int):
+    """Saves the given number of servers where ProxyPal will look for them under this home directory."""
+    directory = home / storage.APP_SUPPORT_DIR.relative_to(Path.home())
+    directory.mkdir(parents=True)
+    backend = (storage.ServerDatabase(directory / storage.DATABASE_FILE.name) if storage.ServerDatabase
+               else storage.JsonBackend(directory / storage.CONFIG_FILE.name))
+    registry = storage.ServerRegistry(backend, save_delay=3600)
+    registry.add_many([parse_access_key(key) for key in make_keys(servers)])
+    registry.flush()
+
+
+def launch(command: list, home: Path) -> dict:
+    env = dict(os.environ, HOME=str(home))
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    process = subprocess.Popen(command + ["--profile-startup"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, env=env)
+    # The profile is printed as one flushed line once the window is interactive.
+    for line in process.stdout:
+        if line.startswith('{"phases"'):
+            break
+    else:
+        raise RuntimeError(f"{command[0]} exited without printing a startup profile")
+    interactive_ms = (time.perf_counter() - start) * 1000
+    profile = json.loads(line)
+    process.communicate(timeout=30)
+    phases = {phase["phase"]: phase["at_ms"] for phase in profile["phases"]}
+    # Everything before ProxyPal's first import: interpreter start-up and, for the bundle, the py2app bootstrap.
+    before_main_ms = interactive_ms - profile["total_ms"]
+    return {"interactive_ms": interactive_ms, "before_main_ms": before_main_ms,
+            "first_paint_ms": before_main_ms + phases["first paint"], "phases": phases}
+
+
+def run(runs: int, servers: int, command: list = None) -> dict:
+    command = command or [sys.executable, str(MAIN_SCRIPT)]
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            if servers:
+                seed(Path(directory), servers)
+            samples.append(launch(command, Path(directory)))
+    first_paint = summarize([sample["first_paint_ms"] for sample in samples])
+    return {"benchmark": "startup", "command": command, "servers": servers,
+            "first_paint_from_launch_ms": first_paint,
+            "interactive_from_launch_ms": summarize([sample["interactive_ms"] for sample in samples]),
+            "before_main_ms": summarize([sample["before_main_ms"] for sample in samples]),
+            "phases_at_ms": {phase: summarize([sample["phases"][phase] for sample in samples])
+                             for phase in samples[0]["phases"]},
+            "budget_ms": FIRST_PAINT_BUDGET_MS, "within_budget": first_paint["median"] <= FIRST_PAINT_BUDGET_MS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--servers", type=int, default=1000)
+    parser.add_argument("--command", help="Launch this executable instead of main.py, e.g. the py2app bundle.")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs, args.servers, [args.command] if args.command else None), indent=2))
+
+
+if __name__ == '__main__':
+    main()
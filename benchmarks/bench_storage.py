@@ -0,0 +1,75 @@
+"""
+Measures loading, saving and editing the server list with each storage backend at different sizes.
+
+Every run uses a fresh temporary directory, so the real server list is never touched.
+
+    python -m benchmarks.bench_storage [--sizes 10,1000,100000] [--runs 5]
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_parser import make_keys
+from benchmarks.testbed import summarize
+from core import storage
+from core.parser import parse_access_key
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def backends(directory: Path) -> dict:
+    """Returns factories for every available backend, all storing under the given directory."""
+    factories = {"json": lambda: storage.JsonBackend(directory / "servers.json")}
+    if storage.ServerDatabase is not None:
+        factories["sqlite"] = lambda: storage.ServerDatabase(directory / "servers.db")
+    return factories
+
+
+def measure(servers: list, extra: dict, name: str, runs: int) -> dict:
+    samples = {key: [] for key in ("save_all_ms", "load_ms", "add_ms", "rename_ms", "delete_ms", "flush_ms")}
+    file_bytes = 0
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as directory:
+            factory = backends(Path(directory))[name]
+            # A long save delay keeps the background save out of the way; flush() is timed on its own.
+            registry = storage.ServerRegistry(factory(), save_delay=3600)
+            registry.load()
+            samples["save_all_ms"].append(timed(lambda: (registry.replace_all(servers), registry.flush())))
+
+            registry = storage.ServerRegistry(factory(), save_delay=3600)
+            samples["load_ms"].append(timed(registry.load))
+            samples["add_ms"].append(timed(registry.add, dict(extra)))
+            samples["rename_ms"].append(timed(registry.rename, servers[0]['id'], "Renamed"))
+            samples["delete_ms"].append(timed(registry.remove, servers[-1]['id']))
+            samples["flush_ms"].append(timed(registry.flush))
+            file_bytes = sum(path.stat().st_size for path in Path(directory).iterdir())
+    return {"file_bytes": file_bytes, **{key: summarize(values) for key, values in samples.items()}}
+
+
+def run(sizes: list, runs: int) -> dict:
+    results = []
+    for size in sizes:
+        servers = [parse_access_key(key) for key in make_keys(size + 1)]
+        extra = servers.pop()
+        with tempfile.TemporaryDirectory() as directory:
+            names = list(backends(Path(directory)))
+        results.append({"servers": size, **{name: measure(servers, extra, name, runs) for name in names}})
+    return {"benchmark": "storage", "sizes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,100000")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run([int(size) for size in args.sizes.split(',')], args.runs), indent=2))
+
+
+if __name__ == '__main__':
+    main()
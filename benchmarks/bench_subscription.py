@@ -0,0 +1,80 @@
+"""
+Measures subscription refreshes against a local HTTP server: a first full download, an unchanged refresh
+(answered with 304) and a refresh after a small change, which should only touch the changed servers.
+
+    python -m benchmarks.bench_subscription [--servers 10000] [--change-percent 1] [--format base64]
+"""
+import argparse
+import base64
+import contextlib
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_parser import make_keys
+from benchmarks.testbed import SubscriptionServer
+from core import storage
+from core.parser import parse_access_key
+from core.subscription import sync_subscription
+
+
+def render(keys: list, fmt: str) -> str:
+    if fmt == "sip008":
+        servers = []
+        for key in keys:
+            config = parse_access_key(key)
+            servers.append({"server": config['server'], "server_port": config['server_port'],
+                            "password": config['password'], "method": config['method'], "remarks": config['name']})
+        return json.dumps({"version": 1, "servers": servers})
+    text = "\n".join(keys)
+    return base64.b64encode(text.encode()).decode() if fmt == "base64" else text
+
+
+def refresh(subscription: dict, registry, server: SubscriptionServer) -> dict:
+    sent = server.bytes_sent
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        diff = sync_subscription(subscription, registry)
+    return {"ms": round((time.perf_counter() - start) * 1000, 2), "status": diff['status'],
+            "bytes": server.bytes_sent - sent, "added": len(diff['added']), "removed": len(diff['removed']),
+            "replaced": len(diff['replaced'])}
+
+
+def run(servers: int, change_percent: float, fmt: str) -> dict:
+    keys = make_keys(servers)
+    server = SubscriptionServer(render(keys, fmt))
+    results = {"benchmark": "subscription", "servers": servers, "format": fmt, "change_percent": change_percent}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            backend = (storage.ServerDatabase(Path(directory) / "servers.db") if storage.ServerDatabase
+                       else storage.JsonBackend(Path(directory) / "servers.json"))
+            registry = storage.ServerRegistry(backend, save_delay=3600)
+            subscription = {"url": server.url}
+            results["initial"] = refresh(subscription, registry, server)
+            results["unchanged"] = refresh(subscription, registry, server)
+
+            # Rename, drop and add the same number of servers.
+            count = max(1, int(servers * change_percent / 100))
+            changed = [key.split('/?')[0] + f"/?name=Renamed%20{i}" for i, key in enumerate(keys[:count])]
+            changed += keys[count:len(keys) - count] + make_keys(servers + count)[servers:]
+            server.set_body(render(changed, fmt))
+            results["changed"] = refresh(subscription, registry, server)
+            results["stored_servers"] = len(registry.all())
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--servers", type=int, default=10_000)
+    parser.add_argument("--change-percent", type=float, default=1.0)
+    parser.add_argument("--format", choices=["plain", "base64", "sip008"], default="base64")
+    args = parser.parse_args()
+    print(json.dumps(run(args.servers, args.change_percent, args.format), indent=2))
+
+
+if __name__ == '__main__':
+    main()
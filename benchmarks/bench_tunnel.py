@@ -0,0 +1,102 @@
+"""
+Measures end-to-end connect latency, request latency and throughput of a tunnel on loopback.
+
+Connects go through ConnectionAttempt exactly as the app does (pre-flight, spawn, wait until ready, health check)
+against a local Shadowsocks server and HTTP target, and are repeated for each available engine. The upstream is
+the real ss-server if it is installed, otherwise the Python stand-in from benchmarks/testbed.py.
+
+    python -m benchmarks.bench_tunnel [--connects 10] [--requests 50] [--size-mb 32]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import shutil
+import subprocess
+import sys
+
+from benchmarks.testbed import download_through_socks, spawn_stand_in, summarize
+from core.connection import ConnectionAttempt, ENGINE_NATIVE, ENGINE_SS_LOCAL
+from core.event_loop import get_background_loop
+from core.socks import check_target
+from core import ss_engine
+from utils.network import allocate_port, is_port_open
+
+PASSWORD = "benchmark"
+METHOD = "chacha20-ietf-poly1305"
+TIMINGS = ('preflight_ms', 'spawn_ms', 'ready_ms', 'health_ms')
+
+
+def start_upstream() -> tuple:
+    """Returns (process, port, kind) for the real ss-server or the Python stand-in."""
+    if shutil.which('ss-server'):
+        port = allocate_port()
+        process = subprocess.Popen(['ss-server', '-s', '127.0.0.1', '-p', str(port), '-k', PASSWORD, '-m', METHOD],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while not is_port_open(port):
+            if process.poll() is not None:
+                raise RuntimeError("ss-server exited during startup.")
+        return process, port, "ss-server"
+    process, port = spawn_stand_in('ss-server', PASSWORD, METHOD)
+    return process, port, "python-stand-in"
+
+
+def connect(config: dict, targets: list, engine: str) -> ConnectionAttempt:
+    """Runs one connect to completion and returns the attempt, which owns the tunnel on success."""
+    attempt = ConnectionAttempt(config, targets, engine, preferred_port=None)
+    # The attempt logs its progress with print(); keep stdout for the JSON result.
+    with contextlib.redirect_stdout(sys.stderr):
+        get_background_loop().call(attempt.run())
+    return attempt
+
+
+async def measure_tunnel(port: int, target_port: int, requests: int, size: int) -> dict:
+    url = f"http://127.0.0.1:{target_port}/"
+    first_byte = [(await check_target(port, url))['first_byte_ms'] for _ in range(requests)]
+    elapsed = await download_through_socks(port, target_port, size)
+    return {"request_ms": summarize(first_byte), "throughput_mb_per_s": round(size / elapsed / 1e6, 2)}
+
+
+def run(connects: int, requests: int, size_mb: int) -> dict:
+    http_process, target_port = spawn_stand_in('http')
+    upstream, upstream_port, upstream_kind = start_upstream()
+    config = {"id": "benchmark", "server": "127.0.0.1", "server_port": upstream_port, "password": PASSWORD,
+              "method": METHOD, "name": "benchmark"}
+    targets = [f"http://127.0.0.1:{target_port}/generate_204"]
+    results = {"benchmark": "tunnel", "method": METHOD, "upstream": upstream_kind, "engines": {}}
+
+    engines = [engine for engine, available in ((ENGINE_NATIVE, ss_engine.is_available()),
+                                                (ENGINE_SS_LOCAL, bool(shutil.which('ss-local')))) if available]
+    try:
+        for engine in engines:
+            samples = {name: [] for name in TIMINGS}
+            for _ in range(connects):
+                worker = connect(config, targets, engine)
+                for name in TIMINGS:
+                    samples[name].append(worker.timings[name])
+                worker.stop_process()
+            worker = connect(config, targets, engine)
+            try:
+                tunnel = asyncio.run(measure_tunnel(worker.local_port, target_port, requests, size_mb * 1_000_000))
+            finally:
+                worker.stop_process()
+            results["engines"][engine] = {"connect_ms": {name: summarize(samples[name]) for name in TIMINGS},
+                                          **tunnel}
+    finally:
+        for process in (upstream, http_process):
+            process.terminate()
+            process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--connects", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--size-mb", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(run(args.connects, args.requests, args.size_mb), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Measures the memory and time to first paint of the server list at different sizes, comparing the list view with
+the previous layout of one card per server in a scroll area.
+
+Each measurement runs in a fresh offscreen process, so memory figures do not carry over between runs. First paint
+is the time to build the widgets, show them and render one frame; restyle is the time to switch from the light to
+the dark stylesheet and render the next frame, as on a system theme change.
+
+    python -m benchmarks.bench_ui [--sizes 1000,10000] [--card-limit 10000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import psutil
+
+VIEWS = ("list", "cards")
+
+
+def build_list(configs: list):
+    from PyQt6.QtWidgets import QListView
+    from ui.server_list import ServerListModel, ServerFilterModel, ServerDelegate
+
+    model = ServerListModel()
+    model.set_servers(configs)
+    proxy = ServerFilterModel()
+    proxy.setSourceModel(model)
+    view = QListView()
+    view.setModel(proxy)
+    view.setItemDelegate(ServerDelegate(view))
+    view.setUniformItemSizes(True)
+    view.resize(430, 600)
+    return view, (model, proxy)
+
+
+def build_cards(configs: list):
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtWidgets import QScrollArea, QVBoxLayout, QWidget
+    from ui.server_widget import ServerWidget
+
+    scroll_area = QScrollArea()
+    scroll_area.setWidgetResizable(True)
+    content = QWidget()
+    layout = QVBoxLayout(content)
+    layout.setSpacing(15)
+    layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+    for config in configs:
+        layout.addWidget(ServerWidget(config))
+    layout.addStretch(1)
+    scroll_area.setWidget(content)
+    scroll_area.resize(430, 600)
+    return scroll_area, None
+
+
+def measure(view: str, count: int) -> dict:
+    """Builds and paints one view in this process. Called in a child process by run()."""
+    from PyQt6.QtWidgets import QApplication
+    from benchmarks.bench_parser import make_keys
+    from core.parser import parse_access_key
+    from ui.styles import get_stylesheet
+    from ui.theme import DARK_THEME, LIGHT_THEME
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setStyleSheet(get_stylesheet(LIGHT_THEME))
+    configs = [parse_access_key(key) for key in make_keys(count)]
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    start = time.perf_counter()
+    widget, models = (build_list if view == "list" else build_cards)(configs)
+    built = time.perf_counter()
+    widget.show()
+    widget.grab()
+    painted = time.perf_counter()
+    result = {"view": view, "servers": count, "build_ms": round((built - start) * 1000, 2),
+              "first_paint_ms": round((painted - start) * 1000, 2),
+              "rss_bytes": process.memory_info().rss - rss}
+    start = time.perf_counter()
+    app.setStyleSheet(get_stylesheet(DARK_THEME))
+    widget.grab()
+    result["restyle_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    if models:
+        model, proxy = models
+        start = time.perf_counter()
+        proxy.setFilterFixedString("server 12")
+        result["filter_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        proxy.setFilterFixedString("")
+        for row in range(0, count, 3):
+            model.set_probe_result({"id": configs[row]['id'], "tcp_ms": row % 97, "roundtrip_ms": row % 89 + 1})
+        start = time.perf_counter()
+        model.set_sort_key("Latency")
+        result["sort_latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    app.processEvents()
+    return result
+
+
+def run(sizes: list, card_limit: int) -> dict:
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    results = []
+    for count in sizes:
+        entry = {"servers": count}
+        for view in VIEWS:
+            if view == "cards" and count > card_limit:
+                entry[view] = {"skipped": f"more than --card-limit {card_limit} servers"}
+                continue
+            child = subprocess.run([sys.executable, "-m", "benchmarks.bench_ui", "--measure", view, str(count)],
+                                   capture_output=True, text=True, env=env)
+            if child.returncode:
+                entry[view] = {"error": child.stderr.strip().splitlines()[-1] if child.stderr.strip()
+                               else f"exit code {child.returncode}"}
+            else:
+                entry[view] = json.loads(child.stdout)
+        results.append(entry)
+    return {"benchmark": "server_list_ui", "sizes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--card-limit", type=int, default=10_000,
+                        help="Skip the card layout above this many servers, as it takes minutes to build.")
+    parser.add_argument("--measure", nargs=2, metavar=("VIEW", "SERVERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure[0], int(args.measure[1]))))
+        return
+    print(json.dumps(run([int(size) for size in args.sizes.split(',')], args.card_limit), indent=2))
+
+
+if __name__ == '__main__':
+    main()
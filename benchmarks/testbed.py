@@ -0,0 +1,274 @@
+"""
+Loopback-only stand-ins used by the benchmarks: an HTTP target, a Shadowsocks AEAD server and a subscription server.
+"""
+import asyncio
+import hashlib
+import statistics
+import subprocess
+import sys
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core.relay import pipe
+from core.ss_engine import AEADEncryptor, CIPHERS, derive_master_key, open_upstream_request, READ_SIZE
+
+PAYLOAD_BLOCK = b'\0' * READ_SIZE
+
+
+async def _handle_http(reader, writer):
+    """Answers HEAD with 204 and 'GET /bytes/<n>' with n bytes of zeros."""
+    try:
+        request = await reader.readuntil(b'\r\n\r\n')
+        method, path = request.split(b' ', 2)[:2]
+        size = int(path.rsplit(b'/', 1)[1]) if path.startswith(b'/bytes/') else 0
+        if method == b'HEAD' or not size:
+            writer.write(b'HTTP/1.1 204 No Content\r\nConnection: close\r\n\r\n')
+        else:
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % size)
+            while size > 0:
+                writer.write(PAYLOAD_BLOCK[:min(size, READ_SIZE)])
+                size -= READ_SIZE
+                await writer.drain()
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_target():
+    """Starts the local HTTP target and returns (server, port)."""
+    server = await asyncio.start_server(_handle_http, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def start_ss_server(password: str, method: str = "chacha20-ietf-poly1305"):
+    """Starts a Python Shadowsocks AEAD server stand-in and returns (server, port)."""
+    master_key = derive_master_key(password, CIPHERS[method][0])
+
+    async def handle(reader, writer):
+        target_writer = None
+        try:
+            decryptor, (host, port), initial = await open_upstream_request(reader, master_key, method)
+            target_reader, target_writer = await asyncio.open_connection(host, port)
+            target_writer.write(initial)
+            encryptor = AEADEncryptor(method, master_key)
+
+            async def upstream():
+                try:
+                    while True:
+                        data = await reader.read(READ_SIZE)
+                        if not data:
+                            break
+                        target_writer.write(decryptor.feed(data))
+                        await target_writer.drain()
+                    if target_writer.can_write_eof():
+                        target_writer.write_eof()
+                except (ConnectionError, OSError):
+                    pass
+
+            async def downstream():
+                try:
+                    while True:
+                        data = await target_reader.read(READ_SIZE)
+                        if not data:
+                            break
+                        writer.write(encryptor.encrypt(data))
+                        await writer.drain()
+                    if writer.can_write_eof():
+                        writer.write_eof()
+                except (ConnectionError, OSError):
+                    pass
+
+            await asyncio.gather(upstream(), downstream())
+        except Exception:
+            pass
+        finally:
+            writer.close()
+            if target_writer:
+                target_writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def start_plain_socks_server():
+    """Starts an unencrypted SOCKS5 server, used as a baseline for relay overhead, and returns (server, port)."""
+    from core.socks import read_address
+
+    async def handle(reader, writer):
+        try:
+            header = await reader.readexactly(2)
+            await reader.readexactly(header[1])
+            writer.write(b'\x05\x00')
+            await reader.readexactly(3)
+            host, port = await read_address(reader)
+            target_reader, target_writer = await asyncio.open_connection(host, port)
+            writer.write(b'\x05\x00\x00\x01' + bytes(6))
+            await asyncio.gather(pipe(reader, target_writer), pipe(target_reader, writer))
+            target_writer.close()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def _receive_download(reader, writer, size: int):
+    """Reads the HTTP target's response to 'GET /bytes/<size>' and closes the connection."""
+    await reader.readuntil(b'\r\n\r\n')
+    received = 0
+    while received < size:
+        data = await reader.read(READ_SIZE)
+        if not data:
+            raise ConnectionError(f"Connection closed after {received} of {size} bytes.")
+        received += len(data)
+    writer.close()
+
+
+async def download_through_socks(proxy_port: int, target_port: int, size: int) -> float:
+    """Downloads `size` bytes from the HTTP target through a SOCKS5 proxy and returns the elapsed seconds."""
+    from core.socks import open_connection
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    reader, writer = await open_connection(proxy_port, '127.0.0.1', target_port)
+    writer.write(b'GET /bytes/%d HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n' % size)
+    await _receive_download(reader, writer, size)
+    return loop.time() - start
+
+
+async def download_through_http_proxy(proxy_port: int, target_port: int, size: int, tunnel: bool = True) -> float:
+    """
+    Downloads `size` bytes from the HTTP target through an HTTP proxy, in a CONNECT tunnel or as a forwarded
+    request, and returns the elapsed seconds.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    reader, writer = await asyncio.open_connection('127.0.0.1', proxy_port)
+    if tunnel:
+        writer.write(b'CONNECT 127.0.0.1:%d HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n\r\n' % (target_port, target_port))
+        status = await reader.readuntil(b'\r\n\r\n')
+        if b' 200 ' not in status.split(b'\r\n', 1)[0]:
+            raise ConnectionError(status.split(b'\r\n', 1)[0].decode())
+        writer.write(b'GET /bytes/%d HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n' % size)
+    else:
+        writer.write(b'GET http://127.0.0.1:%d/bytes/%d HTTP/1.1\r\nHost: 127.0.0.1:%d\r\n\r\n'
+                     % (target_port, size, target_port))
+    await _receive_download(reader, writer, size)
+    return loop.time() - start
+
+
+class SubscriptionServer:
+    """
+    Serves a subscription body on loopback with ETag and Last-Modified validators, answering conditional
+    requests for an unchanged body with 304, and counts what it sent.
+    """
+
+    def __init__(self, body: str = "", content_type: str = "text/plain"):
+        self.content_type = content_type
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.set_body(body)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                if self.headers.get('If-None-Match') == server.etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', server.etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', server.content_type)
+                self.send_header('Content-Length', str(len(server.body)))
+                self.send_header('ETag', server.etag)
+                self.send_header('Last-Modified', server.last_modified)
+                self.end_headers()
+                self.wfile.write(server.body)
+                server.bytes_sent += len(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/subscription"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def set_body(self, body: str):
+        self.body = body.encode('utf-8')
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest() + '"'
+        self.last_modified = formatdate(usegmt=True)
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def summarize(samples: list) -> dict:
+    """Reduces a list of timings to the statistics reported in benchmark JSON."""
+    ordered = sorted(samples)
+    return {"runs": len(ordered), "min": round(ordered[0], 3), "median": round(statistics.median(ordered), 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3)}
+
+
+def spawn_stand_in(*args) -> tuple:
+    """Starts a stand-in in its own process (see main()) and returns (process, port)."""
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.testbed', *args], stdout=subprocess.PIPE)
+    return process, int(process.stdout.readline())
+
+
+async def _serve_forever(kind: str, args: list):
+    if kind == "ss-server":
+        server, port = await start_ss_server(args[0], args[1])
+    elif kind == "tunnel":
+        from core.ss_engine import NativeTunnel
+        config = {"server": "127.0.0.1", "server_port": int(args[1]), "password": args[2], "method": args[3]}
+        tunnel = NativeTunnel(config, int(args[0]))
+        await tunnel.start()
+        server, port = tunnel.listener, tunnel.local_port
+    elif kind == "socks":
+        server, port = await start_plain_socks_server()
+    elif kind == "forwarder":
+        from core.relay import PortForwarder
+        from utils.network import allocate_port
+        forwarder = PortForwarder(allocate_port(), int(args[0]))
+        await forwarder.start()
+        server, port = forwarder.server, forwarder.listen_port
+    elif kind == "http-proxy":
+        from core.http_proxy import HttpProxy
+        from utils.network import allocate_port
+        proxy = HttpProxy(allocate_port(), int(args[0]), zero_copy=args[1] == "zero-copy")
+        await proxy.start()
+        print(proxy.listen_port, flush=True)
+        await proxy.accept_task
+        return
+    else:
+        server, port = await start_http_target()
+    print(port, flush=True)
+    await server.serve_forever()
+
+
+def main():
+    """
+    Runs one stand-in in its own process and prints its port, so benchmarks can use several CPU cores:
+
+        python -m benchmarks.testbed ss-server PASSWORD METHOD
+        python -m benchmarks.testbed tunnel LOCAL_PORT SERVER_PORT PASSWORD METHOD
+        python -m benchmarks.testbed http
+        python -m benchmarks.testbed socks
+        python -m benchmarks.testbed forwarder TARGET_PORT
+        python -m benchmarks.testbed http-proxy SOCKS_PORT zero-copy|pooled
+    """
+    asyncio.run(_serve_forever(sys.argv[1], sys.argv[2:]))
+
+
+if __name__ == '__main__':
+    main()
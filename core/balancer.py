@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+
+from core.relay import ClientConnections, relay
+from core.socks import race_targets
+from core.stats import TrafficCounters
+
+POLICY_ROUND_ROBIN = "round-robin"
+POLICY_LEAST_CONNECTIONS = "least-connections"
+POLICY_LOWEST_LATENCY = "lowest-latency"
+POLICIES = [POLICY_ROUND_ROBIN, POLICY_LEAST_CONNECTIONS, POLICY_LOWEST_LATENCY]
+
+CHECK_INTERVAL = 10.0
+CHECK_TIMEOUT = 5.0
+EJECT_AFTER_FAILURES = 2
+LATENCY_SMOOTHING = 0.3
+
+
+class Backend:
+    """One upstream tunnel behind the load balancer."""
+
+    def __init__(self, server_id: str, port: int):
+        self.server_id = server_id
+        self.port = port
+        self.healthy = True
+        self.failures = 0
+        self.latency_ms = None
+        self.active_connections = 0
+        self.total_connections = 0
+
+    def record_latency(self, latency_ms: float):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += LATENCY_SMOOTHING * (latency_ms - self.latency_ms)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= EJECT_AFTER_FAILURES and self.healthy:
+            self.healthy = False
+            print(f"Load balancer: ejected backend {self.server_id} on port {self.port}")
+
+    def record_success(self):
+        self.failures = 0
+        if not self.healthy:
+            self.healthy = True
+            print(f"Load balancer: readmitted backend {self.server_id} on port {self.port}")
+
+    def snapshot(self) -> dict:
+        return {"id": self.server_id, "port": self.port, "healthy": self.healthy, "latency_ms": self.latency_ms,
+                "active_connections": self.active_connections, "total_connections": self.total_connections}
+
+
+class LoadBalancer:
+    """
+    A local front-end that spreads incoming SOCKS5 connections over several running tunnels.
+
+    Connections are forwarded byte-for-byte, so the client's SOCKS5 handshake is answered by the chosen tunnel.
+    Backends are health-checked periodically and ejected after repeated failures, either from those checks or
+    from failed connection attempts; they are readmitted once a check succeeds again.
+    """
+
+    def __init__(self, listen_port: int, policy: str = POLICY_ROUND_ROBIN, health_check_targets: list = None,
+                 check_interval: float = CHECK_INTERVAL):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown load balancing policy '{policy}'.")
+        self.listen_port = listen_port
+        self.policy = policy
+        self.health_check_targets = health_check_targets
+        self.check_interval = check_interval
+        self.backends = []
+        self._round_robin = itertools.count()
+        self.server = None
+        self.clients = ClientConnections()
+        self.health_task = None
+        self.counters = TrafficCounters()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.clients.track(self._handle), '127.0.0.1', self.listen_port)
+        self.health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        """Stops the health checks and the listener, closing the balanced connections."""
+        if self.health_task:
+            self.health_task.cancel()
+            self.health_task = None
+        if self.server:
+            await self.clients.close(self.server)
+            self.server = None
+
+    def add_backend(self, server_id: str, port: int):
+        """Adds a running tunnel. Must be called on the balancer's event loop."""
+        backend = Backend(server_id, port)
+        self.backends.append(backend)
+        if self.health_task:
+            asyncio.get_running_loop().create_task(self._check(backend))
+
+    def remove_backend(self, server_id: str):
+        self.backends = [b for b in self.backends if b.server_id != server_id]
+
+    def snapshot(self) -> list:
+        return [backend.snapshot() for backend in self.backends]
+
+    def pick(self, exclude=()):
+        """Chooses a backend according to the policy, preferring healthy ones."""
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        if self.policy == POLICY_LEAST_CONNECTIONS:
+            return min(candidates, key=lambda b: (b.active_connections, b.total_connections))
+        if self.policy == POLICY_LOWEST_LATENCY:
+            measured = [b for b in candidates if b.latency_ms is not None]
+            if measured:
+                return min(measured, key=lambda b: b.latency_ms)
+        return candidates[next(self._round_robin) % len(candidates)]
+
+    async def _handle(self, reader, writer):
+        tried = []
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                writer.close()
+                return
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', backend.port)
+                break
+            except OSError:
+                backend.record_failure()
+                tried.append(backend)
+
+        backend.active_connections += 1
+        backend.total_connections += 1
+        try:
+            await relay(reader, writer, upstream_reader, upstream_writer, self.counters)
+        finally:
+            backend.active_connections -= 1
+
+    async def _check(self, backend: Backend):
+        try:
+            result = await race_targets(backend.port, self.health_check_targets, CHECK_TIMEOUT)
+            backend.record_latency(result['first_byte_ms'])
+            backend.record_success()
+        except (OSError, asyncio.TimeoutError):
+            backend.record_failure()
+
+    async def _health_loop(self):
+        while True:
+            if self.backends:
+                await asyncio.gather(*(self._check(backend) for backend in list(self.backends)))
+            await asyncio.sleep(self.check_interval)
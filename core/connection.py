@@ -1,107 +1,623 @@
+import asyncio
+import os
 import subprocess
-import psutil
+import threading
 import time
-from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from PyQt6.QtCore import QObject, pyqtSignal
 
-from utils.network import find_available_port
+from core.balancer import LoadBalancer
+from core.dns_proxy import DNS_PORT, DnsResolver
+from core.event_loop import get_background_loop
+from core.http_proxy import HTTP_PROXY_PORT, HttpProxy
+from core.pac import PAC_PORT, PacServer
+from core.relay import PortForwarder
+from core.resolver import preflight
+from core.router import ROUTER_PORT, RoutingRelay
+from core.socks import race_targets
+from core.ss_engine import NativeTunnelProcess
+from core.stats import StatsSampler
+from core.storage import load_settings, save_settings
+from core.supervisor import get_supervisor
+from core.tunnel_log import OutputWatcher
+from utils.network import allocate_port, release_port
 
+READY_TIMEOUT = 5.0
+ENGINE_SS_LOCAL = "ss-local"
+ENGINE_NATIVE = "native"
 
-class ConnectionWorker(QThread):
+SERVICE_PAC = "pac"
+SERVICE_ROUTER = "router"
+SERVICE_HTTP_PROXY = "http_proxy"
+SERVICE_DNS = "dns"
+# The local services that listen next to the tunnel and follow its public port, by settings key: a label for
+# messages, the class, and the port offered the first time the user enables it. All are off until enabled.
+SERVICES = {
+    SERVICE_PAC: ("PAC server", PacServer, PAC_PORT),
+    SERVICE_ROUTER: ("Routing relay", RoutingRelay, ROUTER_PORT),
+    SERVICE_HTTP_PROXY: ("HTTP proxy", HttpProxy, HTTP_PROXY_PORT),
+    SERVICE_DNS: ("DNS resolver", DnsResolver, DNS_PORT),
+}
+
+
+async def _accepts_connections(port: int) -> bool:
+    try:
+        _, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+async def _after(previous, coro):
+    """Awaits coro once previous, a concurrent future of an earlier step, has finished, whatever its outcome."""
+    if previous is not None and not previous.done():
+        await asyncio.gather(asyncio.wrap_future(previous), return_exceptions=True)
+    return await coro
+
+
+async def wait_until_ready(process, watcher: OutputWatcher, port: int, timeout: float = READY_TIMEOUT):
+    """
+    Waits until ss-local accepts connections on its local port.
+
+    Polls the port, and the "listening at" line in ss-local's output, with a short exponential backoff, so the
+    wait ends within a few milliseconds of ss-local becoming ready and can be cancelled at any point.
+
+    Raises:
+        ConnectionError: If the process exits before it is ready.
+        TimeoutError: If it does not become ready within the timeout.
     """
-    Worker thread to handle the Shadowsocks connection process and health check.
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    while True:
+        if process.poll() is not None:
+            await asyncio.get_running_loop().run_in_executor(None, watcher.join, 0.1)
+            raise ConnectionError(watcher.text() or "Process terminated unexpectedly.")
+        if watcher.listening.is_set() or await _accepts_connections(port):
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"ss-local did not start listening on port {port} within {timeout:.0f} seconds.")
+        await asyncio.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+class ConnectionAttempt(QObject):
+    """
+    One attempt to bring up a tunnel: pre-flight, spawn, wait until ready and verify, as stages of a coroutine on
+    the background event loop.
+
+    stop() cancels the attempt at whichever stage it is in and stops anything it started, so a superseded attempt
+    neither keeps running nor reports a result.
     """
     finished = pyqtSignal(bool, str, int, str)
 
-    def __init__(self, config, parent=None):
+    def __init__(self, config, health_check_targets=None, engine=ENGINE_SS_LOCAL, preferred_port=1080, after=None,
+                 parent=None):
         super().__init__(parent)
         self.config = config
-        self.local_port = 1080
+        self.health_check_targets = health_check_targets
+        self.engine = engine
+        self.preferred_port = preferred_port
+        # The concurrent future of the forwarder or load balancer start, or stop, the tunnel has to wait for: it
+        # sits behind that listener, or may want the port it is giving up.
+        self.after = after
+        self.local_port = None
+        self.port_reserved = False
         self.process = None
+        self.watcher = None
+        self.future = None
+        self.timings = {}
+        # stop() on the GUI thread and the end of run() on the loop decide under this lock which of them stops the
+        # tunnel: the concurrent future only learns the coroutine has finished once the loop has run its callback.
+        self._state_lock = threading.Lock()
+        self.stopped = False
+        self.finished_running = False
 
-    def run(self):
-        """Starts ss-local, then performs a health check."""
+    def start(self):
+        """Schedules the attempt on the background loop; finished is emitted unless it is stopped first."""
+        self.future = get_background_loop().submit(self.run())
+        self.future.add_done_callback(self._on_done)
+
+    def _on_done(self, future):
+        if future.cancelled() or self.stopped:
+            return
         server_id = self.config.get("id")
+        error = future.exception()
+        if error is None:
+            self.finished.emit(True, f"Connected on port {self.local_port}", self.local_port, server_id)
+        else:
+            error_msg = (f"Connection Failed. Please check server details.\n\n"
+                         f"<i style='color:#78909C'>Details: {str(error) or error.__class__.__name__}</i>")
+            self.finished.emit(False, error_msg, self.local_port or 0, server_id)
+
+    async def run(self):
+        """
+        Checks the server is reachable, starts the tunnel, waits until it listens, then performs a health check.
+        Whatever was started is stopped again if a stage fails or the attempt is cancelled.
+        """
         try:
-            self.local_port = find_available_port(1080)
-            command = [
-                'ss-local', '-s', self.config['server'], '-p', str(self.config['server_port']),
-                '-l', str(self.local_port), '-k', self.config['password'], '-m', self.config['method']
-            ]
-            self.process = subprocess.Popen(command, stderr=subprocess.PIPE, text=True)
+            start = time.perf_counter()
+            # Fails in milliseconds for unreachable servers and spares ss-local its own DNS lookup.
+            server_ip, rtt_ms = await preflight(self.config['server'], int(self.config['server_port']))
+            self.timings['preflight_ms'] = (time.perf_counter() - start) * 1000
+            print(f"Preflight: {self.config['server']} -> {server_ip} answered in {rtt_ms:.1f} ms")
 
-            time.sleep(0.75)
+            if self.after is not None:
+                # Shielded, as cancelling the attempt must not cancel the listener's start.
+                await asyncio.shield(asyncio.wrap_future(self.after))
+            self.local_port = allocate_port(self.preferred_port)
+            self.port_reserved = True
+            if self.engine == ENGINE_NATIVE:
+                # The built-in engine is listening as soon as it has been started.
+                native = NativeTunnelProcess(dict(self.config, server=server_ip), self.local_port)
+                await self.launch(lambda: native, "native")
+                # Shielded so cancelling the attempt leaves the listener to open and be stopped by the supervisor.
+                await asyncio.shield(asyncio.wrap_future(native.started))
+                self.timings['spawn_ms'] = self.timings['ready_ms'] = (time.perf_counter() - start) * 1000
+            else:
+                await self.launch(lambda: self.spawn(server_ip))
+                self.timings['spawn_ms'] = (time.perf_counter() - start) * 1000
 
-            if self.process.poll() is not None:
-                raise Exception(self.process.stderr.read() or "Process terminated unexpectedly.")
+                await wait_until_ready(self.process, self.watcher, self.local_port)
+                self.timings['ready_ms'] = (time.perf_counter() - start) * 1000
 
-            self.health_check()
+            await self.health_check()
+            self.timings['health_ms'] = (time.perf_counter() - start) * 1000
+            with self._state_lock:
+                if self.stopped:
+                    raise asyncio.CancelledError()
+                self.finished_running = True
+            # From here on a crash is an outage rather than a bad server, so the supervisor restarts it.
+            self.process.restart = True
+            print("Connect timings: " + ", ".join(f"{k} {v:.1f}" for k, v in self.timings.items()))
+        except BaseException:
+            self.stop_process()
+            raise
 
-            self.finished.emit(True, f"Connected on port {self.local_port}", self.local_port, server_id)
+    async def launch(self, start, name: str = "ss-local"):
+        """
+        Hands the tunnel to the supervisor on a worker thread: spawning a process and saving the pidfile would stall
+        every relay and service on the background loop. A tunnel whose launch outlives a cancelled attempt is
+        stopped as soon as it has started.
+        """
+        launching = asyncio.get_running_loop().run_in_executor(None, get_supervisor().launch, start, self.local_port,
+                                                               name)
+        try:
+            self.process = await asyncio.shield(launching)
+        except asyncio.CancelledError:
+            self.port_reserved = False
+            launching.add_done_callback(self._stop_launched)
+            raise
 
-        except Exception as e:
-            self.stop_process()
-            error_msg = f"Connection Failed. Please check server details.\n\n<i style='color:#78909C'>Details: {e}</i>"
-            self.finished.emit(False, error_msg, self.local_port, server_id)
+    def _stop_launched(self, launching):
+        if launching.exception():
+            release_port(self.local_port)
+        else:
+            get_supervisor().stop(launching.result())
 
-    def health_check(self):
-        """Uses curl to test connectivity through the new proxy."""
-        print(f"Health check: Pinging through port {self.local_port}")
-        curl_command = [
-            'curl', '--socks5-hostname', f'127.0.0.1:{self.local_port}',
-            '--head', '--connect-timeout', '5', 'https://www.google.com'
+    def spawn(self, server_ip: str):
+        """Starts ss-local for this attempt's server; also called by the supervisor to restart a crashed tunnel."""
+        command = [
+            'ss-local', '-s', server_ip, '-p', str(self.config['server_port']),
+            '-l', str(self.local_port), '-k', self.config['password'], '-m', self.config['method']
         ]
-        result = subprocess.run(curl_command, capture_output=True, text=True)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        self.watcher = OutputWatcher(process, self.local_port, self.config.get('name') or 'ss-local')
+        return process
 
-        if result.returncode != 0:
-            raise Exception(result.stderr or "Connection Refused by remote server.")
+    async def health_check(self):
+        """Requests the health check targets through the new proxy and records the phase timings."""
+        print(f"Health check: Pinging through port {self.local_port}")
+        result = await race_targets(self.local_port, self.health_check_targets)
+        print(f"Health check: {result['target']} answered (greeting {result['greeting_ms']:.1f} ms, "
+              f"connect {result['connect_ms']:.1f} ms, first byte {result['first_byte_ms']:.1f} ms)")
+        for phase in ('greeting_ms', 'connect_ms', 'first_byte_ms'):
+            self.timings[f"health_{phase}"] = result[phase]
 
     def stop_process(self):
+        """Hands the tunnel to the supervisor to stop in the background, or frees the port if none was started."""
         if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+            get_supervisor().stop(self.process)
             self.process = None
+        elif self.port_reserved:
+            release_port(self.local_port)
+        self.port_reserved = False
 
     def stop(self):
-        self.stop_process()
-        self.requestInterruption()
-        self.quit()
+        """Cancels the attempt if it is still in progress, otherwise stops the tunnel it brought up."""
+        with self._state_lock:
+            self.stopped = True
+            finished_running = self.finished_running
+        # Cancelling wakes the coroutine on the loop, which then stops whatever it had started itself; if it reaches
+        # the end first, it sees stopped and does the same.
+        if finished_running or not (self.future and self.future.cancel()):
+            self.stop_process()
 
 
 class ConnectionManager(QObject):
-    """Manages the connection worker thread lifecycle. Inherits from QObject to handle signals."""
+    """
+    Manages connection attempts and the tunnels they bring up. Inherits from QObject to handle signals.
+
+    With the warm standby enabled, the public local port is served by a PortForwarder and every tunnel runs on a
+    spare port behind it. A second, already health-checked tunnel is kept ready for the next-best server, so
+    switching to it only swaps the forwarder's backend.
+
+    The local services in SERVICES run only once enabled, and keep the port they first got from then on, so
+    addresses configured elsewhere stay valid; service_failed(name, message) is emitted when one cannot listen.
+    """
+    service_failed = pyqtSignal(str, str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.worker = None
         self.local_port = 1080
+        self.last_timings = {}
+        self.health_check_targets = None
+        self.engine = ENGINE_SS_LOCAL
+        self.callback = None
+        self.active = None
+        self.standby_enabled = False
+        self.standby = None
+        self.standby_worker = None
+        self.forwarder = None
+        self.balancer = None
+        # The last start or stop of the forwarder or load balancer on the public port, which the next one and new
+        # tunnels wait for.
+        self.listener_task = None
+        self.balanced_workers = []
+        # The running local services by name, the last start() or stop() of each, which the next one waits for, the
+        # ports reserved for them and the tunnel port they follow.
+        self.services = {}
+        self.service_tasks = {}
+        self.service_ports = {}
+        self.published_port = None
+        self.service_failed.connect(self._drop_failed_service)
+        self.stats_sampler = StatsSampler()
+        # Stops tunnels a crashed previous run left behind; reads one small file and returns.
+        get_supervisor().reap_orphans()
 
     def connect(self, config, callback):
-        self.disconnect()
-        self.worker = ConnectionWorker(config)
-        self.worker.finished.connect(callback)
+        self.callback = callback
+        if self._standby_matches(config):
+            self._promote_standby()
+            return
+
+        self._stop_active()
+        if self.standby_enabled:
+            self._start_forwarder()
+        else:
+            self._stop_standby()
+            self._stop_forwarder()
+        if self.standby_worker:
+            if self.standby_worker.config['id'] == config['id']:
+                # The standby for this server is still starting; it becomes the connection instead of a second tunnel.
+                self.worker, self.standby_worker = self.standby_worker, None
+                return
+            self.standby_worker.stop()
+            self.standby_worker = None
+        # Behind the forwarder the tunnel needs no well-known port; otherwise it gets 1080 when that is free.
+        self.worker = ConnectionAttempt(config, self.health_check_targets, self.engine,
+                                        preferred_port=None if self.forwarder else 1080, after=self.listener_task)
         self.worker.finished.connect(self.on_worker_finished)
         self.worker.start()
 
-    def on_worker_finished(self):
-        """Slot to clear the worker reference after it's done."""
+    def on_worker_finished(self, success, message, port, server_id):
+        """Slot that takes ownership of a successful tunnel and reports the result."""
+        worker = self.sender()
+        if worker is not self.worker:
+            # A newer request superseded this attempt; never report its result.
+            worker.stop_process()
+            return
+        self.last_timings = dict(worker.timings)
         self.worker = None
+        if not success and self.forwarder and self.forwarder.server is None:
+            # The forwarder could not listen; the next connect starts a new one.
+            self._stop_forwarder()
+        if success:
+            self.active = worker
+            self.stats_sampler.reset()
+            if self.forwarder:
+                self.forwarder.set_target(port)
+                port = self.forwarder.listen_port
+                message = f"Connected on port {port}"
+            self.local_port = port
+            self._publish_port(port)
+        if self.callback:
+            self.callback(success, message, port, server_id)
 
-    def disconnect(self):
-        """Stops the worker and kills any orphaned ss-local processes."""
-        print("Stopping Shadowsocks connection...")
-        if self.worker and self.worker.isRunning():
+    def connect_balanced(self, configs, policy, callback):
+        """
+        Starts one tunnel per server and spreads connections over them through a LoadBalancer on the public port.
+        The callback is invoked once per server as its tunnel comes up or fails.
+        """
+        self.disconnect()
+        self.callback = callback
+        self.balancer = LoadBalancer(None, policy, self.health_check_targets)
+        self._change_listener(self._open_listener(self.balancer))
+        self.stats_sampler.reset()
+        for config in configs:
+            worker = ConnectionAttempt(config, self.health_check_targets, self.engine, preferred_port=None,
+                                       after=self.listener_task)
+            worker.finished.connect(self.on_balanced_worker_finished)
+            self.balanced_workers.append(worker)
+            worker.start()
+
+    def on_balanced_worker_finished(self, success, message, port, server_id):
+        worker = self.sender()
+        if worker not in self.balanced_workers:
+            worker.stop_process()
+            return
+        if success:
+            get_background_loop().loop.call_soon_threadsafe(self.balancer.add_backend, server_id, port)
+            port = self.balancer.listen_port
+            # Known once the balancer has started, which every tunnel waits for.
+            self.local_port = port
+            self._publish_port(port)
+            message = f"Balancing on port {port}"
+        else:
+            self.balanced_workers.remove(worker)
+        if self.callback:
+            self.callback(success, message, port, server_id)
+
+    def remove_balanced(self, server_id):
+        """Takes one server out of the load balancer and stops its tunnel."""
+        for worker in [w for w in self.balanced_workers if w.config['id'] == server_id]:
+            worker.stop()
+            self.balanced_workers.remove(worker)
+        if self.balancer:
+            get_background_loop().loop.call_soon_threadsafe(self.balancer.remove_backend, server_id)
+
+    def balancer_snapshot(self) -> list:
+        """Returns the state of every load-balanced backend, or an empty list when not balancing."""
+        return self.balancer.snapshot() if self.balancer else []
+
+    def get_stats(self):
+        """
+        Returns a snapshot of the current tunnel's traffic and resource usage, or None when not connected.
+
+        Byte counts and throughput come from the relay counters when traffic passes through ProxyPal (built-in
+        engine, warm-standby forwarder or load balancer) and are None for a bare ss-local. CPU and RSS are those
+        of the ss-local processes, or of ProxyPal itself for the built-in engine. "dns" holds the tunneled DNS
+        resolver's hit rate and latency when it is running.
+        """
+        if self.balancer:
+            counters = self.balancer.counters
+            processes = [w.process for w in self.balanced_workers if w.process]
+            local_port = None
+        elif self.active and self.active.process:
+            processes = [self.active.process]
+            counters = self.forwarder.counters if self.forwarder else getattr(self.active.process, 'counters', None)
+            local_port = self.active.local_port
+        else:
+            return None
+        pids = {os.getpid() if process.pid is None else process.pid for process in processes}
+        stats = self.stats_sampler.sample(counters, pids, local_port)
+        stats["port"] = self.local_port
+        stats["engine"] = self.engine
+        stats["dns"] = self.services[SERVICE_DNS].stats() if SERVICE_DNS in self.services else None
+        return stats
+
+    def set_standby_enabled(self, enabled: bool):
+        """Turns the warm standby on or off. Enabling takes effect from the next connect."""
+        self.standby_enabled = enabled
+        if not enabled:
+            self._stop_standby()
+
+    def prepare_standby(self, config):
+        """Starts and health-checks a tunnel for the given server in the background, replacing any old standby."""
+        if not self.standby_enabled or not self.forwarder:
+            return
+        if self.active and self.active.config['id'] == config['id']:
+            return
+        if self._standby_matches(config) or (self.standby_worker and self.standby_worker.config['id'] == config['id']):
+            return
+        self._stop_standby()
+        self.standby_worker = ConnectionAttempt(config, self.health_check_targets, self.engine, preferred_port=None)
+        self.standby_worker.finished.connect(self.on_standby_finished)
+        self.standby_worker.start()
+
+    def on_standby_finished(self, success, message, port, server_id):
+        worker = self.sender()
+        if worker is self.worker:
+            # Adopted by connect() while it was starting.
+            self.on_worker_finished(success, message, port, server_id)
+            return
+        if worker is not self.standby_worker:
+            worker.stop_process()
+            return
+        self.standby_worker = None
+        if success:
+            print(f"Warm standby for {server_id} ready on port {port}")
+            self.standby = worker
+        else:
+            print(f"Warm standby for {server_id} failed: {message}")
+
+    def standby_server_id(self):
+        return self.standby.config['id'] if self.standby else None
+
+    def drop_standby(self, server_id):
+        """Stops the standby tunnel if it belongs to the given server."""
+        if self.standby_server_id() == server_id or (self.standby_worker and
+                                                     self.standby_worker.config['id'] == server_id):
+            self._stop_standby()
+
+    def _standby_matches(self, config) -> bool:
+        return (self.standby_enabled and self.forwarder is not None and self.standby is not None
+                and self.standby.config['id'] == config['id'] and self.standby.process is not None
+                and self.standby.process.poll() is None)
+
+    def _promote_standby(self):
+        """Hands the public port over to the standby tunnel, then retires the old one (make-before-break)."""
+        start = time.perf_counter()
+        old_active = self.active
+        self.active, self.standby = self.standby, None
+        self.forwarder.set_target(self.active.local_port)
+        self.last_timings = {'handover_ms': (time.perf_counter() - start) * 1000}
+        self.stats_sampler.reset()
+        if self.worker:
             self.worker.stop()
+        self.worker = None
+        if old_active:
+            old_active.stop_process()
+        self.local_port = self.forwarder.listen_port
+        self._publish_port(self.local_port)
+        print(f"Switched to warm standby {self.active.config['id']} on port {self.active.local_port}")
+        if self.callback:
+            self.callback(True, f"Connected on port {self.local_port}", self.local_port, self.active.config['id'])
+
+    def _change_listener(self, coro):
+        """Runs the start or stop of the forwarder or load balancer on the loop once the previous one is done."""
+        self.listener_task = get_background_loop().submit(_after(self.listener_task, coro))
+
+    @staticmethod
+    async def _open_listener(listener):
+        """Starts the forwarder or load balancer on the public port, 1080 when that is free."""
+        listener.listen_port = allocate_port(1080)
+        await listener.start()
+
+    @staticmethod
+    async def _close_listener(listener):
+        await listener.stop()
+        if listener.listen_port is not None:
+            release_port(listener.listen_port)
+
+    def _start_forwarder(self):
+        """Starts the forwarder in the background; tunnels behind it wait for it with ConnectionAttempt's after."""
+        if self.forwarder:
+            return
+        self.forwarder = PortForwarder(None)
+        self._change_listener(self._open_listener(self.forwarder))
+
+    def _stop_forwarder(self):
+        """Stops the forwarder and its connections in the background; the port is released once it has closed."""
+        if self.forwarder:
+            self._change_listener(self._close_listener(self.forwarder))
+            self.forwarder = None
+
+    def _stop_standby(self):
+        if self.standby_worker:
+            self.standby_worker.stop()
+            self.standby_worker = None
+        if self.standby:
+            self.standby.stop_process()
+            self.standby = None
 
-        for proc in psutil.process_iter(['pid', 'name']):
-            if 'ss-local' in proc.info['name']:
-                try:
-                    p = psutil.Process(proc.info['pid'])
-                    p.terminate()
-                    p.wait(timeout=1)
-                    print(f"Terminated orphaned ss-local process with PID {proc.info['pid']}")
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    pass
+    def _stop_active(self):
+        """Stops the pending worker and the active or load-balanced tunnels without waiting for them to exit."""
+        if self.worker:
+            self.worker.stop()
         self.worker = None
+        if self.active:
+            self.active.stop_process()
+            self.active = None
+        if self.forwarder:
+            self.forwarder.set_target(None)
+        for worker in self.balanced_workers:
+            worker.stop()
+        self.balanced_workers = []
+        if self.balancer:
+            # Closed in the background, connections included; the next listener on the port waits for it.
+            self._change_listener(self._close_listener(self.balancer))
+            self.balancer = None
+
+    def disconnect(self):
+        """
+        Stops every tunnel, including the warm standby. The processes exit in the background. Local services keep
+        listening and refuse, or send direct, what needs the tunnel until the next connect; stop_services() ends them.
+        """
+        print("Stopping Shadowsocks connection...")
+        self._stop_standby()
+        self._stop_active()
+        self._stop_forwarder()
+        self._publish_port(None)
+
+    def start_enabled_services(self):
+        """Starts the local services the user left enabled."""
+        for name, entry in load_settings().get("services", {}).items():
+            if name in SERVICES and entry.get("enabled") and name not in self.services:
+                self._enable_service(name, entry.get("port"))
+
+    def set_service_enabled(self, name: str, enabled: bool):
+        """Starts or stops one of the local services in SERVICES and remembers the choice and its port."""
+        settings = load_settings()
+        entry = settings.setdefault("services", {}).setdefault(name, {})
+        saved = dict(entry)
+        if enabled and name not in self.services:
+            port = self._enable_service(name, entry.get("port"))
+            if port is None:
+                return
+            entry["port"] = port
+        elif not enabled and name in self.services:
+            self._stop_service(name)
+        entry["enabled"] = enabled
+        if entry != saved:
+            save_settings(settings)
+
+    def stop_services(self):
+        """Stops every local service. The listeners and their connections are closed in the background."""
+        for name in list(self.services):
+            self._stop_service(name)
+
+    def _enable_service(self, name: str, port: int = None):
+        """
+        Reserves the service's port and starts it. Returns the port, or None after emitting service_failed.
+
+        A port used before is reserved exactly: moving the service would silently break the PAC URL or proxy
+        address the user configured for it. The reservation is kept while ProxyPal runs, also when the service is
+        turned off, so turning it back on does not race the old listener closing in the background.
+        """
+        label, service_class, default_port = SERVICES[name]
+        if name not in self.service_ports:
+            try:
+                self.service_ports[name] = allocate_port(port, exact=True) if port else allocate_port(default_port)
+            except IOError as e:
+                self.service_failed.emit(name, f"{label} could not listen on 127.0.0.1:{port}: {e}")
+                return None
+        port = self.service_ports[name]
+        self._start_service(name, service_class(port))
+        return port
+
+    def reload_rules(self):
+        """Recompiles the split-tunneling rule files in the background."""
+        for name in (SERVICE_PAC, SERVICE_ROUTER):
+            if name in self.services:
+                get_background_loop().submit(self.services[name].reload_rules())
+
+    def _start_service(self, name: str, service):
+        """
+        Starts a local service on the background loop, pointed at the current tunnel, once a previous instance has
+        stopped, and reports the outcome.
+        """
+        label = SERVICES[name][0]
+        self.services[name] = service
+        service.set_upstream(self.published_port)
+        future = get_background_loop().submit(_after(self.service_tasks.get(name), service.start()))
+        self.service_tasks[name] = future
+
+        def started(f):
+            if f.exception():
+                self.service_failed.emit(name, f"{label} could not listen on {service.address}: {f.exception()}")
+            else:
+                print(f"{label} listening on {service.address}")
+
+        future.add_done_callback(started)
+        return service
+
+    def _stop_service(self, name: str):
+        """Stops a local service in the background, keeping its port reserved; never waits for its clients."""
+        service = self.services.pop(name)
+        # Stopping waits for start() to finish, so a listener that was still being opened is closed as well.
+        self.service_tasks[name] = get_background_loop().submit(_after(self.service_tasks.get(name), service.stop()))
+
+    def _drop_failed_service(self, name: str, message: str):
+        """Forgets a service whose start() failed; runs on the GUI thread before other service_failed slots."""
+        print(message)
+        start = self.service_tasks.get(name)
+        if name in self.services and start.done() and start.exception():
+            # A listener opened before the failure, such as the resolver's UDP socket, is closed as well.
+            self._stop_service(name)
+
+    def _publish_port(self, port):
+        self.published_port = port
+        for service in self.services.values():
+            service.set_upstream(port)
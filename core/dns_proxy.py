@@ -0,0 +1,481 @@
+import asyncio
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+
+from core import socks
+from core.relay import ClientConnections
+
+DNS_PORT = 1053
+# Public resolvers reached through the tunnel, so lookups leave from the server rather than the local network.
+UPSTREAM_SERVERS = (("1.1.1.1", 53), ("8.8.8.8", 53))
+CACHE_SIZE = 10_000
+MAX_TTL = 86_400
+NEGATIVE_TTL = 60
+MAX_NEGATIVE_TTL = 900
+# A cached name asked for at least PREFETCH_MIN_HITS times is refreshed once it is into the last PREFETCH_FRACTION
+# of its TTL, so popular names never expire in front of a client.
+PREFETCH_MIN_HITS = 3
+PREFETCH_FRACTION = 0.1
+QUERY_TIMEOUT = 5.0
+UPSTREAM_ATTEMPTS = 2
+TCP_IDLE_TIMEOUT = 10.0
+LATENCY_SAMPLES = 1000
+
+HEADER = struct.Struct("!HHHHHH")
+RECORD = struct.Struct("!HHIH")
+TYPE_SOA = 6
+TYPE_OPT = 41
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+FLAG_RESPONSE = 0x8000
+FLAG_TRUNCATED = 0x0200
+FLAG_RECURSION_AVAILABLE = 0x0080
+OPCODE_AND_RD = 0x7900
+MIN_UDP_PAYLOAD = 512
+
+
+def _skip_name(message: bytes, offset: int) -> int:
+    """Returns the offset just past the possibly compressed domain name that starts at offset."""
+    while True:
+        length = message[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            return offset + 2
+        offset += length + 1
+
+
+def parse_query(message: bytes) -> tuple:
+    """
+    Reads the question of a DNS query.
+
+    Returns:
+        (key, question_end, udp_payload): the cache key (lower-case name, type, class), the offset where the
+        question ends, and the largest UDP response the client accepts, from its EDNS record if it sent one.
+
+    Raises:
+        ValueError: If the message is not a well-formed query with a single question.
+    """
+    try:
+        _, flags, questions, answers, authorities, additionals = HEADER.unpack_from(message)
+        if flags & FLAG_RESPONSE or questions != 1:
+            raise ValueError("Not a query with a single question.")
+        labels = []
+        offset = 12
+        while message[offset]:
+            length = message[offset]
+            if length & 0xC0:
+                raise ValueError("Compressed names are not expected in a question.")
+            labels.append(message[offset + 1:offset + 1 + length])
+            offset += length + 1
+        qtype, qclass = struct.unpack_from("!HH", message, offset + 1)
+        question_end = offset + 5
+        udp_payload = MIN_UDP_PAYLOAD
+        offset = question_end
+        for _ in range(answers + authorities + additionals):
+            offset = _skip_name(message, offset)
+            rtype, rclass, _, length = RECORD.unpack_from(message, offset)
+            if rtype == TYPE_OPT:
+                udp_payload = max(MIN_UDP_PAYLOAD, rclass)
+            offset += RECORD.size + length
+    except (IndexError, struct.error):
+        raise ValueError("Truncated DNS query.") from None
+    return (b".".join(labels).lower(), qtype, qclass), question_end, udp_payload
+
+
+def analyze_response(message: bytes) -> tuple:
+    """
+    Finds what caching a response needs to know.
+
+    Returns:
+        (ttl, negative, ttl_offsets): how long the response may be cached (None if it must not be), whether it
+        is a negative answer (NXDOMAIN or no data), and the offsets of every record's TTL field, so a cached copy
+        can be served with TTLs counted down.
+    """
+    _, flags, questions, answers, authorities, additionals = HEADER.unpack_from(message)
+    rcode = flags & 0xF
+    offset = 12
+    for _ in range(questions):
+        offset = _skip_name(message, offset) + 4
+    ttl_offsets, answer_ttls, negative_ttl = [], [], None
+    for index in range(answers + authorities + additionals):
+        offset = _skip_name(message, offset)
+        rtype, _, ttl, length = RECORD.unpack_from(message, offset)
+        # The OPT pseudo-record's TTL field holds EDNS flags, not a TTL.
+        if rtype != TYPE_OPT:
+            ttl_offsets.append(offset + 4)
+            if index < answers:
+                answer_ttls.append(ttl)
+            elif index < answers + authorities and rtype == TYPE_SOA:
+                # RFC 2308: a negative answer lives for the lesser of the SOA's own TTL and its MINIMUM field.
+                minimum = struct.unpack_from("!I", message, offset + RECORD.size + length - 4)[0]
+                negative_ttl = min(ttl, minimum)
+        offset += RECORD.size + length
+    if flags & FLAG_TRUNCATED or rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+        return None, False, ttl_offsets
+    if rcode == RCODE_NOERROR and answer_ttls:
+        return min(min(answer_ttls), MAX_TTL), False, ttl_offsets
+    return min(NEGATIVE_TTL if negative_ttl is None else negative_ttl, MAX_NEGATIVE_TTL), True, ttl_offsets
+
+
+def error_response(query: bytes, rcode: int, question_end: int = 12) -> bytes:
+    """Builds a reply to the query with the given error code, echoing its question when it could be parsed."""
+    query_id, flags = struct.unpack_from("!HH", query)
+    flags = FLAG_RESPONSE | (flags & OPCODE_AND_RD) | FLAG_RECURSION_AVAILABLE | rcode
+    return HEADER.pack(query_id, flags, 1 if question_end > 12 else 0, 0, 0, 0) + query[12:question_end]
+
+
+def truncate(response: bytes, query: bytes, question_end: int) -> bytes:
+    """Reduces a response too large for UDP to its header and question with TC set, so the client retries on TCP."""
+    query_id, flags = struct.unpack_from("!HH", response)
+    return HEADER.pack(query_id, flags | FLAG_TRUNCATED, 1, 0, 0, 0) + query[12:question_end]
+
+
+class CacheEntry:
+    __slots__ = ("response", "ttl", "negative", "ttl_offsets", "stored", "expires", "hits")
+
+    def __init__(self, response: bytes, ttl: int, negative: bool, ttl_offsets: list):
+        self.response = response
+        self.ttl = ttl
+        self.negative = negative
+        self.ttl_offsets = ttl_offsets
+        self.stored = time.monotonic()
+        self.expires = self.stored + ttl
+        self.hits = 0
+
+    def render(self, query_id: bytes, now: float) -> bytes:
+        """Returns the cached response under the client's query ID, with every TTL reduced by its age."""
+        message = bytearray(self.response)
+        message[:2] = query_id
+        age = int(now - self.stored)
+        if age:
+            for offset in self.ttl_offsets:
+                ttl = struct.unpack_from("!I", message, offset)[0]
+                struct.pack_into("!I", message, offset, max(0, ttl - age))
+        return bytes(message)
+
+
+class UpstreamConnection:
+    """
+    A DNS-over-TCP connection through the tunnel's SOCKS5 port to one resolver.
+
+    Queries are pipelined on it (RFC 7766) under IDs of its own and matched to their responses as they arrive in
+    any order, so concurrent lookups share one tunnel connection instead of paying a handshake each.
+    """
+
+    def __init__(self, proxy_port: int, server: tuple):
+        self.proxy_port = proxy_port
+        self.server = server
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.closed = False
+        self.read_task = None
+
+    async def connect(self):
+        self.reader, self.writer = await socks.open_connection(self.proxy_port, *self.server)
+        self.read_task = asyncio.create_task(self._read_responses())
+
+    async def query(self, message: bytes, timeout: float = QUERY_TIMEOUT) -> bytes:
+        """Sends one query and returns the response, which still carries this connection's query ID."""
+        if self.closed:
+            raise ConnectionError(f"The connection to {self.server[0]} is closed.")
+        query_id = random.getrandbits(16)
+        while query_id in self.pending:
+            query_id = random.getrandbits(16)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[query_id] = future
+        try:
+            self.writer.write(struct.pack("!HH", len(message), query_id) + message[2:])
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(query_id, None)
+
+    async def _read_responses(self):
+        error = ConnectionError(f"{self.server[0]} closed the connection.")
+        try:
+            while True:
+                length = int.from_bytes(await self.reader.readexactly(2), 'big')
+                response = await self.reader.readexactly(length)
+                future = self.pending.get(int.from_bytes(response[:2], 'big'))
+                if future and not future.done():
+                    future.set_result(response)
+        except (asyncio.IncompleteReadError, OSError) as e:
+            if isinstance(e, OSError):
+                error = e
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.writer.close()
+
+    def close(self):
+        self.closed = True
+        if self.read_task:
+            self.read_task.cancel()
+
+
+class DnsResolver:
+    """
+    A local DNS server that answers from a cache and forwards misses through the tunnel, so lookups neither leak
+    to the local network's resolver nor wait for it.
+
+    Queries arrive over UDP or TCP on 127.0.0.1 and are forwarded as DNS-over-TCP through the tunnel's SOCKS5
+    port. Answers are kept in an LRU cache for their TTL, and NXDOMAIN or empty answers for the SOA minimum
+    (RFC 2308); cached answers are served with their TTLs counted down. Identical queries in flight share one
+    upstream lookup, and popular names are refreshed before they expire. Cache hits on UDP are answered straight
+    from the datagram callback, without a task.
+    """
+
+    def __init__(self, listen_port: int, upstream_port: int = None, servers=UPSTREAM_SERVERS,
+                 cache_size: int = CACHE_SIZE):
+        self.listen_port = listen_port
+        self.upstream_port = upstream_port
+        self.servers = servers
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.connection = None
+        self.server_index = 0
+        self.udp_transport = None
+        self.tcp_server = None
+        self.tcp_clients = ClientConnections()
+        self.tasks = set()
+        self._connect_lock = asyncio.Lock()
+        self._stats_lock = threading.Lock()
+        self.counts = {"queries": 0, "cache_hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+                       "prefetches": 0, "failures": 0}
+        self.latencies = {"hit": deque(maxlen=LATENCY_SAMPLES), "miss": deque(maxlen=LATENCY_SAMPLES),
+                          "upstream": deque(maxlen=LATENCY_SAMPLES)}
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.listen_port}"
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.udp_transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self),
+                                                                    local_addr=('127.0.0.1', self.listen_port))
+        self.tcp_server = await asyncio.start_server(self.tcp_clients.track(self._handle_tcp), '127.0.0.1',
+                                                     self.listen_port)
+
+    async def stop(self):
+        if self.udp_transport:
+            self.udp_transport.close()
+            self.udp_transport = None
+        if self.tcp_server:
+            await self.tcp_clients.close(self.tcp_server)
+            self.tcp_server = None
+        if self.connection:
+            self.connection.close()
+            await asyncio.gather(self.connection.read_task, self.connection.writer.wait_closed(),
+                                 return_exceptions=True)
+            self.connection = None
+
+    def set_upstream(self, port):
+        """Forwards cache misses through the tunnel on this local SOCKS5 port; with None they fail."""
+        self.upstream_port = port
+
+    def answer_from_cache(self, query: bytes, key: tuple, now: float):
+        """Returns the cached response for the query, or None on a miss. Runs on the loop thread."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= now:
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        entry.hits += 1
+        self.counts["cache_hits"] += 1
+        if entry.negative:
+            self.counts["negative_hits"] += 1
+        if entry.hits >= PREFETCH_MIN_HITS and entry.expires - now < entry.ttl * PREFETCH_FRACTION \
+                and key not in self.inflight:
+            self.counts["prefetches"] += 1
+            self._lookup(key, query)
+        return entry.render(query[:2], now)
+
+    async def resolve(self, query: bytes):
+        """
+        Answers one query from the cache or through the tunnel.
+
+        Returns:
+            (response, question_end), where the response is an error reply if the lookup failed; response is
+            None if the message is too short to answer at all.
+        """
+        start = time.perf_counter()
+        try:
+            key, question_end, _ = parse_query(query)
+        except ValueError:
+            return (error_response(query, RCODE_FORMERR) if len(query) >= 12 else None), 12
+        self.counts["queries"] += 1
+        if query[2] & 0x78:
+            return error_response(query, RCODE_NOTIMP, question_end), question_end
+        response = self.answer_from_cache(query, key, time.monotonic())
+        if response is not None:
+            self._record("hit", start)
+            return response, question_end
+        self.counts["misses"] += 1
+        task = self.inflight.get(key)
+        if task:
+            self.counts["coalesced"] += 1
+        else:
+            task = self._lookup(key, query)
+        try:
+            response = await asyncio.shield(task)
+        except (OSError, asyncio.TimeoutError, ValueError):
+            self.counts["failures"] += 1
+            return error_response(query, RCODE_SERVFAIL, question_end), question_end
+        self._record("miss", start)
+        return query[:2] + response[2:], question_end
+
+    def _lookup(self, key: tuple, query: bytes) -> asyncio.Task:
+        """Starts the upstream lookup for a key, which caches its result; concurrent queries await the same task."""
+        task = asyncio.get_running_loop().create_task(self._fetch(key, query))
+        self.inflight[key] = task
+        # A prefetch has no waiter, so its failure is retrieved here to keep asyncio from logging it.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key: tuple, query: bytes) -> bytes:
+        try:
+            response = await self._forward(query)
+            ttl, negative, ttl_offsets = analyze_response(response)
+            if ttl:
+                self.cache[key] = CacheEntry(response, ttl, negative, ttl_offsets)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            return response
+        except (IndexError, struct.error):
+            raise ValueError("Malformed response from the upstream resolver.") from None
+        finally:
+            del self.inflight[key]
+
+    async def _forward(self, query: bytes) -> bytes:
+        errors = []
+        for _ in range(UPSTREAM_ATTEMPTS):
+            if self.upstream_port is None:
+                raise ConnectionError("ProxyPal is not connected.")
+            try:
+                connection = await self._connection()
+                start = time.perf_counter()
+                response = await connection.query(query)
+                self._record("upstream", start)
+                return response
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                errors.append(str(e) or e.__class__.__name__)
+                # Try the next resolver on a fresh connection.
+                self.server_index = (self.server_index + 1) % len(self.servers)
+                if self.connection:
+                    self.connection.close()
+                    self.connection = None
+        raise ConnectionError("; ".join(errors))
+
+    async def _connection(self) -> UpstreamConnection:
+        async with self._connect_lock:
+            connection = self.connection
+            if connection is None or connection.closed or connection.proxy_port != self.upstream_port:
+                if connection:
+                    connection.close()
+                connection = UpstreamConnection(self.upstream_port, self.servers[self.server_index])
+                await asyncio.wait_for(connection.connect(), QUERY_TIMEOUT)
+                self.connection = connection
+            return connection
+
+    async def _answer_udp(self, query: bytes, address, transport):
+        response, question_end = await self.resolve(query)
+        if response is not None and not transport.is_closing():
+            transport.sendto(self._fit_udp(response, query, question_end), address)
+
+    @staticmethod
+    def _fit_udp(response: bytes, query: bytes, question_end: int) -> bytes:
+        try:
+            udp_payload = parse_query(query)[2]
+        except ValueError:
+            udp_payload = MIN_UDP_PAYLOAD
+        return response if len(response) <= udp_payload else truncate(response, query, question_end)
+
+    async def _handle_tcp(self, reader, writer):
+        """Serves length-prefixed queries on one TCP connection, answering each as soon as it is resolved."""
+        answers = set()
+
+        async def answer(query):
+            response, _ = await self.resolve(query)
+            if response is not None:
+                writer.write(len(response).to_bytes(2, 'big') + response)
+
+        try:
+            while True:
+                length = int.from_bytes(await asyncio.wait_for(reader.readexactly(2), TCP_IDLE_TIMEOUT), 'big')
+                task = asyncio.create_task(answer(await reader.readexactly(length)))
+                answers.add(task)
+                task.add_done_callback(answers.discard)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError):
+            pass
+        except asyncio.CancelledError:
+            # Stopping: the client is gone, so the pending answers are dropped.
+            for task in answers:
+                task.cancel()
+            raise
+        finally:
+            if answers:
+                await asyncio.gather(*answers, return_exceptions=True)
+            writer.close()
+
+    def _record(self, kind: str, start: float):
+        with self._stats_lock:
+            self.latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    def stats(self) -> dict:
+        """
+        Returns the query counters, the cache hit rate and the median and 95th percentile latency, in ms, of
+        cache hits, misses and the upstream lookups behind them over the last LATENCY_SAMPLES of each.
+        """
+        with self._stats_lock:
+            samples = {kind: sorted(values) for kind, values in self.latencies.items()}
+        stats = dict(self.counts)
+        answered = stats["cache_hits"] + stats["misses"]
+        stats["hit_rate"] = stats["cache_hits"] / answered if answered else None
+        stats["cached_names"] = len(self.cache)
+        for kind, values in samples.items():
+            stats[f"{kind}_ms"] = {"median": round(values[len(values) // 2], 3),
+                                   "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3)} \
+                if values else None
+        return stats
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver: DnsResolver):
+        self.resolver = resolver
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        resolver = self.resolver
+        start = time.perf_counter()
+        try:
+            key, question_end, _ = parse_query(data)
+        except ValueError:
+            key = None
+        # Cache hits are answered right here; only misses and malformed queries need a task.
+        if key is not None and not data[2] & 0x78:
+            response = resolver.answer_from_cache(data, key, time.monotonic())
+            if response is not None:
+                resolver.counts["queries"] += 1
+                resolver._record("hit", start)
+                self.transport.sendto(resolver._fit_udp(response, data, question_end), address)
+                return
+        task = asyncio.get_running_loop().create_task(resolver._answer_udp(data, address, self.transport))
+        resolver.tasks.add(task)
+        task.add_done_callback(resolver.tasks.discard)
@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+_lock = threading.Lock()
+_background_loop = None
+
+
+class BackgroundLoop:
+    """
+    An asyncio event loop running forever on a daemon thread.
+    Long-lived local listeners (forwarders, relays) are hosted here so the GUI thread never blocks on them.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ProxyPalLoop", daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the loop and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout: float = None):
+        """Runs a coroutine on the loop and blocks until it returns."""
+        return self.submit(coro).result(timeout)
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Returns the process-wide background loop, starting it on first use."""
+    global _background_loop
+    with _lock:
+        if _background_loop is None:
+            _background_loop = BackgroundLoop()
+        return _background_loop
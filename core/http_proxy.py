@@ -0,0 +1,198 @@
+import asyncio
+import socket
+from urllib.parse import urlsplit
+
+from core import socks
+from core.relay import relay_sockets
+from core.stats import TrafficCounters
+
+HTTP_PROXY_PORT = 1087
+MAX_REQUEST_HEAD = 16 * 1024
+HANDSHAKE_TIMEOUT = 10.0
+CONNECT_TIMEOUT = 10.0
+READ_SIZE = 4096
+
+CONNECT_ESTABLISHED = b"HTTP/1.1 200 Connection Established\r\n\r\n"
+# Headers about the client's connection to this proxy, which are not passed on to the origin server.
+HOP_BY_HOP_HEADERS = {b"connection", b"proxy-connection", b"keep-alive", b"proxy-authorization", b"te", b"trailer"}
+
+
+def parse_request(head: bytes) -> tuple:
+    """
+    Parses the head of a proxy request, without the blank line that ends it.
+
+    CONNECT requests name the destination as host:port. Other requests carry an absolute http:// URL; they are
+    rewritten to the origin form a server expects, with the hop-by-hop headers replaced by "Connection: close",
+    so each client connection carries one request and the relay can pass the response through untouched.
+
+    Returns:
+        (host, port, request) where request is the rewritten head to send upstream, or None for CONNECT.
+
+    Raises:
+        ValueError: If the request is malformed or cannot be proxied.
+    """
+    lines = head.split(b"\r\n")
+    parts = lines[0].split()
+    if len(parts) != 3:
+        raise ValueError("Malformed request line.")
+    method, target, version = parts
+    if method == b"CONNECT":
+        url = urlsplit("//" + target.decode("latin-1"))
+        if not url.hostname:
+            raise ValueError("CONNECT needs a host:port target.")
+        return url.hostname, url.port or 443, None
+
+    url = urlsplit(target.decode("latin-1"))
+    if url.scheme != "http" or not url.hostname:
+        raise ValueError("Only absolute http:// URLs can be forwarded; HTTPS goes through CONNECT.")
+    path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+    headers = [line for line in lines[1:] if line.split(b":", 1)[0].strip().lower() not in HOP_BY_HOP_HEADERS]
+    names = {line.split(b":", 1)[0].strip().lower() for line in headers}
+    if b"host" not in names:
+        headers.insert(0, b"Host: " + url.netloc.encode("latin-1"))
+    headers.append(b"Connection: upgrade" if b"upgrade" in names else b"Connection: close")
+    request = b"\r\n".join([b" ".join((method, path.encode("latin-1"), version))] + headers) + b"\r\n\r\n"
+    return url.hostname, url.port or 80, request
+
+
+def _response(status: str, message: str = "") -> bytes:
+    body = message.encode() + b"\n" if message else b""
+    return (f"HTTP/1.1 {status}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n").encode() + body
+
+
+async def read_head(sock: socket.socket) -> tuple:
+    """
+    Reads a request head from a client socket.
+
+    Returns:
+        (head, rest): the head without its final blank line, and any bytes the client sent after it.
+    """
+    loop = asyncio.get_running_loop()
+    data = bytearray()
+    while True:
+        chunk = await loop.sock_recv(sock, READ_SIZE)
+        if not chunk:
+            raise ConnectionError("The client closed the connection before sending a request.")
+        data += chunk
+        end = data.find(b"\r\n\r\n", max(0, len(data) - len(chunk) - 3))
+        if end >= 0:
+            return bytes(data[:end]), bytes(data[end + 4:])
+        if len(data) > MAX_REQUEST_HEAD:
+            raise ValueError("Request head too large.")
+
+
+class HttpProxy:
+    """
+    A local HTTP proxy that bridges tools that only speak HTTP into the tunnel's SOCKS5 port.
+
+    HTTPS and other TLS traffic uses CONNECT; plain http:// requests are forwarded one per connection. Once the
+    tunnel has connected to the destination the proxy only moves bytes, between raw sockets: spliced through the
+    kernel on Linux, and through pooled buffers elsewhere, so a transfer allocates nothing per chunk.
+    """
+
+    def __init__(self, listen_port: int, upstream_port: int = None, zero_copy: bool = True):
+        self.listen_port = listen_port
+        self.upstream_port = upstream_port
+        self.zero_copy = zero_copy
+        self.listener = None
+        self.accept_task = None
+        self.connections = set()
+        self.counters = TrafficCounters()
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.listen_port}"
+
+    async def start(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(('127.0.0.1', self.listen_port))
+            listener.listen(socket.SOMAXCONN)
+            listener.setblocking(False)
+        except OSError:
+            listener.close()
+            raise
+        self.listener = listener
+        self.accept_task = asyncio.create_task(self._accept_loop())
+
+    async def stop(self):
+        if self.accept_task:
+            self.accept_task.cancel()
+            await asyncio.gather(self.accept_task, return_exceptions=True)
+            self.accept_task = None
+        if self.listener:
+            self.listener.close()
+            self.listener = None
+        # Open connections would otherwise keep relaying through a proxy the user turned off.
+        connections = list(self.connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+
+    def set_upstream(self, port):
+        """Bridges new requests into the tunnel on this local SOCKS5 port; with None they are refused."""
+        self.upstream_port = port
+
+    async def _accept_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                client, _ = await loop.sock_accept(self.listener)
+            except OSError as e:
+                print(f"HTTP proxy could not accept a connection: {e}")
+                await asyncio.sleep(0.1)
+                continue
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # The loop only keeps weak references to tasks.
+            task = loop.create_task(self._handle(client))
+            self.connections.add(task)
+            task.add_done_callback(self.connections.discard)
+
+    async def _handle(self, client: socket.socket):
+        loop = asyncio.get_running_loop()
+        upstream = None
+        try:
+            try:
+                head, rest = await asyncio.wait_for(read_head(client), HANDSHAKE_TIMEOUT)
+                host, port, request = parse_request(head)
+            except ValueError as e:
+                await self._respond(client, "400 Bad Request", str(e))
+                return
+            except (asyncio.TimeoutError, OSError):
+                return
+
+            upstream_port = self.upstream_port
+            if upstream_port is None:
+                await self._respond(client, "503 Service Unavailable", "ProxyPal is not connected.")
+                return
+            try:
+                upstream = await asyncio.wait_for(socks.connect_socket(upstream_port, host, port), CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self._respond(client, "504 Gateway Timeout", f"No answer from {host}:{port}.")
+                return
+            except (OSError, ValueError) as e:
+                await self._respond(client, "502 Bad Gateway", str(e))
+                return
+
+            if request is None:
+                await loop.sock_sendall(client, CONNECT_ESTABLISHED)
+            else:
+                await loop.sock_sendall(upstream, request)
+            if rest:
+                await loop.sock_sendall(upstream, rest)
+            await relay_sockets(client, upstream, self.counters, self.zero_copy)
+        except OSError:
+            pass
+        finally:
+            client.close()
+            if upstream:
+                upstream.close()
+
+    @staticmethod
+    async def _respond(client: socket.socket, status: str, message: str):
+        try:
+            await asyncio.get_running_loop().sock_sendall(client, _response(status, message))
+        except OSError:
+            pass
@@ -0,0 +1,232 @@
+import base64
+import binascii
+import codecs
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.parser import build_access_key, parse_access_key
+from utils.network import normalize_host
+
+READ_SIZE = 64 * 1024
+BATCH_SIZE = 500
+# Validation moves to a process pool once this many batches have been read; smaller imports are not worth
+# the cost of starting the workers.
+PARALLEL_AFTER_BATCHES = 4
+MAX_WORKERS = 4
+MAX_REPORTED_ERRORS = 20
+
+
+def read_file(path: str):
+    """Yields the contents of a text file in chunks."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _iter_tokens(chunks):
+    """Yields whitespace-separated tokens from text chunks, without holding more than one chunk in memory."""
+    remainder = ""
+    for chunk in chunks:
+        tokens = (remainder + chunk).split()
+        if not tokens:
+            remainder = ""
+            continue
+        # The last token may continue in the next chunk, unless the chunk ended with whitespace.
+        remainder = "" if chunk[-1:].isspace() else tokens.pop()
+        yield from tokens
+    if remainder:
+        yield remainder
+
+
+def _decode_base64_stream(chunks):
+    """Decodes a base64 (standard or URL-safe, padded or not) stream into text chunks."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        pending += "".join(chunk.split()).replace('-', '+').replace('_', '/').rstrip('=')
+        usable = len(pending) - len(pending) % 4
+        if usable:
+            yield decoder.decode(base64.b64decode(pending[:usable]))
+            pending = pending[usable:]
+    if pending:
+        yield decoder.decode(base64.b64decode(pending + '=' * (-len(pending) % 4)))
+    yield decoder.decode(b'', final=True)
+
+
+def _sip008_keys(text: str):
+    """Yields access keys for the servers of a SIP008 JSON document."""
+    document = json.loads(text)
+    servers = document.get('servers', []) if isinstance(document, dict) else document
+    for server in servers:
+        try:
+            yield build_access_key(server['server'], server['server_port'], server['method'], server['password'],
+                                   server.get('remarks'))
+        except (KeyError, TypeError, ValueError):
+            yield f"invalid SIP008 entry {server.get('id', '') if isinstance(server, dict) else ''}".strip()
+
+
+def iter_access_keys(chunks):
+    """
+    Yields access keys from plain text, a base64-encoded subscription or a SIP008 JSON document.
+
+    The format is detected from the first non-blank characters. Plain and base64 input is processed as it
+    arrives; SIP008 JSON is parsed once complete, as the json module cannot parse incrementally.
+
+    Raises:
+        ValueError: If base64 or JSON input is malformed.
+    """
+    chunks = iter(chunks)
+    head = ""
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+    stripped = head.lstrip()
+    if not stripped:
+        return
+
+    def all_chunks():
+        yield head
+        yield from chunks
+
+    try:
+        if stripped[0] in '{[':
+            yield from _sip008_keys("".join(all_chunks()))
+        elif stripped.startswith("ss://"):
+            yield from _iter_tokens(all_chunks())
+        else:
+            yield from _iter_tokens(_decode_base64_stream(all_chunks()))
+    except (binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read the import data. Details: {e}")
+
+
+def identity(config: dict) -> tuple:
+    """The normalised (host, port, method, password) tuple used to detect the same server under different keys."""
+    return (normalize_host(config['server']), int(config['server_port']), config['method'].lower(),
+            config['password'])
+
+
+def validate_batch(keys: list) -> list:
+    """Parses a batch of keys, returning (config, None) or (None, error) for each. Runs in worker processes."""
+    results = []
+    for key in keys:
+        try:
+            results.append((parse_access_key(key), None))
+        except ValueError as e:
+            results.append((None, f"{key[:40]}: {e}"))
+    return results
+
+
+def _batches(keys):
+    batch = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_servers(chunks, registry, on_progress=None, is_cancelled=None) -> dict:
+    """
+    Imports access keys into the registry.
+
+    Keys are validated in batches as they are read, in a process pool for large imports, and deduplicated on
+    identity() against both the stored servers and the rest of the import. All new servers are committed in one
+    write at the end, so a cancelled or failed import adds nothing.
+
+    Args:
+        chunks: An iterable of text chunks, e.g. read_file(path) or [pasted_text].
+        registry: The ServerRegistry to add the servers to.
+        on_progress: Called with (keys validated, keys read so far) after every batch.
+        is_cancelled: Polled between batches; the import stops without saving once it returns True.
+
+    Returns:
+        A summary with the added configurations and the number of duplicate and invalid keys.
+    """
+    summary = {"added": [], "duplicates": 0, "invalid": 0, "errors": [], "cancelled": False}
+    seen = set()
+    new_configs = []
+    read = validated = 0
+    executor = None
+    pending = deque()
+
+    def collect(results):
+        nonlocal validated
+        validated += len(results)
+        for config, error in results:
+            if config is None:
+                summary["invalid"] += 1
+                if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                    summary["errors"].append(error)
+                continue
+            key = identity(config)
+            if key in seen or registry.find_duplicate(config) is not None or registry.contains(config['id']):
+                summary["duplicates"] += 1
+                continue
+            seen.add(key)
+            new_configs.append(config)
+        if on_progress:
+            on_progress(validated, read)
+
+    try:
+        for index, batch in enumerate(_batches(iter_access_keys(chunks))):
+            if is_cancelled and is_cancelled():
+                summary["cancelled"] = True
+                return summary
+            read += len(batch)
+            if executor is None and index >= PARALLEL_AFTER_BATCHES:
+                workers = min(MAX_WORKERS, os.cpu_count() or 1)
+                try:
+                    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else False
+                except (OSError, NotImplementedError):
+                    executor = False
+            if executor:
+                pending.append(executor.submit(validate_batch, batch))
+                # Results are collected in order, so the first of several duplicates is the one kept.
+                while pending and (pending[0].done() or len(pending) > MAX_WORKERS * 2):
+                    collect(pending.popleft().result())
+            else:
+                collect(validate_batch(batch))
+        while pending:
+            if is_cancelled and is_cancelled():
+                summary["cancelled"] = True
+                return summary
+            collect(pending.popleft().result())
+    except BrokenProcessPool:
+        raise ValueError("The import was interrupted because a validation worker stopped unexpectedly.")
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    summary["added"] = registry.add_many(new_configs)
+    return summary
+
+
+class ImportWorker(QThread):
+    """Runs import_servers() off the GUI thread. Call requestInterruption() to cancel."""
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, registry, path: str = None, text: str = None, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self.path = path
+        self.text = text
+
+    def run(self):
+        try:
+            chunks = read_file(self.path) if self.path else [self.text or ""]
+            summary = import_servers(chunks, self.registry, self.progress.emit, self.isInterruptionRequested)
+        except (OSError, ValueError) as e:
+            summary = {"added": [], "duplicates": 0, "invalid": 0, "errors": [str(e)], "cancelled": False,
+                       "failed": True}
+        self.finished.emit(summary)
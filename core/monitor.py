@@ -0,0 +1,134 @@
+import random
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from core.event_loop import get_background_loop
+from core.socks import race_targets
+
+BASE_INTERVAL = 10.0
+MAX_INTERVAL = 60.0
+RETRY_INTERVAL = 1.0
+MAX_RETRY_INTERVAL = 8.0
+FAILURE_THRESHOLD = 3
+JITTER = 0.2
+CHECK_TIMEOUT = 5.0
+
+
+class HealthMonitor(QObject):
+    """
+    Periodically health-checks the active tunnel and asks for a failover when it stays unreachable.
+
+    A healthy tunnel is checked less and less often, up to MAX_INTERVAL. After a failure the monitor retries with
+    exponential backoff starting at RETRY_INTERVAL, and emits failover_needed once FAILURE_THRESHOLD consecutive
+    checks have failed. Every interval is randomised by +/- JITTER. Checks run on the background event loop, so
+    no thread is created per check.
+    """
+    failover_needed = pyqtSignal(str)
+    _check_done = pyqtSignal(int, bool, float, str)
+
+    def __init__(self, parent=None, base_interval=BASE_INTERVAL, max_interval=MAX_INTERVAL,
+                 retry_interval=RETRY_INTERVAL, max_retry_interval=MAX_RETRY_INTERVAL,
+                 failure_threshold=FAILURE_THRESHOLD, jitter=JITTER):
+        super().__init__(parent)
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.failure_threshold = failure_threshold
+        self.jitter = jitter
+        self.health_check_targets = None
+
+        self.server_id = None
+        self.port = None
+        self.interval = base_interval
+        self.consecutive_failures = 0
+        self.generation = 0
+        self.failover_started = None
+        self.stats = {"checks": 0, "failures": 0, "failovers": 0, "failed_failovers": 0,
+                      "last_check_ms": None, "last_failover_ms": None}
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.run_check)
+        self._check_done.connect(self.on_check_done)
+
+    def start(self, server_id: str, port: int):
+        """Starts monitoring the tunnel for the given server on the given local port."""
+        self.generation += 1
+        self.server_id = server_id
+        self.port = port
+        self.interval = self.base_interval
+        self.consecutive_failures = 0
+        self._schedule(self.interval)
+
+    def stop(self):
+        self.generation += 1
+        self.timer.stop()
+        self.server_id = None
+        self.port = None
+
+    def _schedule(self, seconds: float):
+        seconds *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.timer.start(int(seconds * 1000))
+
+    def run_check(self):
+        if self.port is None:
+            return
+        generation = self.generation
+        future = get_background_loop().submit(race_targets(self.port, self.health_check_targets, CHECK_TIMEOUT))
+
+        def done(f):
+            try:
+                result = f.result()
+                self._check_done.emit(generation, True, result['first_byte_ms'], "")
+            except Exception as e:
+                self._check_done.emit(generation, False, 0.0, str(e) or e.__class__.__name__)
+
+        future.add_done_callback(done)
+
+    def on_check_done(self, generation, success, elapsed_ms, error):
+        if generation != self.generation:
+            return
+        self.stats["checks"] += 1
+        if success:
+            self.stats["last_check_ms"] = elapsed_ms
+            self.consecutive_failures = 0
+            self.interval = min(self.interval * 1.5, self.max_interval)
+            self._schedule(self.interval)
+            return
+
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        print(f"Health monitor: check {self.consecutive_failures}/{self.failure_threshold} "
+              f"for {self.server_id} failed: {error}")
+        if self.consecutive_failures >= self.failure_threshold:
+            server_id = self.server_id
+            self.stop()
+            self.failover_started = time.perf_counter()
+            self.failover_needed.emit(server_id)
+            return
+        self.interval = self.base_interval
+        backoff = self.retry_interval * 2 ** (self.consecutive_failures - 1)
+        self._schedule(min(backoff, self.max_retry_interval))
+
+    def is_failing_over(self) -> bool:
+        return self.failover_started is not None
+
+    def cancel_failover(self):
+        """Drops the failover started by the last failover_needed signal without counting it, e.g. on a disconnect."""
+        self.failover_started = None
+
+    def complete_failover(self, success: bool):
+        """Records the outcome and duration of the failover started by the last failover_needed signal."""
+        if self.failover_started is None:
+            return
+        elapsed_ms = (time.perf_counter() - self.failover_started) * 1000
+        self.failover_started = None
+        if success:
+            self.stats["failovers"] += 1
+            self.stats["last_failover_ms"] = elapsed_ms
+            print(f"Health monitor: failover completed in {elapsed_ms:.0f} ms "
+                  f"({self.stats['failovers']} failovers so far)")
+        else:
+            self.stats["failed_failovers"] += 1
+            print("Health monitor: failover failed, no healthy server left.")
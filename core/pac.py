@@ -0,0 +1,158 @@
+import asyncio
+import json
+
+from core.relay import ClientConnections
+from core.rules import DIRECT, RuleSet, load_rules
+
+PAC_PORT = 1090
+PAC_PATH = "/proxy.pac"
+MAX_REQUEST_HEAD = 8192
+
+# The trie walk and the range search below run for every request the browser makes, so they only index objects
+# and compare numbers; no DNS lookups (dnsResolve) are made, and IP rules apply to hosts given as addresses.
+PAC_TEMPLATE = """var DEFAULT = %(default)d;
+var DOMAINS = %(domains)s;
+var RANGES = %(ranges)s;
+var hasOwn = Object.prototype.hasOwnProperty;
+
+function domainAction(host) {
+    var labels = host.split(".");
+    var node = DOMAINS, action = 0;
+    for (var i = labels.length - 1; i >= 0; i--) {
+        if (!hasOwn.call(node, labels[i])) break;
+        node = node[labels[i]];
+        if (typeof node === "number") return node;
+        if (hasOwn.call(node, "")) action = node[""];
+    }
+    return action;
+}
+
+function rangeAction(host) {
+    var parts = host.split(".");
+    var ip = ((+parts[0] * 256 + +parts[1]) * 256 + +parts[2]) * 256 + +parts[3];
+    var low = 0, high = RANGES.length / 3 - 1;
+    while (low <= high) {
+        var mid = (low + high) >> 1;
+        if (ip < RANGES[mid * 3]) high = mid - 1;
+        else if (ip > RANGES[mid * 3 + 1]) low = mid + 1;
+        else return RANGES[mid * 3 + 2];
+    }
+    return 0;
+}
+
+function FindProxyForURL(url, host) {
+    host = host.toLowerCase();
+    var action = 0;
+    // IPv6 literals follow the default action.
+    if (host.indexOf(":") < 0) {
+        if (host.indexOf(".") < 0) return "DIRECT";
+        action = /^\\d+\\.\\d+\\.\\d+\\.\\d+$/.test(host) ? rangeAction(host) : domainAction(host);
+    }
+    return (action || DEFAULT) === %(direct)d ? "DIRECT" : PROXY;
+}
+"""
+
+# Served while no tunnel is up, so browsers keep working instead of failing against a closed port.
+DIRECT_PAC = 'function FindProxyForURL(url, host) {\n    return "DIRECT";\n}\n'
+
+
+def compile_pac(rules: RuleSet) -> str:
+    """Renders the rules as the body of a PAC file, everything but the proxy address, which proxy_line() adds."""
+    ranges = [value for first, last, action in rules.ipv4_ranges for value in (first, last, action)]
+    return PAC_TEMPLATE % {
+        "default": rules.default_action,
+        "direct": DIRECT,
+        "domains": json.dumps(rules.domains.compact(), separators=(',', ':')),
+        "ranges": json.dumps(ranges, separators=(',', ':')),
+    }
+
+
+def proxy_line(proxy_port: int) -> str:
+    return f'var PROXY = "SOCKS5 127.0.0.1:{proxy_port}; SOCKS 127.0.0.1:{proxy_port}";\n'
+
+
+def generate_pac(rules: RuleSet, proxy_port: int) -> str:
+    """
+    Generates a PAC file that sends the rules' direct hosts straight out and everything else through the SOCKS5
+    proxy on the given local port.
+    """
+    return proxy_line(proxy_port) + compile_pac(rules)
+
+
+class PacServer:
+    """
+    A minimal HTTP listener on the background loop that serves the PAC file for the system proxy settings.
+
+    The rules are compiled once, off the loop, into the PAC text; a change of the tunnel's public port only swaps
+    its first line, and each request just writes out cached bytes.
+    """
+
+    def __init__(self, listen_port: int):
+        self.listen_port = listen_port
+        self.server = None
+        self.clients = ClientConnections()
+        self.rules = None
+        self.compiled = None
+        self.proxy_port = None
+        self.body = DIRECT_PAC.encode()
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.listen_port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.listen_port}{PAC_PATH}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.clients.track(self._handle), '127.0.0.1', self.listen_port,
+                                                 limit=MAX_REQUEST_HEAD)
+        await self.reload_rules()
+
+    async def stop(self):
+        if self.server:
+            await self.clients.close(self.server)
+            self.server = None
+
+    async def reload_rules(self):
+        """Recompiles the rule files on a worker thread and starts serving the result."""
+
+        def load():
+            rules = load_rules()
+            return rules, compile_pac(rules)
+
+        self.rules, self.compiled = await asyncio.get_running_loop().run_in_executor(None, load)
+        print(f"Split tunneling rules loaded: {self.rules.stats()}")
+        self._update()
+
+    def set_upstream(self, port):
+        """Points the PAC at the tunnel's public port, or sends everything direct when port is None."""
+        self.proxy_port = port
+        self._update()
+
+    def _update(self):
+        if self.proxy_port is None or self.compiled is None:
+            self.body = DIRECT_PAC.encode()
+        else:
+            self.body = (proxy_line(self.proxy_port) + self.compiled).encode()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line = head.split(b'\r\n', 1)[0].decode('latin-1').split()
+            if len(request_line) < 2 or request_line[0] not in ("GET", "HEAD"):
+                writer.write(b"HTTP/1.1 405 Method Not Allowed\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            elif request_line[1].split('?', 1)[0] not in (PAC_PATH, "/"):
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            else:
+                body = self.body
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ns-proxy-autoconfig\r\n"
+                             b"Cache-Control: no-cache\r\nConnection: close\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body))
+                if request_line[0] == "GET":
+                    writer.write(body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
@@ -1,6 +1,6 @@
 import base64
 import binascii
-from urllib.parse import urlparse, parse_qs, unquote
+from urllib.parse import urlparse, parse_qs, quote, unquote
 
 
 def parse_access_key(key: str) -> dict:
@@ -58,5 +58,28 @@ def parse_access_key(key: str) -> dict:
         config['name'] = f"Outline Server ({server})"
     elif 'name' in query_params:
         config['name'] = unquote(query_params['name'][0])
+    elif parsed_url.fragment:
+        config['name'] = unquote(parsed_url.fragment)
 
     return config
+
+
+def build_access_key(server: str, server_port: int, method: str, password: str, name: str = None) -> str:
+    """
+    Builds an ss:// access key that parse_access_key() accepts, e.g. for servers imported from SIP008 JSON.
+
+    Args:
+        server: The server host name or IP address.
+        server_port: The server port.
+        method: The encryption method.
+        password: The password.
+        name: An optional display name, stored in the key's 'name' query parameter.
+
+    Returns:
+        The access key string.
+    """
+    user_info = base64.urlsafe_b64encode(f"{method}:{password}".encode('utf-8')).decode('ascii').rstrip('=')
+    key = f"ss://{user_info}@{server}:{int(server_port)}"
+    if name:
+        key += f"/?name={quote(name)}"
+    return key
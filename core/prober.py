@@ -0,0 +1,159 @@
+import asyncio
+import subprocess
+import time
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.resolver import get_resolver, happy_eyeballs
+from core.socks import check_target
+from core.ss_engine import NativeTunnel
+from core.supervisor import get_supervisor
+from utils.network import allocate_port, release_port
+
+PROBE_TARGET = "http://www.google.com/generate_204"
+MAX_CONCURRENCY = 8
+TCP_TIMEOUT = 3.0
+ROUNDTRIP_TIMEOUT = 8.0
+
+
+async def _close_writer(writer):
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+
+
+async def measure_tcp_rtt(host: str, port: int, timeout: float = TCP_TIMEOUT) -> float:
+    """
+    Measures the TCP connect round-trip time to a server, excluding DNS resolution.
+    IPv4 and IPv6 addresses are raced, so the result is the time of the fastest path.
+
+    Returns:
+        The connect time in milliseconds.
+    """
+    loop = asyncio.get_running_loop()
+    addresses = await loop.run_in_executor(None, get_resolver().resolve, host)
+    _, rtt = await happy_eyeballs(addresses, port, timeout=timeout)
+    return rtt
+
+
+async def wait_for_listener(port: int, process, timeout: float) -> None:
+    """Polls a local port until something accepts on it, failing early if the process exits."""
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        if process.returncode is not None:
+            raise ConnectionError(f"ss-local exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            await _close_writer(writer)
+            return
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"ss-local did not listen on port {port}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+
+async def measure_roundtrip(config: dict, target=PROBE_TARGET, timeout: float = ROUNDTRIP_TIMEOUT,
+                            engine: str = "ss-local") -> float:
+    """Starts a throwaway tunnel for the server and measures a full request through it."""
+    local_port = allocate_port()
+    if engine == "native":
+        tunnel = NativeTunnel(config, local_port)
+        try:
+            await tunnel.start()
+            return (await asyncio.wait_for(check_target(local_port, target), timeout))['first_byte_ms']
+        finally:
+            await tunnel.stop()
+            release_port(local_port)
+
+    command = [
+        'ss-local', '-s', config['server'], '-p', str(config['server_port']),
+        '-l', str(local_port), '-k', config['password'], '-m', config['method']
+    ]
+    try:
+        # Launched through the supervisor so the pidfile covers probe tunnels left behind by a crash too.
+        process = get_supervisor().launch(
+            lambda: subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL), local_port)
+    except OSError:
+        release_port(local_port)
+        raise
+    try:
+        async def run():
+            await wait_for_listener(local_port, process, timeout)
+            return (await check_target(local_port, target))['first_byte_ms']
+
+        return await asyncio.wait_for(run(), timeout)
+    finally:
+        # The supervisor kills the process if it ignores SIGTERM and releases the port once it has exited.
+        get_supervisor().stop(process)
+
+
+async def probe_server(config: dict, semaphore: asyncio.Semaphore, target=PROBE_TARGET,
+                       engine: str = "ss-local") -> dict:
+    """Probes a single server and returns a result dictionary keyed by the server's ID."""
+    result = {"id": config.get("id"), "tcp_ms": None, "roundtrip_ms": None, "error": None}
+    async with semaphore:
+        try:
+            result["tcp_ms"] = await measure_tcp_rtt(config['server'], int(config['server_port']))
+            result["roundtrip_ms"] = await measure_roundtrip(config, target, engine=engine)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, RuntimeError) as e:
+            result["error"] = str(e) or e.__class__.__name__
+    return result
+
+
+async def probe_servers(configs: list, concurrency: int = MAX_CONCURRENCY, target=PROBE_TARGET,
+                        on_result=None, engine: str = "ss-local") -> list:
+    """
+    Probes every server concurrently, with at most `concurrency` probes in flight.
+
+    Args:
+        configs: Server configuration dictionaries, as returned by load_servers().
+        concurrency: The maximum number of simultaneous probes.
+        target: The http:// URL requested through each tunnel for the round-trip measurement.
+        on_result: Optional callable invoked with each result as soon as it is available.
+        engine: "ss-local" or "native", the tunnel used for the round-trip measurement.
+
+    Returns:
+        The results ranked from fastest to slowest, see rank_results().
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = []
+    tasks = [asyncio.create_task(probe_server(config, semaphore, target, engine)) for config in configs]
+    for future in asyncio.as_completed(tasks):
+        result = await future
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return rank_results(results)
+
+
+def rank_results(results: list) -> list:
+    """Sorts probe results: servers with a working round-trip first, then TCP-only, then unreachable."""
+
+    def sort_key(result):
+        if result.get("roundtrip_ms") is not None:
+            return 0, result["roundtrip_ms"], result.get("tcp_ms") or 0
+        if result.get("tcp_ms") is not None:
+            return 1, result["tcp_ms"], 0
+        return 2, 0, 0
+
+    return sorted(results, key=sort_key)
+
+
+class ProbeWorker(QThread):
+    """
+    Worker thread that probes all servers on its own asyncio event loop.
+    """
+    result_ready = pyqtSignal(dict)
+    finished = pyqtSignal(list)
+
+    def __init__(self, configs, engine="ss-local", parent=None):
+        super().__init__(parent)
+        self.configs = list(configs)
+        self.engine = engine
+
+    def run(self):
+        ranked = asyncio.run(probe_servers(self.configs, on_result=self.result_ready.emit, engine=self.engine))
+        self.finished.emit(ranked)
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import socket
+import threading
+
+from core.stats import TrafficCounters
+
+BUFFER_SIZE = 64 * 1024
+POOLED_BUFFERS = 64
+# os.splice() exists on Linux only; elsewhere socket relays fall back to pooled buffers.
+CAN_SPLICE = hasattr(os, 'splice')
+SPLICE_FLAGS = getattr(os, 'SPLICE_F_MOVE', 0) | getattr(os, 'SPLICE_F_NONBLOCK', 0)
+
+
+async def pipe(reader, writer, count=None):
+    """Copies bytes from reader to writer until EOF, then half-closes the writer. Reports each read to count."""
+    try:
+        while True:
+            data = await reader.read(BUFFER_SIZE)
+            if not data:
+                break
+            if count:
+                count(len(data))
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def relay(client_reader, client_writer, upstream_reader, upstream_writer, counters: TrafficCounters = None):
+    """Relays both directions between two streams and closes both once each side is done."""
+    if counters is None:
+        counters = TrafficCounters()
+    counters.opened()
+    try:
+        await asyncio.gather(pipe(client_reader, upstream_writer, counters.add_out),
+                             pipe(upstream_reader, client_writer, counters.add_in))
+    finally:
+        counters.closed()
+        client_writer.close()
+        upstream_writer.close()
+
+
+class BufferPool:
+    """
+    Reusable receive buffers for the socket relays, so a long transfer reads into the same memory instead of
+    allocating a new bytes object for every chunk. Keeps at most `limit` idle buffers.
+    """
+
+    def __init__(self, size: int = BUFFER_SIZE, limit: int = POOLED_BUFFERS):
+        self.size = size
+        self.limit = limit
+        self._free = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bytearray:
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return bytearray(self.size)
+
+    def release(self, buffer: bytearray):
+        with self._lock:
+            if len(self._free) < self.limit:
+                self._free.append(buffer)
+
+
+_buffer_pool = BufferPool()
+
+
+async def pipe_sockets(source: socket.socket, destination: socket.socket, count=None):
+    """
+    Copies bytes between two non-blocking sockets until EOF, then half-closes the destination. Each chunk is
+    received into a pooled buffer and sent from a view of it, so nothing is allocated per read.
+    """
+    loop = asyncio.get_running_loop()
+    buffer = _buffer_pool.acquire()
+    view = memoryview(buffer)
+    try:
+        while True:
+            received = await loop.sock_recv_into(source, buffer)
+            if not received:
+                break
+            if count:
+                count(received)
+            await loop.sock_sendall(destination, view[:received])
+        destination.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    finally:
+        view.release()
+        _buffer_pool.release(buffer)
+
+
+async def _wait_ready(add, remove, fd: int):
+    future = asyncio.get_running_loop().create_future()
+    add(fd, lambda: future.done() or future.set_result(None))
+    try:
+        await future
+    finally:
+        remove(fd)
+
+
+async def splice_sockets(source: socket.socket, destination: socket.socket, count=None):
+    """
+    Like pipe_sockets(), but moves the bytes through a kernel pipe with os.splice(), so they are never copied into
+    user space. Linux only; see CAN_SPLICE.
+    """
+    loop = asyncio.get_running_loop()
+    read_fd, write_fd = os.pipe()
+    try:
+        while True:
+            try:
+                received = os.splice(source.fileno(), write_fd, BUFFER_SIZE, flags=SPLICE_FLAGS)
+            except BlockingIOError:
+                await _wait_ready(loop.add_reader, loop.remove_reader, source.fileno())
+                continue
+            if not received:
+                break
+            if count:
+                count(received)
+            while received:
+                try:
+                    received -= os.splice(read_fd, destination.fileno(), received, flags=SPLICE_FLAGS)
+                except BlockingIOError:
+                    await _wait_ready(loop.add_writer, loop.remove_writer, destination.fileno())
+        destination.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+
+async def relay_sockets(client: socket.socket, upstream: socket.socket, counters: TrafficCounters = None,
+                        zero_copy: bool = True):
+    """
+    Relays both directions between two connected non-blocking sockets and closes both once each side is done.
+
+    With zero_copy, bytes are spliced through the kernel where os.splice() is available; otherwise, or when it is
+    not, they are copied through pooled buffers.
+    """
+    if counters is None:
+        counters = TrafficCounters()
+    pipe_fn = splice_sockets if zero_copy and CAN_SPLICE else pipe_sockets
+    counters.opened()
+    try:
+        await asyncio.gather(pipe_fn(client, upstream, counters.add_out), pipe_fn(upstream, client, counters.add_in))
+    finally:
+        counters.closed()
+        client.close()
+        upstream.close()
+
+
+class ClientConnections:
+    """
+    The connections an asyncio server is serving, so stopping it can drop them.
+
+    Since Python 3.12, Server.wait_closed() also waits for every connection the server accepted, so a client that
+    keeps one open, such as a browser, would hold up stopping indefinitely. close() cancels the handlers, which
+    closes whatever they relay to, and aborts the client connections before waiting.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.closed = False
+
+    def track(self, handler):
+        """Wraps an asyncio.start_server() client handler so the connections it serves are tracked."""
+
+        async def handle(reader, writer):
+            if self.closed:
+                # Accepted just before the server was closed.
+                writer.transport.abort()
+                return
+            task = asyncio.current_task()
+            self.tasks[task] = writer
+            try:
+                await handler(reader, writer)
+            except asyncio.CancelledError:
+                # Dropped by close(). Ends the task normally, as asyncio.start_server() logs a cancelled handler.
+                pass
+            finally:
+                self.tasks.pop(task, None)
+
+        return handle
+
+    async def close(self, server):
+        """Stops the server, drops its connections and waits until the server and their handlers are done."""
+        self.closed = True
+        server.close()
+        tasks = list(self.tasks)
+        for task, writer in list(self.tasks.items()):
+            task.cancel()
+            writer.transport.abort()
+        await server.wait_closed()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class PortForwarder:
+    """
+    A local TCP forwarder whose backend port can be swapped at any time.
+
+    New connections go to whichever backend is current when they arrive, so switching tunnels is a single
+    assignment and the public port seen by the system proxy never changes.
+    """
+
+    def __init__(self, listen_port: int, target_port: int = None):
+        self.listen_port = listen_port
+        self.target_port = target_port
+        self.server = None
+        self.clients = ClientConnections()
+        self.counters = TrafficCounters()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.clients.track(self._handle), '127.0.0.1', self.listen_port)
+
+    async def stop(self):
+        """Stops listening and closes the forwarded connections."""
+        if self.server:
+            await self.clients.close(self.server)
+            self.server = None
+
+    def set_target(self, port: int):
+        self.target_port = port
+
+    async def _handle(self, reader, writer):
+        target_port = self.target_port
+        if target_port is None:
+            writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', target_port)
+        except OSError:
+            writer.close()
+            return
+        await relay(reader, writer, upstream_reader, upstream_writer, self.counters)
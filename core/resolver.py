@@ -0,0 +1,162 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+POSITIVE_TTL = 300.0
+NEGATIVE_TTL = 30.0
+CONNECT_ATTEMPT_DELAY = 0.25
+PREFLIGHT_TIMEOUT = 3.0
+
+
+class ResolverCache:
+    """
+    Caches server host name lookups.
+
+    getaddrinfo() does not expose record TTLs, so successful lookups are kept for POSITIVE_TTL and failures for
+    NEGATIVE_TTL. Entries past half their lifetime are still served but refreshed in the background, so a host
+    that is looked up regularly never makes a caller wait for DNS.
+    """
+
+    def __init__(self, positive_ttl: float = POSITIVE_TTL, negative_ttl: float = NEGATIVE_TTL):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ProxyPalResolver")
+
+    def _lookup(self, host: str):
+        try:
+            infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            addresses = []
+            for family, _, _, _, sockaddr in infos:
+                if (family, sockaddr[0]) not in addresses:
+                    addresses.append((family, sockaddr[0]))
+            entry = (time.monotonic(), self.positive_ttl, addresses, None)
+        except OSError as e:
+            entry = (time.monotonic(), self.negative_ttl, None, str(e))
+        with self.lock:
+            self.entries[host] = entry
+            self.refreshing.discard(host)
+        return entry
+
+    def _refresh_in_background(self, host: str):
+        with self.lock:
+            if host in self.refreshing:
+                return
+            self.refreshing.add(host)
+        self.executor.submit(self._lookup, host)
+
+    def resolve(self, host: str) -> list:
+        """
+        Returns the (family, address) pairs for a host, from the cache when possible.
+
+        Raises:
+            OSError: If the host could not be resolved (failures are cached too).
+        """
+        try:
+            ip = ipaddress.ip_address(host)
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, host)]
+        except ValueError:
+            pass
+
+        with self.lock:
+            entry = self.entries.get(host)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age >= entry[1]:
+                entry = None
+            elif entry[2] is not None and age >= entry[1] / 2:
+                self._refresh_in_background(host)
+        if entry is None:
+            entry = self._lookup(host)
+
+        addresses, error = entry[2], entry[3]
+        if addresses is None:
+            raise OSError(f"Could not resolve {host}: {error}")
+        return addresses
+
+    def prefetch(self, hosts):
+        """Resolves the given hosts on background threads so later connects hit the cache."""
+        for host in set(hosts):
+            try:
+                ipaddress.ip_address(host)
+            except ValueError:
+                self._refresh_in_background(host)
+
+
+_resolver = ResolverCache()
+
+
+def get_resolver() -> ResolverCache:
+    return _resolver
+
+
+def interleave_families(addresses: list) -> list:
+    """Orders addresses IPv6, IPv4, IPv6, ... as recommended by RFC 8305."""
+    ipv6 = [a for a in addresses if a[0] == socket.AF_INET6]
+    ipv4 = [a for a in addresses if a[0] != socket.AF_INET6]
+    ordered = []
+    for i in range(max(len(ipv6), len(ipv4))):
+        ordered += ipv6[i:i + 1] + ipv4[i:i + 1]
+    return ordered
+
+
+async def happy_eyeballs(addresses: list, port: int, attempt_delay: float = CONNECT_ATTEMPT_DELAY,
+                         timeout: float = PREFLIGHT_TIMEOUT) -> tuple:
+    """
+    Races TCP connections to the given addresses, starting a new attempt every attempt_delay seconds or as soon
+    as the previous one fails, and returns the first to connect.
+
+    Returns:
+        (address, connect time in milliseconds) of the winning address.
+
+    Raises:
+        OSError: If no address accepts a connection within the timeout.
+    """
+    ordered = interleave_families(addresses)
+    if not ordered:
+        raise OSError("No addresses to connect to.")
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    errors = []
+
+    async def attempt(address):
+        attempt_start = loop.time()
+        _, writer = await asyncio.open_connection(address, port)
+        elapsed = (loop.time() - attempt_start) * 1000
+        writer.close()
+        return address, elapsed
+
+    pending = set()
+    remaining = list(ordered)
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.add(asyncio.create_task(attempt(remaining.pop(0)[1])))
+            wait_for = attempt_delay if remaining else max(timeout - (loop.time() - start), 0)
+            done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(str(task.exception()))
+            if not remaining and not done and loop.time() - start >= timeout:
+                raise OSError(f"Server did not accept a connection within {timeout:.0f} seconds.")
+    finally:
+        for task in pending:
+            task.cancel()
+    raise OSError(errors[-1] if errors else "Server is unreachable.")
+
+
+async def preflight(host: str, port: int, timeout: float = PREFLIGHT_TIMEOUT) -> tuple:
+    """
+    Resolves a server through the cache and checks that it accepts TCP connections.
+
+    Returns:
+        (ip address, connect time in milliseconds) of the fastest address.
+    """
+    addresses = await asyncio.get_running_loop().run_in_executor(None, get_resolver().resolve, host)
+    return await happy_eyeballs(addresses, port, timeout=timeout)
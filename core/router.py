@@ -0,0 +1,143 @@
+import asyncio
+from functools import partial
+from pathlib import Path
+
+from core import socks
+from core.relay import ClientConnections, relay
+from core.resolver import CONNECT_ATTEMPT_DELAY
+from core.rule_index import INDEX_FILE, open_index
+from core.rules import ACTION_NAMES, BLOCK, DIRECT, RULES_DIR
+from core.stats import TrafficCounters
+
+ROUTER_PORT = 1081
+HANDSHAKE_TIMEOUT = 10.0
+CONNECT_TIMEOUT = 10.0
+
+REPLY_SUCCEEDED = 0
+REPLY_GENERAL_FAILURE = 1
+REPLY_NOT_ALLOWED = 2
+REPLY_NETWORK_UNREACHABLE = 3
+REPLY_HOST_UNREACHABLE = 4
+REPLY_COMMAND_NOT_SUPPORTED = 7
+
+
+class RoutingRelay:
+    """
+    A local SOCKS5 proxy that decides per connection whether to go direct, through the tunnel or nowhere.
+
+    Each CONNECT is matched against the split-tunneling rules in the memory-mapped rule index: the longest
+    matching domain suffix, or for addresses the most specific CIDR block, picks the route. Direct connections are
+    opened from this machine; proxied ones through the SOCKS5 port of whichever tunnel ConnectionManager has up;
+    blocked ones are refused with "connection not allowed by ruleset". Once connected, bytes are relayed as is.
+    """
+
+    def __init__(self, listen_port: int, upstream_port: int = None, rules_dir: Path = RULES_DIR,
+                 index_file: Path = INDEX_FILE):
+        self.listen_port = listen_port
+        self.upstream_port = upstream_port
+        self.rules_dir = rules_dir
+        self.index_file = index_file
+        self.index = None
+        self.server = None
+        self.clients = ClientConnections()
+        self.counters = TrafficCounters()
+        self.routed = {name: 0 for name in ACTION_NAMES.values()}
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.listen_port}"
+
+    async def start(self):
+        await self.reload_rules()
+        self.server = await asyncio.start_server(self.clients.track(self._handle), '127.0.0.1', self.listen_port)
+
+    async def stop(self):
+        if self.server:
+            # Returns once every handler has ended, so none of them matches against the index after it is closed.
+            await self.clients.close(self.server)
+            self.server = None
+        if self.index:
+            self.index.close()
+            self.index = None
+
+    async def reload_rules(self):
+        """Maps the compiled rule index, rebuilding it on a worker thread first if the rule files changed."""
+        load = partial(open_index, self.rules_dir, self.index_file)
+        index = await asyncio.get_running_loop().run_in_executor(None, load)
+        previous, self.index = self.index, index
+        if previous:
+            previous.close()
+        print(f"Routing relay rules loaded: {index.stats()}")
+
+    def set_upstream(self, port):
+        """Sends proxied connections to the tunnel on this local port; with None they are refused."""
+        self.upstream_port = port
+
+    async def _handle(self, reader, writer):
+        try:
+            host, port = await asyncio.wait_for(self._handshake(reader, writer), HANDSHAKE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, OSError, UnicodeError):
+            writer.close()
+            return
+        if host is None:
+            return
+
+        index = self.index
+        if index is None:
+            # The relay is stopping.
+            await self._reply(writer, REPLY_GENERAL_FAILURE)
+            return
+        action = index.match(host)
+        self.routed[ACTION_NAMES[action]] += 1
+        if action == BLOCK:
+            await self._reply(writer, REPLY_NOT_ALLOWED)
+            return
+        upstream_port = self.upstream_port
+        if action != DIRECT and upstream_port is None:
+            await self._reply(writer, REPLY_NETWORK_UNREACHABLE)
+            return
+        try:
+            if action == DIRECT:
+                connecting = asyncio.open_connection(host, port, happy_eyeballs_delay=CONNECT_ATTEMPT_DELAY)
+            else:
+                connecting = socks.open_connection(upstream_port, host, port)
+            upstream_reader, upstream_writer = await asyncio.wait_for(connecting, CONNECT_TIMEOUT)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            await self._reply(writer, REPLY_HOST_UNREACHABLE if action == DIRECT else REPLY_GENERAL_FAILURE)
+            return
+
+        bound = upstream_writer.get_extra_info('sockname') or ('0.0.0.0', 0)
+        writer.write(bytes([5, REPLY_SUCCEEDED, 0]) + socks.encode_address(bound[0], bound[1]))
+        await relay(reader, writer, upstream_reader, upstream_writer, self.counters)
+
+    @staticmethod
+    async def _handshake(reader, writer) -> tuple:
+        """
+        Answers the SOCKS5 greeting and reads the request.
+
+        Returns:
+            The requested (host, port), or (None, None) after refusing the client, which closes the connection.
+        """
+        version, method_count = await reader.readexactly(2)
+        methods = await reader.readexactly(method_count)
+        if version != 5 or 0 not in methods:
+            writer.write(b'\x05\xff')
+            writer.close()
+            return None, None
+        writer.write(b'\x05\x00')
+        version, command, _ = await reader.readexactly(3)
+        host, port = await socks.read_address(reader)
+        if command != 1:
+            await RoutingRelay._reply(writer, REPLY_COMMAND_NOT_SUPPORTED)
+            return None, None
+        return host, port
+
+    @staticmethod
+    async def _reply(writer, code: int):
+        """Sends a failure reply and closes the client connection."""
+        writer.write(bytes([5, code, 0]) + socks.encode_address('0.0.0.0', 0))
+        try:
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        writer.close()
@@ -0,0 +1,228 @@
+import hashlib
+import ipaddress
+import mmap
+import socket
+import struct
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from core import storage
+from core.rules import BUILTIN_DIRECT, DIRECT, RULES_DIR, RuleSet, load_rules, rule_sources
+
+INDEX_FILE = storage.APP_SUPPORT_DIR / "rules.idx"
+INDEX_MAGIC = b"PPRI"
+INDEX_VERSION = 1
+# Written in native byte order; an index copied from a machine with the other order reads back wrong and is rebuilt.
+BYTE_ORDER_MARK = 0x01020304
+
+# Magic, version, byte order mark, default action, section count, then the fingerprint of the sources.
+HEADER = struct.Struct("=4sIIII32s")
+SECTION = struct.Struct("=QQ")
+# Array sections, in file order, with their typecodes. Every section starts on an 8-byte boundary.
+SECTIONS = (
+    ("node_action", "I"), ("node_first", "I"), ("node_count", "I"),
+    ("edge_hash", "I"), ("edge_node", "I"), ("edge_label", "I"), ("edge_length", "I"),
+    ("labels", "B"),
+    ("v4_first", "I"), ("v4_last", "I"), ("v4_action", "I"),
+    ("v6_first_high", "Q"), ("v6_first_low", "Q"), ("v6_last_high", "Q"), ("v6_last_low", "Q"), ("v6_action", "I"),
+)
+
+LOW_64 = (1 << 64) - 1
+
+
+def label_hash(label: bytes) -> int:
+    return zlib.crc32(label)
+
+
+def fingerprint(rules_dir: Path = RULES_DIR) -> bytes:
+    """Identifies the current rule sources by name, size and modification time, without reading them."""
+    digest = hashlib.sha256(repr((INDEX_VERSION, BUILTIN_DIRECT)).encode())
+    for path, action in rule_sources(rules_dir):
+        stat = path.stat()
+        digest.update(repr((str(path), action, stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.digest()
+
+
+def _flatten_trie(rules: RuleSet) -> dict:
+    """
+    Lays the domain trie out breadth first, so each node's children are one contiguous run of edges sorted by
+    label hash, which a lookup binary-searches.
+    """
+    arrays = {name: array(typecode) for name, typecode in SECTIONS[:8]}
+    labels = bytearray()
+    queue = [rules.domains.compact() or {}]
+    for node in queue:
+        if isinstance(node, int):
+            arrays["node_action"].append(node)
+            arrays["node_first"].append(0)
+            arrays["node_count"].append(0)
+            continue
+        arrays["node_action"].append(node.get("", 0))
+        children = sorted(((label.encode(), child) for label, child in node.items() if label),
+                          key=lambda item: (label_hash(item[0]), item[0]))
+        arrays["node_first"].append(len(arrays["edge_hash"]))
+        arrays["node_count"].append(len(children))
+        for label, child in children:
+            arrays["edge_hash"].append(label_hash(label))
+            arrays["edge_node"].append(len(queue))
+            arrays["edge_label"].append(len(labels))
+            arrays["edge_length"].append(len(label))
+            labels += label
+            queue.append(child)
+    arrays["labels"].frombytes(labels)
+    return arrays
+
+
+def compile_index(rules: RuleSet, source_fingerprint: bytes, path: Path = INDEX_FILE):
+    """Writes the rules to an index file that RuleIndex can map and search without parsing it."""
+    arrays = _flatten_trie(rules)
+    for name, typecode in SECTIONS[8:]:
+        arrays[name] = array(typecode)
+    for first, last, action in rules.ipv4_ranges:
+        arrays["v4_first"].append(first)
+        arrays["v4_last"].append(last)
+        arrays["v4_action"].append(action)
+    for first, last, action in rules.ipv6_ranges:
+        arrays["v6_first_high"].append(first >> 64)
+        arrays["v6_first_low"].append(first & LOW_64)
+        arrays["v6_last_high"].append(last >> 64)
+        arrays["v6_last_low"].append(last & LOW_64)
+        arrays["v6_action"].append(action)
+
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table, blobs = [], []
+    for name, _ in SECTIONS:
+        offset += -offset % 8
+        data = arrays[name].tobytes()
+        table.append(SECTION.pack(offset, len(data)))
+        blobs.append(data)
+        offset += len(data)
+
+    header = HEADER.pack(INDEX_MAGIC, INDEX_VERSION, BYTE_ORDER_MARK, rules.default_action, len(SECTIONS),
+                         source_fingerprint)
+    data = bytearray(header + b"".join(table))
+    for blob in blobs:
+        data += b"\0" * (-len(data) % 8) + blob
+    path.parent.mkdir(parents=True, exist_ok=True)
+    storage.write_atomic(path, bytes(data))
+
+
+class RuleIndex:
+    """
+    Split-tunneling rules searched in place in a memory-mapped index file.
+
+    Opening the index only maps the file and checks its header, so even rule sets with hundreds of thousands of
+    entries are ready in microseconds and pages are read in as lookups touch them. Domains are matched by walking
+    the suffix trie one label at a time, binary-searching each node's children by label hash; addresses by a
+    binary search over the sorted ranges the CIDR blocks were flattened into, where the most specific block wins.
+    Both searches run in C through bisect on memoryviews of the mapped arrays.
+    """
+
+    def __init__(self, path: Path = INDEX_FILE):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, mark, self.default_action, count, self.fingerprint = HEADER.unpack_from(self._map)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION or mark != BYTE_ORDER_MARK or count != len(SECTIONS):
+                raise ValueError(f"{path} is not a current rule index.")
+            view = memoryview(self._map)
+            self._views = [view]
+            for i, (name, typecode) in enumerate(SECTIONS):
+                offset, length = SECTION.unpack_from(self._map, HEADER.size + SECTION.size * i)
+                if offset + length > len(self._map):
+                    raise ValueError(f"{path} is truncated.")
+                section = view[offset:offset + length].cast(typecode)
+                self._views.append(section)
+                setattr(self, name, section)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for view in reversed(getattr(self, "_views", [])):
+            view.release()
+        self._views = []
+        self._map.close()
+
+    def match_domain(self, host: str):
+        """Returns the action of the longest suffix rule matching the host, or None."""
+        node, action = 0, 0
+        for label in reversed(host.rstrip('.').lower().split('.')):
+            key = label.encode()
+            wanted = label_hash(key)
+            first = self.node_first[node]
+            end = first + self.node_count[node]
+            edge = bisect_left(self.edge_hash, wanted, first, end)
+            while edge < end and self.edge_hash[edge] == wanted:
+                start = self.edge_label[edge]
+                if self.labels[start:start + self.edge_length[edge]] == key:
+                    break
+                edge += 1
+            else:
+                break
+            node = self.edge_node[edge]
+            action = self.node_action[node] or action
+        return action or None
+
+    def match_ip(self, address):
+        """Returns the action for an IP address (string or ip_address), or None if no network contains it."""
+        return self._match_packed(ipaddress.ip_address(address).packed)
+
+    def _match_packed(self, packed: bytes):
+        value = int.from_bytes(packed, 'big')
+        if len(packed) == 4:
+            index = bisect_right(self.v4_first, value) - 1
+            if index >= 0 and self.v4_last[index] >= value:
+                return self.v4_action[index]
+            return None
+        # Ranges are sorted by their full start address; search on the high half, then step back over the
+        # ranges that start later within the same /64.
+        high, low = value >> 64, value & LOW_64
+        index = bisect_right(self.v6_first_high, high) - 1
+        while index >= 0 and self.v6_first_high[index] == high and self.v6_first_low[index] > low:
+            index -= 1
+        if index >= 0 and (self.v6_last_high[index], self.v6_last_low[index]) >= (high, low):
+            return self.v6_action[index]
+        return None
+
+    def match(self, host: str) -> int:
+        """Returns DIRECT, PROXY or BLOCK for a host name or IP address, like RuleSet.match()."""
+        host = host.strip('[]')
+        packed = None
+        # inet_pton is far cheaper than ipaddress, and host names never end in a digit, as top-level domains
+        # are not numeric, so they skip the address parse altogether.
+        try:
+            if ':' in host:
+                packed = socket.inet_pton(socket.AF_INET6, host)
+            elif host[-1:].isdigit():
+                packed = socket.inet_pton(socket.AF_INET, host)
+        except OSError:
+            pass
+        if packed is not None:
+            action = self._match_packed(packed)
+        else:
+            action = self.match_domain(host) if '.' in host else DIRECT
+        return self.default_action if action is None else action
+
+    def stats(self) -> dict:
+        return {"domain_nodes": len(self.node_action), "ipv4_ranges": len(self.v4_first),
+                "ipv6_ranges": len(self.v6_first_high), "index_bytes": len(self._map)}
+
+
+def open_index(rules_dir: Path = RULES_DIR, path: Path = INDEX_FILE) -> RuleIndex:
+    """
+    Maps the compiled rule index, first recompiling it from the rule files if any of them changed since it was
+    written. Only the recompile reads the rule files, so unchanged rules load in well under a millisecond.
+    """
+    current = fingerprint(rules_dir)
+    try:
+        index = RuleIndex(path)
+        if index.fingerprint == current:
+            return index
+        index.close()
+    except (OSError, ValueError, struct.error):
+        pass
+    compile_index(load_rules(rules_dir), current, path)
+    return RuleIndex(path)
@@ -0,0 +1,270 @@
+import bisect
+import ipaddress
+import re
+import socket
+from pathlib import Path
+
+from core import storage
+
+DIRECT = 1
+PROXY = 2
+BLOCK = 3
+DEFAULT_ACTION = PROXY
+ACTION_NAMES = {DIRECT: "direct", PROXY: "proxy", BLOCK: "block"}
+
+RULES_DIR = storage.APP_SUPPORT_DIR / "rules"
+# Each file holds one domain suffix or CIDR per line, and every *.txt in the folder of the same name (e.g. direct/)
+# is read with it, so large downloaded lists such as per-country IP ranges can be dropped in unchanged. Later files
+# win on identical entries.
+RULE_FILES = (("direct.txt", DIRECT), ("proxy.txt", PROXY), ("block.txt", BLOCK))
+
+# Traffic that must never leave the machine or the local network, whatever the rule files say.
+BUILTIN_DIRECT = (
+    "localhost", "local", "lan", "home.arpa", "internal",
+    "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16", "172.16.0.0/12", "192.168.0.0/16",
+    "::1/128", "fc00::/7", "fe80::/10",
+)
+
+# Only lines made of these characters are tried as networks; parsing every domain as one first is slow.
+NETWORK_PATTERN = re.compile(r'[0-9a-fA-F.:/]+')
+
+# Marks the action stored on a trie node; it can never be a label, as DNS labels are not empty.
+ACTION_KEY = ""
+
+
+class DomainTrie:
+    """
+    Domain suffix rules as a trie keyed by label from the top-level domain down.
+
+    A lookup walks one node per label of the host name, however many rules there are, and the most specific
+    matching suffix decides: "example.com" matches itself and every subdomain unless a longer rule overrides it.
+    """
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def add(self, domain: str, action: int):
+        node = self.root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        if ACTION_KEY not in node:
+            self.size += 1
+        node[ACTION_KEY] = action
+
+    def match(self, host: str):
+        """Returns the action of the longest suffix rule matching the host, or None."""
+        node = self.root
+        action = None
+        for label in reversed(host.rstrip('.').lower().split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            action = node.get(ACTION_KEY, action)
+        return action
+
+    def compact(self) -> dict:
+        """
+        Returns the trie with redundant rules pruned and leaves reduced to their action, e.g.
+        {"com": {"example": 1}}, ready to be embedded in a PAC file as JSON.
+        """
+
+        def walk(node: dict, inherited):
+            action = node.get(ACTION_KEY)
+            effective = inherited if action is None else action
+            children = {}
+            for label, child in node.items():
+                if label == ACTION_KEY:
+                    continue
+                compacted = walk(child, effective)
+                if compacted is not None:
+                    children[label] = compacted
+            if action == inherited:
+                action = None
+            if not children:
+                return action
+            if action is not None:
+                children[ACTION_KEY] = action
+            return children
+
+        return walk(self.root, None) or {}
+
+
+def parse_network(text: str) -> tuple:
+    """
+    Parses a CIDR block or single address into (IP version, first address, last address) as integers. Host bits
+    are ignored, as with ip_network(strict=False), but without building ipaddress objects, which dominate the
+    cost of loading long address lists.
+
+    Raises:
+        ValueError: If the text is not an IPv4 or IPv6 address or network.
+    """
+    address, _, length = text.partition('/')
+    try:
+        packed = socket.inet_pton(socket.AF_INET6 if ':' in address else socket.AF_INET, address)
+    except OSError:
+        raise ValueError(f"'{text}' is not an IP network.") from None
+    bits = len(packed) * 8
+    prefix = int(length) if length else bits
+    if not 0 <= prefix <= bits:
+        raise ValueError(f"'{text}' has an invalid prefix length.")
+    host_bits = bits - prefix
+    first = int.from_bytes(packed, 'big') >> host_bits << host_bits
+    return (4 if bits == 32 else 6), first, first | ((1 << host_bits) - 1)
+
+
+def compile_ranges(blocks: list) -> list:
+    """
+    Flattens (first, last, action) CIDR blocks into sorted, non-overlapping (first, last, action) address ranges,
+    where the most specific block wins and neighbouring ranges with the same action are merged. CIDR blocks are
+    always either disjoint or nested, so one sweep with a stack of enclosing blocks is enough.
+    """
+    blocks = sorted(blocks, key=lambda block: (block[0], -block[1]))
+    ranges = []
+
+    def emit(first, last, action):
+        if first > last:
+            return
+        if ranges and ranges[-1][2] == action and ranges[-1][1] + 1 == first:
+            ranges[-1] = (ranges[-1][0], last, action)
+        else:
+            ranges.append((first, last, action))
+
+    stack = []
+    position = 0
+    for first, last, action in blocks:
+        while stack and stack[-1][0] < first:
+            end, enclosing = stack.pop()
+            emit(position, end, enclosing)
+            position = end + 1
+        if stack:
+            emit(position, first - 1, stack[-1][1])
+        position = first
+        stack.append((last, action))
+    while stack:
+        end, enclosing = stack.pop()
+        emit(position, end, enclosing)
+        position = end + 1
+    return ranges
+
+
+def normalize_rule(line: str):
+    """
+    Parses one line of a rule file into a network as returned by parse_network() or a lower-case domain suffix,
+    or None for blanks and comments. Wildcard and adblock-style prefixes ("*.", ".", "||") and a trailing "^" are
+    accepted.
+    """
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    if NETWORK_PATTERN.fullmatch(line) and (line[0].isdigit() or ':' in line):
+        try:
+            return parse_network(line)
+        except ValueError:
+            pass
+    for prefix in ("||", "*.", "."):
+        if line.startswith(prefix):
+            line = line[len(prefix):]
+    return line.rstrip('^').rstrip('.').lower() or None
+
+
+class RuleSet:
+    """Compiled split-tunneling rules: a domain suffix trie and sorted address ranges for IPv4 and IPv6."""
+
+    def __init__(self, default_action: int = DEFAULT_ACTION):
+        self.default_action = default_action
+        self.domains = DomainTrie()
+        self.networks = []
+        self.ipv4_ranges = []
+        self.ipv6_ranges = []
+        self._starts = {4: [], 6: []}
+
+    def add(self, rule: str, action: int):
+        parsed = normalize_rule(rule)
+        if parsed is None:
+            return
+        if isinstance(parsed, str):
+            self.domains.add(parsed, action)
+        else:
+            self.networks.append(parsed + (action,))
+
+    def add_lines(self, lines, action: int):
+        for line in lines:
+            self.add(line, action)
+
+    def finish(self):
+        """Compiles the collected networks into range tables. Call once every rule has been added."""
+        self.ipv4_ranges = compile_ranges([block[1:] for block in self.networks if block[0] == 4])
+        self.ipv6_ranges = compile_ranges([block[1:] for block in self.networks if block[0] == 6])
+        self._starts = {4: [r[0] for r in self.ipv4_ranges], 6: [r[0] for r in self.ipv6_ranges]}
+        return self
+
+    def match_ip(self, address):
+        """Returns the action for an IP address (string or ip_address), or None if no network contains it."""
+        address = ipaddress.ip_address(address)
+        ranges = self.ipv4_ranges if address.version == 4 else self.ipv6_ranges
+        value = int(address)
+        index = bisect.bisect_right(self._starts[address.version], value) - 1
+        if index >= 0 and ranges[index][1] >= value:
+            return ranges[index][2]
+        return None
+
+    def match(self, host: str) -> int:
+        """Returns DIRECT, PROXY or BLOCK for a host name or IP address."""
+        try:
+            action = self.match_ip(host.strip('[]'))
+        except ValueError:
+            action = self.domains.match(host) if '.' in host else DIRECT
+        return self.default_action if action is None else action
+
+    def stats(self) -> dict:
+        return {"domains": self.domains.size, "networks": len(self.networks),
+                "ipv4_ranges": len(self.ipv4_ranges), "ipv6_ranges": len(self.ipv6_ranges)}
+
+
+RULE_FILE_HEADER = """# ProxyPal split tunneling: hosts that go %s.
+# One domain suffix (example.com also matches www.example.com) or CIDR block (192.0.2.0/24) per line.
+# Larger lists can go in the folder of the same name as separate *.txt files. Everything not listed goes through
+# the proxy. Use Servers > Split Tunneling > Reload Rules after editing.
+"""
+
+RULE_FILE_PURPOSES = {
+    DIRECT: "direct, bypassing the tunnel",
+    PROXY: "through the tunnel, even inside a direct domain",
+    BLOCK: "nowhere: the routing relay refuses them",
+}
+
+
+def ensure_rule_files(rules_dir: Path = RULES_DIR):
+    """Creates the rules directory and commented, empty rule files for the user to fill in."""
+    rules_dir.mkdir(parents=True, exist_ok=True)
+    for name, action in RULE_FILES:
+        path = rules_dir / name
+        if not path.exists():
+            path.write_text(RULE_FILE_HEADER % RULE_FILE_PURPOSES[action])
+
+
+def rule_sources(rules_dir: Path = RULES_DIR) -> list:
+    """Lists the existing rule files as (path, action) pairs, in the order they are applied."""
+    sources = []
+    for name, action in RULE_FILES:
+        path = rules_dir / name
+        if path.is_file():
+            sources.append((path, action))
+        lists_dir = path.with_suffix("")
+        if lists_dir.is_dir():
+            sources += [(list_path, action) for list_path in sorted(lists_dir.glob("*.txt"))]
+    return sources
+
+
+def load_rules(rules_dir: Path = RULES_DIR) -> RuleSet:
+    """Builds the RuleSet from the built-in LAN rules and the rule files in the rules directory, if any."""
+    rules = RuleSet()
+    rules.add_lines(BUILTIN_DIRECT, DIRECT)
+    for path, action in rule_sources(rules_dir):
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                rules.add_lines(f, action)
+        except OSError as e:
+            print(f"Could not read rule file {path}: {e}")
+    return rules.finish()
@@ -0,0 +1,150 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA_VERSION = 1
+BULK_WRITE = 1000
+CONFIG_COLUMNS = ("id", "name", "server", "server_port", "method", "password")
+METADATA_COLUMNS = ("latency_ms", "last_probed", "connect_count", "last_connected", "bytes_in", "bytes_out")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS servers (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    server TEXT NOT NULL,
+    server_port INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    password TEXT NOT NULL,
+    extra TEXT,
+    latency_ms REAL,
+    last_probed REAL,
+    connect_count INTEGER NOT NULL DEFAULT 0,
+    last_connected REAL,
+    bytes_in INTEGER NOT NULL DEFAULT 0,
+    bytes_out INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS servers_address ON servers (server, server_port);
+CREATE INDEX IF NOT EXISTS servers_name ON servers (name);
+CREATE INDEX IF NOT EXISTS servers_position ON servers (position);
+"""
+
+
+class ServerDatabase:
+    """
+    SQLite storage backend for large server lists.
+
+    Every server is one row, indexed by id, address and name, so changes are written as single-row updates
+    instead of rewriting the whole list. Latency and usage metadata are stored in the same row.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                self.connection.executescript(SCHEMA)
+                self.connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self.next_position = self.connection.execute(
+            "SELECT COALESCE(MAX(position), -1) + 1 FROM servers").fetchone()[0]
+
+    def migrate_from_json(self, json_path: Path):
+        """
+        Replaces the servers with those in a servers.json file written by the JSON backend. Servers that are in both
+        keep their latency and usage metadata.
+        """
+        try:
+            with open(json_path, "r") as f:
+                servers = [config for config in json.load(f) if config.get('id')]
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self.lock:
+            stored = [row[0] for row in self.connection.execute("SELECT id FROM servers")]
+        kept = {config['id'] for config in servers}
+        changed = {server_id: None for server_id in stored if server_id not in kept}
+        changed.update((config['id'], config) for config in servers)
+        self.write(None, changed, {})
+        print(f"Storage: migrated {len(servers)} servers from {json_path.name} to {self.path.name}")
+
+    @staticmethod
+    def _row_to_config(row) -> dict:
+        config = dict(zip(CONFIG_COLUMNS, row[:len(CONFIG_COLUMNS)]))
+        if row[len(CONFIG_COLUMNS)]:
+            config.update(json.loads(row[len(CONFIG_COLUMNS)]))
+        return config
+
+    def load(self) -> tuple:
+        """Returns (server configurations in insertion order, server id -> metadata for servers that have any)."""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(CONFIG_COLUMNS)}, extra, {', '.join(METADATA_COLUMNS)} "
+                f"FROM servers ORDER BY position").fetchall()
+        servers = []
+        metadata = {}
+        first_metadata = len(CONFIG_COLUMNS) + 1
+        for row in rows:
+            servers.append(self._row_to_config(row))
+            if any(row[first_metadata:]):
+                metadata[row[0]] = dict(zip(METADATA_COLUMNS, row[first_metadata:]))
+        return servers, metadata
+
+    def search(self, text: str, limit: int = 100) -> list:
+        """Returns servers whose name or host starts with the given text, using the indexes."""
+        pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(CONFIG_COLUMNS)}, extra FROM servers "
+                f"WHERE name LIKE ? ESCAPE '\\' OR server LIKE ? ESCAPE '\\' ORDER BY position LIMIT ?",
+                (pattern, pattern, limit)).fetchall()
+        return [self._row_to_config(row) for row in rows]
+
+    def write(self, servers, changed: dict, metadata: dict):
+        """
+        Applies changes in one transaction.
+
+        Args:
+            servers: The full server list. Unused, as only changed rows are written.
+            changed: Server id -> new configuration, or None if the server was deleted.
+            metadata: Server id -> metadata fields to update.
+        """
+        upserts = []
+        deletes = []
+        for server_id, config in changed.items():
+            if config is None:
+                deletes.append((server_id,))
+                continue
+            extra = {k: v for k, v in config.items() if k not in CONFIG_COLUMNS}
+            upserts.append((server_id, self.next_position, config.get('name') or config['server'], config['server'],
+                            int(config['server_port']), config['method'], config['password'],
+                            json.dumps(extra) if extra else None))
+            self.next_position += 1
+        updates = [(*(fields.get(c) for c in METADATA_COLUMNS), server_id) for server_id, fields in metadata.items()
+                   if changed.get(server_id, True) is not None]
+
+        with self.lock:
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany("DELETE FROM servers WHERE id = ?", deletes)
+                self.connection.executemany(
+                    "INSERT INTO servers (id, position, name, server, server_port, method, password, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name, "
+                    "server = excluded.server, server_port = excluded.server_port, method = excluded.method, "
+                    "password = excluded.password, extra = excluded.extra", upserts)
+                self.connection.executemany(
+                    f"UPDATE servers SET {', '.join(f'{c} = ?' for c in METADATA_COLUMNS)} WHERE id = ?", updates)
+                self.connection.execute("COMMIT")
+            except sqlite3.Error:
+                self.connection.execute("ROLLBACK")
+                raise
+            if len(changed) > BULK_WRITE:
+                # Fold a large write back into the database file instead of leaving it in the write-ahead log.
+                self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,191 @@
+import asyncio
+import ipaddress
+import socket
+import time
+from urllib.parse import urlsplit
+
+HEALTH_CHECK_TARGETS = [
+    "http://www.gstatic.com/generate_204",
+    "http://cp.cloudflare.com/generate_204",
+    "http://www.google.com/generate_204",
+]
+HEALTH_CHECK_TIMEOUT = 5.0
+
+SOCKS5_ERRORS = {
+    1: "General SOCKS server failure",
+    2: "Connection not allowed by ruleset",
+    3: "Network unreachable",
+    4: "Host unreachable",
+    5: "Connection refused by remote server",
+    6: "TTL expired",
+    7: "Command not supported",
+    8: "Address type not supported",
+}
+
+
+def encode_address(host: str, port: int) -> bytes:
+    """Encodes a host and port in SOCKS5 address form (ATYP, address, port)."""
+    try:
+        ip = ipaddress.ip_address(host)
+        atyp = b'\x01' if ip.version == 4 else b'\x04'
+        return atyp + ip.packed + port.to_bytes(2, 'big')
+    except ValueError:
+        encoded_host = host.encode('idna')
+        return b'\x03' + bytes([len(encoded_host)]) + encoded_host + port.to_bytes(2, 'big')
+
+
+async def read_address(reader) -> tuple:
+    """Reads a SOCKS5 address (ATYP, address, port) from a stream and returns (host, port)."""
+    atyp = (await reader.readexactly(1))[0]
+    if atyp == 1:
+        host = str(ipaddress.IPv4Address(await reader.readexactly(4)))
+    elif atyp == 4:
+        host = str(ipaddress.IPv6Address(await reader.readexactly(16)))
+    elif atyp == 3:
+        length = (await reader.readexactly(1))[0]
+        host = (await reader.readexactly(length)).decode('idna')
+    else:
+        raise ConnectionError(f"Unknown SOCKS5 address type {atyp}.")
+    port = int.from_bytes(await reader.readexactly(2), 'big')
+    return host, port
+
+
+async def open_connection(proxy_port: int, host: str, port: int, proxy_host: str = '127.0.0.1',
+                          timings: dict = None):
+    """
+    Opens a TCP stream to host:port through a SOCKS5 proxy without authentication.
+
+    Args:
+        proxy_port: The local port of the SOCKS5 proxy.
+        host: The destination host name or IP address.
+        port: The destination port.
+        proxy_host: The address of the SOCKS5 proxy.
+        timings: Optional dictionary that receives 'greeting_ms' and 'connect_ms' measurements.
+
+    Returns:
+        A (reader, writer) pair connected to the destination.
+
+    Raises:
+        ConnectionError: If the proxy rejects the greeting or the CONNECT request.
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+    try:
+        writer.write(b'\x05\x01\x00')
+        if await reader.readexactly(2) != b'\x05\x00':
+            raise ConnectionError("SOCKS5 greeting rejected by the proxy.")
+        if timings is not None:
+            timings['greeting_ms'] = (time.perf_counter() - start) * 1000
+
+        writer.write(b'\x05\x01\x00' + encode_address(host, port))
+        reply = await reader.readexactly(3)
+        if reply[1] != 0:
+            raise ConnectionError(SOCKS5_ERRORS.get(reply[1], f"SOCKS5 error {reply[1]}") + ".")
+        await read_address(reader)
+        if timings is not None:
+            timings['connect_ms'] = (time.perf_counter() - start) * 1000
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    loop = asyncio.get_running_loop()
+    data = b''
+    while len(data) < size:
+        chunk = await loop.sock_recv(sock, size - len(data))
+        if not chunk:
+            raise ConnectionError("The proxy closed the connection during the SOCKS5 handshake.")
+        data += chunk
+    return data
+
+
+async def connect_socket(proxy_port: int, host: str, port: int, proxy_host: str = '127.0.0.1') -> socket.socket:
+    """
+    Like open_connection(), but returns the connected non-blocking socket itself instead of asyncio streams, for
+    relays that move bytes between raw sockets.
+
+    Raises:
+        ConnectionError: If the proxy rejects the greeting or the CONNECT request.
+    """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET6 if ':' in proxy_host else socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        await loop.sock_connect(sock, (proxy_host, proxy_port))
+        await loop.sock_sendall(sock, b'\x05\x01\x00')
+        if await _recv_exactly(sock, 2) != b'\x05\x00':
+            raise ConnectionError("SOCKS5 greeting rejected by the proxy.")
+        await loop.sock_sendall(sock, b'\x05\x01\x00' + encode_address(host, port))
+        reply = await _recv_exactly(sock, 4)
+        if reply[1] != 0:
+            raise ConnectionError(SOCKS5_ERRORS.get(reply[1], f"SOCKS5 error {reply[1]}") + ".")
+        if reply[3] == 3:
+            address_length = (await _recv_exactly(sock, 1))[0]
+        else:
+            address_length = 16 if reply[3] == 4 else 4
+        await _recv_exactly(sock, address_length + 2)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def check_target(proxy_port: int, url: str, proxy_host: str = '127.0.0.1') -> dict:
+    """
+    Sends a lightweight HTTP HEAD request to a URL through the proxy and waits for the first response byte.
+
+    Returns:
+        A dictionary with the target and its 'greeting_ms', 'connect_ms' and 'first_byte_ms' timings,
+        each measured from the start of the check.
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "http":
+        raise ValueError(f"Only http:// health check targets are supported, got {url}")
+    host = parts.hostname
+    port = parts.port or 80
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+
+    result = {"target": url}
+    start = time.perf_counter()
+    reader, writer = await open_connection(proxy_port, host, port, proxy_host, timings=result)
+    try:
+        host_header = host if parts.port is None else f"{host}:{port}"
+        writer.write(f"HEAD {path} HTTP/1.1\r\nHost: {host_header}\r\nConnection: close\r\n\r\n".encode('ascii'))
+        if not await reader.read(1):
+            raise ConnectionError(f"{host} closed the connection without responding.")
+        result['first_byte_ms'] = (time.perf_counter() - start) * 1000
+    finally:
+        writer.close()
+    return result
+
+
+async def race_targets(proxy_port: int, targets: list = None, timeout: float = HEALTH_CHECK_TIMEOUT,
+                       proxy_host: str = '127.0.0.1') -> dict:
+    """
+    Checks all targets through the proxy at once and returns the first one to answer.
+
+    Raises:
+        ConnectionError: If every target fails or none answers within the timeout.
+    """
+    targets = targets or HEALTH_CHECK_TARGETS
+    tasks = [asyncio.create_task(check_target(proxy_port, url, proxy_host)) for url in targets]
+    errors = []
+    try:
+        for future in asyncio.as_completed(tasks, timeout=timeout):
+            try:
+                return await future
+            except asyncio.TimeoutError:
+                errors.append(f"No response within {timeout:.0f} seconds.")
+                break
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                errors.append(str(e) or e.__class__.__name__)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    raise ConnectionError(errors[0] if len(set(errors)) == 1 else "; ".join(errors))
@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import os
+import threading
+
+from core.event_loop import get_background_loop
+from core.relay import ClientConnections
+from core.socks import read_address
+from core.stats import TrafficCounters
+
+try:
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:
+    AESGCM = ChaCha20Poly1305 = None
+
+TAG_SIZE = 16
+NONCE_SIZE = 12
+MAX_PAYLOAD = 0x3FFF
+READ_SIZE = 64 * 1024
+SUBKEY_INFO = b"ss-subkey"
+
+# method -> (key size, salt size, AEAD class name)
+CIPHERS = {
+    "chacha20-ietf-poly1305": (32, 32, "ChaCha20Poly1305"),
+    "aes-256-gcm": (32, 32, "AESGCM"),
+    "aes-192-gcm": (24, 24, "AESGCM"),
+    "aes-128-gcm": (16, 16, "AESGCM"),
+}
+
+
+def is_available() -> bool:
+    """Returns True if the optional 'cryptography' package needed by the native engine is installed."""
+    return AESGCM is not None
+
+
+def supports_method(method: str) -> bool:
+    return method.lower() in CIPHERS
+
+
+def derive_master_key(password: str, key_size: int) -> bytes:
+    """Derives the master key from a password the way Shadowsocks does (OpenSSL EVP_BytesToKey with MD5)."""
+    password = password.encode('utf-8')
+    key = b''
+    previous = b''
+    while len(key) < key_size:
+        previous = hashlib.md5(previous + password).digest()
+        key += previous
+    return key[:key_size]
+
+
+def _make_aead(method: str, master_key: bytes, salt: bytes):
+    key_size, _, aead_name = CIPHERS[method]
+    subkey = HKDF(algorithm=hashes.SHA1(), length=key_size, salt=salt, info=SUBKEY_INFO).derive(master_key)
+    return ChaCha20Poly1305(subkey) if aead_name == "ChaCha20Poly1305" else AESGCM(subkey)
+
+
+class AEADEncryptor:
+    """Encrypts a byte stream into Shadowsocks AEAD chunks. The salt is prepended to the first output."""
+
+    def __init__(self, method: str, master_key: bytes):
+        salt_size = CIPHERS[method][1]
+        self.salt = os.urandom(salt_size)
+        self.aead = _make_aead(method, master_key, self.salt)
+        self.counter = 0
+        self.salt_sent = False
+
+    def _seal(self, data) -> bytes:
+        nonce = self.counter.to_bytes(NONCE_SIZE, 'little')
+        self.counter += 1
+        return self.aead.encrypt(nonce, data, None)
+
+    def encrypt(self, data) -> bytes:
+        view = memoryview(data)
+        out = []
+        if not self.salt_sent:
+            out.append(self.salt)
+            self.salt_sent = True
+        for offset in range(0, len(view), MAX_PAYLOAD):
+            chunk = view[offset:offset + MAX_PAYLOAD]
+            out.append(self._seal(len(chunk).to_bytes(2, 'big')))
+            out.append(self._seal(chunk))
+        return b''.join(out)
+
+
+class AEADDecryptor:
+    """
+    Decrypts Shadowsocks AEAD chunks from a byte stream fed in arbitrary pieces.
+
+    Incoming data is accumulated in one reusable bytearray and parsed in place through a memoryview, and the
+    consumed prefix is dropped once per feed() rather than once per chunk.
+    """
+
+    def __init__(self, method: str, master_key: bytes):
+        self.method = method
+        self.master_key = master_key
+        self.salt_size = CIPHERS[method][1]
+        self.aead = None
+        self.counter = 0
+        self.buffer = bytearray()
+        self.payload_length = None
+
+    def _open(self, data) -> bytes:
+        nonce = self.counter.to_bytes(NONCE_SIZE, 'little')
+        self.counter += 1
+        return self.aead.decrypt(nonce, data, None)
+
+    def feed(self, data) -> bytes:
+        """
+        Adds ciphertext and returns all plaintext that can be decrypted so far.
+
+        Raises:
+            cryptography.exceptions.InvalidTag: If a chunk fails authentication (wrong key or tampering).
+        """
+        self.buffer += data
+        out = []
+        pos = 0
+        with memoryview(self.buffer) as view:
+            if self.aead is None:
+                if len(view) < self.salt_size:
+                    return b''
+                self.aead = _make_aead(self.method, self.master_key, bytes(view[:self.salt_size]))
+                pos = self.salt_size
+            while True:
+                if self.payload_length is None:
+                    if len(view) - pos < 2 + TAG_SIZE:
+                        break
+                    length = int.from_bytes(self._open(view[pos:pos + 2 + TAG_SIZE]), 'big') & MAX_PAYLOAD
+                    self.payload_length = length
+                    pos += 2 + TAG_SIZE
+                end = pos + self.payload_length + TAG_SIZE
+                if len(view) < end:
+                    break
+                out.append(self._open(view[pos:end]))
+                pos = end
+                self.payload_length = None
+        del self.buffer[:pos]
+        return b''.join(out)
+
+
+async def read_raw_address(reader) -> bytes:
+    """Reads a SOCKS5 address (ATYP, address, port) and returns it unparsed, as Shadowsocks expects it."""
+    atyp = await reader.readexactly(1)
+    if atyp == b'\x01':
+        return atyp + await reader.readexactly(4 + 2)
+    if atyp == b'\x04':
+        return atyp + await reader.readexactly(16 + 2)
+    if atyp == b'\x03':
+        length = await reader.readexactly(1)
+        return atyp + length + await reader.readexactly(length[0] + 2)
+    raise ConnectionError(f"Unknown SOCKS5 address type {atyp[0]}.")
+
+
+async def _encrypt_pipe(reader, writer, encryptor: AEADEncryptor, first: bytes, counters: TrafficCounters):
+    try:
+        writer.write(encryptor.encrypt(first))
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            counters.add_out(len(data))
+            writer.write(encryptor.encrypt(data))
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def _decrypt_pipe(reader, writer, decryptor: AEADDecryptor, counters: TrafficCounters):
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            plaintext = decryptor.feed(data)
+            if plaintext:
+                counters.add_in(len(plaintext))
+                writer.write(plaintext)
+                await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError, ValueError):
+        pass
+    except Exception as e:
+        # InvalidTag: the server's data could not be authenticated, usually a wrong password or method.
+        print(f"Native engine: dropping connection, {e.__class__.__name__}")
+
+
+class NativeTunnel:
+    """
+    A local SOCKS5 listener that speaks Shadowsocks AEAD to the upstream server, replacing ss-local.
+    """
+
+    def __init__(self, config: dict, local_port: int):
+        method = config['method'].lower()
+        if not is_available():
+            raise RuntimeError("The built-in engine requires the 'cryptography' package.")
+        if method not in CIPHERS:
+            raise ValueError(f"The built-in engine does not support the '{config['method']}' method.")
+        self.method = method
+        self.server = config['server']
+        self.server_port = int(config['server_port'])
+        self.local_port = local_port
+        self.master_key = derive_master_key(config['password'], CIPHERS[method][0])
+        self.listener = None
+        self.clients = ClientConnections()
+        self.counters = TrafficCounters()
+
+    async def start(self):
+        self.listener = await asyncio.start_server(self.clients.track(self._handle), '127.0.0.1', self.local_port)
+
+    async def stop(self):
+        """Stops listening and ends the tunneled connections, closing their client and upstream sides."""
+        if self.listener:
+            await self.clients.close(self.listener)
+            self.listener = None
+
+    async def _handle(self, reader, writer):
+        upstream_writer = None
+        try:
+            header = await reader.readexactly(2)
+            await reader.readexactly(header[1])
+            writer.write(b'\x05\x00')
+            version, command, _ = await reader.readexactly(3)
+            address = await read_raw_address(reader)
+            if command != 1:
+                writer.write(b'\x05\x07\x00\x01' + bytes(6))
+                return
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection(self.server, self.server_port)
+            except OSError:
+                writer.write(b'\x05\x05\x00\x01' + bytes(6))
+                return
+            writer.write(b'\x05\x00\x00\x01' + bytes(6))
+            encryptor = AEADEncryptor(self.method, self.master_key)
+            decryptor = AEADDecryptor(self.method, self.master_key)
+            self.counters.opened()
+            try:
+                await asyncio.gather(_encrypt_pipe(reader, upstream_writer, encryptor, address, self.counters),
+                                     _decrypt_pipe(upstream_reader, writer, decryptor, self.counters))
+            finally:
+                self.counters.closed()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+            if upstream_writer:
+                upstream_writer.close()
+
+
+class NativeTunnelProcess:
+    """
+    Wraps a NativeTunnel running on the background loop in the subset of the subprocess.Popen interface that
+    ConnectionAttempt and ConnectionManager use, so both engines share the same connect/disconnect code.
+
+    Neither starting nor stopping blocks, so both are safe on the background loop itself; `started` is a
+    concurrent.futures.Future that completes once the listener is up.
+    """
+    pid = None
+
+    def __init__(self, config: dict, local_port: int):
+        self.tunnel = NativeTunnel(config, local_port)
+        self.counters = self.tunnel.counters
+        self.returncode = None
+        self._exited = threading.Event()
+        self.started = get_background_loop().submit(self.tunnel.start())
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.returncode = 0
+            get_background_loop().submit(self._stop()).add_done_callback(lambda _: self._exited.set())
+
+    kill = terminate
+
+    async def _stop(self):
+        # Stopping while the listener is still being opened waits for it, so it cannot open after being stopped.
+        await asyncio.wait([asyncio.wrap_future(self.started)])
+        await self.tunnel.stop()
+
+    def wait(self, timeout=None):
+        self._exited.wait(timeout)
+        return self.returncode
+
+
+async def open_upstream_request(server_reader, master_key: bytes, method: str):
+    """
+    Server side of the handshake, used by local ss-server stand-ins: returns the decryptor, the requested
+    (host, port) and any payload that arrived with the address header.
+    """
+    decryptor = AEADDecryptor(method, master_key)
+    plaintext = b''
+    while len(plaintext) < 1 or not _address_complete(plaintext):
+        data = await server_reader.read(READ_SIZE)
+        if not data:
+            raise ConnectionError("Client closed before sending the target address.")
+        plaintext += decryptor.feed(data)
+    stream = asyncio.StreamReader()
+    stream.feed_data(plaintext)
+    stream.feed_eof()
+    host, port = await read_address(stream)
+    return decryptor, (host, port), await stream.read()
+
+
+def _address_complete(data: bytes) -> bool:
+    atyp = data[0]
+    if atyp == 1:
+        return len(data) >= 1 + 4 + 2
+    if atyp == 4:
+        return len(data) >= 1 + 16 + 2
+    return len(data) >= 2 and len(data) >= 2 + data[1] + 2
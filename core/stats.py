@@ -0,0 +1,105 @@
+import time
+
+
+class TrafficCounters:
+    """
+    Byte and connection counters updated by the in-process relays (built-in engine, forwarder, load balancer).
+    Counting is a couple of integer additions per read, so it is always on.
+    """
+
+    def __init__(self):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.active_connections = 0
+        self.total_connections = 0
+
+    def add_in(self, count: int):
+        self.bytes_in += count
+
+    def add_out(self, count: int):
+        self.bytes_out += count
+
+    def opened(self):
+        self.active_connections += 1
+        self.total_connections += 1
+
+    def closed(self):
+        self.active_connections -= 1
+
+
+def _established_connections(process, local_port: int) -> int:
+    """Counts client connections accepted on a tunnel's local port."""
+    import psutil
+    get_connections = getattr(process, 'net_connections', None) or process.connections
+    return sum(1 for c in get_connections(kind='tcp')
+               if c.status == psutil.CONN_ESTABLISHED and c.laddr and c.laddr.port == local_port)
+
+
+class StatsSampler:
+    """
+    Turns counters and process metrics into a stats snapshot with current throughput.
+
+    Throughput is the byte delta since the previous sample divided by the elapsed time, so the sampling interval
+    sets the averaging window. psutil.Process objects are kept between samples because cpu_percent() measures
+    CPU time since its previous call on the same object.
+    """
+
+    def __init__(self):
+        self.last_sample = None
+        self.processes = {}
+
+    def reset(self):
+        self.last_sample = None
+        self.processes = {}
+
+    def _process(self, pid: int):
+        import psutil
+        if pid not in self.processes:
+            self.processes[pid] = psutil.Process(pid)
+            self.processes[pid].cpu_percent(None)
+        return self.processes[pid]
+
+    def sample(self, counters: TrafficCounters = None, pids=(), local_port: int = None) -> dict:
+        """
+        Args:
+            counters: The relay counters for the tunnel, or None if its traffic does not pass through ProxyPal.
+            pids: The tunnel processes whose CPU and memory should be reported.
+            local_port: The tunnel's SOCKS port, used to count connections when there are no relay counters.
+        """
+        now = time.monotonic()
+        stats = {"bytes_in": None, "bytes_out": None, "rate_in": None, "rate_out": None,
+                 "connections": None, "cpu_percent": None, "rss": None}
+
+        if counters is not None:
+            stats["bytes_in"] = counters.bytes_in
+            stats["bytes_out"] = counters.bytes_out
+            stats["connections"] = counters.active_connections
+            if self.last_sample:
+                elapsed = now - self.last_sample[0]
+                if elapsed > 0:
+                    stats["rate_in"] = (counters.bytes_in - self.last_sample[1]) / elapsed
+                    stats["rate_out"] = (counters.bytes_out - self.last_sample[2]) / elapsed
+            self.last_sample = (now, counters.bytes_in, counters.bytes_out)
+
+        # psutil is imported on first use rather than at startup, as only a connected tunnel needs it.
+        import psutil
+        cpu_percent = rss = 0.0
+        connections = 0
+        measured = False
+        for pid in pids:
+            try:
+                process = self._process(pid)
+                with process.oneshot():
+                    cpu_percent += process.cpu_percent(None)
+                    rss += process.memory_info().rss
+                    if counters is None and local_port is not None:
+                        connections += _established_connections(process, local_port)
+                measured = True
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self.processes.pop(pid, None)
+        if measured:
+            stats["cpu_percent"] = cpu_percent
+            stats["rss"] = rss
+            if counters is None and local_port is not None:
+                stats["connections"] = connections
+        return stats
@@ -1,9 +1,30 @@
+import atexit
 import json
+import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+from utils.network import normalize_host
+
+try:
+    from core.server_db import ServerDatabase
+except ImportError:
+    # Python was built without sqlite3; only the JSON backend is available.
+    ServerDatabase = None
+
 APP_SUPPORT_DIR = Path.home() / "Library" / "Application Support" / "ProxyPal"
 
 CONFIG_FILE = APP_SUPPORT_DIR / "servers.json"
+DATABASE_FILE = APP_SUPPORT_DIR / "servers.db"
+SUBSCRIPTIONS_FILE = APP_SUPPORT_DIR / "subscriptions.json"
+SETTINGS_FILE = APP_SUPPORT_DIR / "settings.json"
+
+SAVE_DELAY = 0.5
+
+STORAGE_JSON = "json"
+STORAGE_SQLITE = "sqlite"
 
 
 def _ensure_dir_exists():
@@ -11,38 +32,427 @@ def _ensure_dir_exists():
     APP_SUPPORT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def load_servers() -> list:
-    """Loads all server configurations from the standard application support directory."""
+def write_atomic(path: Path, text, durable: bool = True):
+    """
+    Writes a file so that readers, and the file after a crash, only ever see the old or the new contents.
+
+    The data is written to a temporary file in the same directory, flushed to disk and then renamed over the
+    original, which is atomic on POSIX file systems. Bytes are written as they are, text is encoded.
+
+    Args:
+        durable: Wait until the data and the rename are on disk. Files that only need to survive the app
+            crashing, not the machine, skip this and cost no disk flush.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(text, bytes) else "w") as f:
+            f.write(text)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if not durable:
+        return
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+class JsonBackend:
+    """Stores the server list in a single JSON file, rewritten atomically as a whole. Metadata is not kept."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def load(self) -> tuple:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f), {}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return [], {}
+
+    def write(self, servers: list, changed: dict, metadata: dict):
+        if changed:
+            write_atomic(self.path, json.dumps(servers, indent=4))
+
+
+def _last_written(path: Path) -> float:
+    """The last time a file, or the SQLite write-ahead log next to it, was written; 0 if neither exists."""
+    times = []
+    for candidate in (path, path.with_name(path.name + "-wal")):
+        try:
+            times.append(candidate.stat().st_mtime)
+        except OSError:
+            pass
+    return max(times, default=0)
+
+
+def create_backend(kind: str = None):
+    """
+    Returns the backend chosen by the "storage" setting: STORAGE_JSON, the default, or STORAGE_SQLITE.
+
+    Both files are kept on disk and whichever was saved last holds the current list, so after the setting is
+    switched the chosen backend first takes it over from the other one: SQLite imports servers.json, JSON exports
+    servers.db. Switching back is changing the setting again.
+    """
     _ensure_dir_exists()
+    if kind is None:
+        kind = load_settings().get("storage", STORAGE_JSON)
+    if kind == STORAGE_SQLITE and ServerDatabase is None:
+        print("Storage: sqlite3 is not available, using servers.json")
+        kind = STORAGE_JSON
+    json_written = _last_written(CONFIG_FILE)
+    database_written = _last_written(DATABASE_FILE)
+
+    if kind == STORAGE_SQLITE:
+        database = ServerDatabase(DATABASE_FILE)
+        if json_written > database_written:
+            database.migrate_from_json(CONFIG_FILE)
+        return database
+
+    if ServerDatabase is not None and database_written > json_written:
+        database = ServerDatabase(DATABASE_FILE)
+        try:
+            servers, _ = database.load()
+        finally:
+            database.close()
+        write_atomic(CONFIG_FILE, json.dumps(servers, indent=4))
+        print(f"Storage: exported {len(servers)} servers from {DATABASE_FILE.name} to {CONFIG_FILE.name}")
+    return JsonBackend(CONFIG_FILE)
+
+
+def _empty_metadata() -> dict:
+    return {"latency_ms": None, "last_probed": None, "connect_count": 0, "last_connected": None,
+            "bytes_in": 0, "bytes_out": 0}
+
+
+class ServerRegistry:
+    """
+    The in-memory server list, keyed by id, and the source of truth while the app runs.
+
+    Lookups and changes are O(1). Changes are written back in the background: the first change schedules a save
+    SAVE_DELAY seconds later and any further changes before then are written by that same save. The JSON backend
+    rewrites the file once per save; the SQLite backend only writes the rows that changed. Call flush() before
+    exiting to write pending changes.
+    """
+
+    def __init__(self, backend=None, save_delay: float = SAVE_DELAY):
+        self.backend = backend
+        self.save_delay = save_delay
+        self.servers = {}
+        self.metadata = {}
+        self.by_address = {}
+        self.loaded = False
+        self.changed = {}
+        self.metadata_changed = set()
+        self._timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+
+    @staticmethod
+    def _address(config: dict) -> tuple:
+        return normalize_host(config.get('server') or ''), int(config.get('server_port') or 0)
+
+    def _index(self, config: dict):
+        self.by_address.setdefault(self._address(config), set()).add(config['id'])
+
+    def _unindex(self, config: dict):
+        ids = self.by_address.get(self._address(config))
+        if ids is not None:
+            ids.discard(config['id'])
+            if not ids:
+                del self.by_address[self._address(config)]
+
+    def load(self):
+        """(Re)loads the registry from the backend, dropping duplicate ids."""
+        with self._lock:
+            if self.backend is None:
+                self.backend = create_backend()
+            self.servers = {}
+            self.by_address = {}
+            servers, self.metadata = self.backend.load()
+            by_address = self.by_address
+            for config in servers:
+                server_id = config.get('id')
+                if server_id and server_id not in self.servers:
+                    self.servers[server_id] = config
+                    # _index() inlined, as this runs once per server at startup.
+                    address = normalize_host(config.get('server') or ''), int(config.get('server_port') or 0)
+                    if address in by_address:
+                        by_address[address].add(server_id)
+                    else:
+                        by_address[address] = {server_id}
+            self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def all(self) -> list:
+        """Returns the server configurations in the order they were added. The dicts are the registry's own."""
+        with self._lock:
+            self._ensure_loaded()
+            return list(self.servers.values())
+
+    def get(self, server_id: str):
+        with self._lock:
+            self._ensure_loaded()
+            return self.servers.get(server_id)
+
+    def contains(self, server_id: str) -> bool:
+        return self.get(server_id) is not None
+
+    def find_by_address(self, host: str, port: int) -> list:
+        """Returns the configurations of all servers at the given host and port."""
+        with self._lock:
+            self._ensure_loaded()
+            return [self.servers[i] for i in self.by_address.get((normalize_host(host), int(port)), ())]
+
+    def find_duplicate(self, config: dict):
+        """Returns a stored server with the same host, port, method and password as config, or None."""
+        method = config.get('method', '').lower()
+        for other in self.find_by_address(config.get('server') or '', config.get('server_port') or 0):
+            if other.get('method', '').lower() == method and other.get('password') == config.get('password'):
+                return other
+        return None
+
+    def add(self, config: dict) -> bool:
+        """Adds a server. Returns False, without changing anything, if a server with the same id exists."""
+        with self._lock:
+            self._ensure_loaded()
+            if config['id'] in self.servers:
+                return False
+            self.servers[config['id']] = config
+            self._index(config)
+            self._mark_dirty(config['id'])
+            return True
+
+    def add_many(self, configs: list) -> list:
+        """
+        Adds several servers and saves them right away in a single write (one transaction with SQLite).
+
+        Returns:
+            The configurations that were added; those whose id already exists are skipped.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            added = []
+            for config in configs:
+                if config['id'] not in self.servers:
+                    self.servers[config['id']] = config
+                    self._index(config)
+                    self.changed[config['id']] = config
+                    added.append(config)
+        self.flush()
+        return added
+
+    def apply_changes(self, added: list = (), removed: list = (), replaced: list = ()):
+        """
+        Applies a batch of changes and saves them right away in a single write.
+
+        Args:
+            added: Configurations to add.
+            removed: Ids of servers to remove.
+            replaced: (old id, new configuration) pairs. The new configuration may have a different id.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            for server_id in removed:
+                self.remove(server_id)
+            for old_id, config in replaced:
+                old = self.servers.get(old_id)
+                if old is None:
+                    continue
+                if old_id != config['id']:
+                    metadata = self.metadata.pop(old_id, None)
+                    self.remove(old_id)
+                    existing = self.servers.get(config['id'])
+                    if existing is not None:
+                        # The new id belongs to another stored server: both merge into it, keeping its metadata.
+                        self._unindex(existing)
+                    if metadata is not None:
+                        self.metadata.setdefault(config['id'], metadata)
+                else:
+                    self._unindex(old)
+                self.servers[config['id']] = config
+                self._index(config)
+                self._mark_dirty(config['id'])
+                if config['id'] in self.metadata:
+                    self.metadata_changed.add(config['id'])
+            for config in added:
+                self.add(config)
+        self.flush()
+
+    def remove(self, server_id: str):
+        """Removes a server and returns its configuration, or None if there was none."""
+        with self._lock:
+            self._ensure_loaded()
+            config = self.servers.pop(server_id, None)
+            if config is not None:
+                self._unindex(config)
+                self.metadata.pop(server_id, None)
+                self.metadata_changed.discard(server_id)
+                self._mark_dirty(server_id)
+            return config
+
+    def rename(self, server_id: str, new_name: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            config = self.servers.get(server_id)
+            if config is None:
+                return False
+            config['name'] = new_name
+            self._mark_dirty(server_id)
+            return True
+
+    def replace_all(self, server_configs: list):
+        """Replaces the whole server list, keeping the metadata of servers that remain."""
+        with self._lock:
+            self._ensure_loaded()
+            new_ids = {config['id'] for config in server_configs}
+            for server_id in list(self.servers):
+                if server_id not in new_ids:
+                    self.remove(server_id)
+            for config in server_configs:
+                if config['id'] in self.servers:
+                    self._unindex(self.servers[config['id']])
+                self.servers[config['id']] = config
+                self._index(config)
+                self._mark_dirty(config['id'])
+
+    def get_metadata(self, server_id: str) -> dict:
+        """Returns the stored latency and usage figures for a server."""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self.metadata.get(server_id) or _empty_metadata())
+
+    def _update_metadata(self, server_id: str, **fields):
+        with self._lock:
+            self._ensure_loaded()
+            if server_id not in self.servers:
+                return
+            metadata = self.metadata.setdefault(server_id, _empty_metadata())
+            for key, value in fields.items():
+                metadata[key] = value(metadata[key]) if callable(value) else value
+            self.metadata_changed.add(server_id)
+            self._mark_dirty()
+
+    def record_latency(self, server_id: str, latency_ms: float):
+        self._update_metadata(server_id, latency_ms=latency_ms, last_probed=time.time())
+
+    def record_connect(self, server_id: str):
+        self._update_metadata(server_id, connect_count=lambda count: count + 1, last_connected=time.time())
+
+    def record_usage(self, server_id: str, bytes_in: int, bytes_out: int):
+        self._update_metadata(server_id, bytes_in=lambda total: total + bytes_in,
+                              bytes_out=lambda total: total + bytes_out)
+
+    def _mark_dirty(self, server_id: str = None):
+        if server_id is not None:
+            self.changed[server_id] = self.servers.get(server_id)
+        if self._timer is None:
+            self._timer = threading.Timer(self.save_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Writes pending changes to the backend now. The registry stays usable while they are written."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self.changed and not self.metadata_changed:
+                    return
+                changed, self.changed = self.changed, {}
+                metadata = {server_id: dict(self.metadata[server_id]) for server_id in self.metadata_changed}
+                self.metadata_changed = set()
+                snapshot = list(self.servers.values())
+            try:
+                self.backend.write(snapshot, changed, metadata)
+            except Exception as e:
+                print(f"Error saving server configurations: {e}")
+
+
+_registry = None
+
+
+def get_registry() -> ServerRegistry:
+    """Returns the application's registry, created on first use with the default backend."""
+    global _registry
+    if _registry is None:
+        _registry = ServerRegistry()
+        atexit.register(_registry.flush)
+    return _registry
+
+
+def load_subscriptions() -> list:
+    """Loads the subscription list: dicts with the URL and the caching headers of the last download."""
     try:
-        with open(CONFIG_FILE, "r") as f:
+        with open(SUBSCRIPTIONS_FILE, "r") as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         return []
 
 
-def save_servers(server_configs: list):
-    """Saves the entire list of server configurations to the application support directory."""
+def save_subscriptions(subscriptions: list):
+    _ensure_dir_exists()
+    try:
+        write_atomic(SUBSCRIPTIONS_FILE, json.dumps(subscriptions, indent=4))
+    except OSError as e:
+        print(f"Error saving subscriptions: {e}")
+
+
+def load_settings() -> dict:
+    """Loads the app settings, such as which local services are enabled and the ports they listen on."""
+    try:
+        with open(SETTINGS_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_settings(settings: dict):
     _ensure_dir_exists()
     try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(server_configs, f, indent=4)
-    except IOError as e:
-        print(f"Error saving server configurations: {e}")
+        write_atomic(SETTINGS_FILE, json.dumps(settings, indent=4))
+    except OSError as e:
+        print(f"Error saving settings: {e}")
+
+
+def load_servers() -> list:
+    """Loads all server configurations."""
+    return get_registry().all()
+
+
+def save_servers(server_configs: list):
+    """Replaces the entire list of server configurations and saves it."""
+    get_registry().replace_all(server_configs)
+    get_registry().flush()
 
 
 def add_server(new_config: dict):
     """Adds a new server configuration to the list and saves it."""
-    servers = load_servers()
-    if any(s['id'] == new_config['id'] for s in servers):
+    if not get_registry().add(new_config):
         print(f"Server with ID {new_config['id']} already exists. Not adding.")
-        return
-    servers.append(new_config)
-    save_servers(servers)
 
 
 def delete_server(server_id: str):
     """Deletes a server configuration from the list by its ID."""
-    servers = load_servers()
-    servers_to_keep = [s for s in servers if s.get('id') != server_id]
-    save_servers(servers_to_keep)
+    get_registry().remove(server_id)
+
+
+def rename_server(server_id: str, new_name: str):
+    """Renames a server configuration by its ID."""
+    get_registry().rename(server_id, new_name)
@@ -0,0 +1,247 @@
+import time
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal
+
+from core.importer import READ_SIZE, identity, iter_access_keys
+from core.parser import parse_access_key
+from core.storage import load_subscriptions, save_subscriptions
+from utils.network import normalize_host
+
+FETCH_TIMEOUT = 15
+SYNC_INTERVAL = 6 * 60 * 60
+USER_AGENT = "ProxyPal"
+
+
+def fetch_subscription(url: str, etag: str = None, last_modified: str = None, timeout: float = FETCH_TIMEOUT) -> dict:
+    """
+    Downloads a subscription (SIP008 JSON or a plain or base64 ss:// list) unless it is unchanged.
+
+    The validators from the previous download are sent as If-None-Match and If-Modified-Since, so an unchanged
+    subscription costs a 304 response with no body. The body is parsed as it streams in.
+
+    Returns:
+        A dictionary with the HTTP status, the new validators and, for a 200 response, the parsed configurations
+        and the number of keys that could not be parsed.
+
+    Raises:
+        requests.exceptions.RequestException: If the download fails.
+        ValueError: If the body is not in a supported format.
+    """
+    import requests
+    headers = {"User-Agent": USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return {"status": 304, "etag": etag, "last_modified": last_modified}
+        response.raise_for_status()
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            response.encoding = 'utf-8'
+        configs = []
+        invalid = 0
+        for key in iter_access_keys(response.iter_content(chunk_size=READ_SIZE, decode_unicode=True)):
+            try:
+                config = parse_access_key(key)
+            except ValueError:
+                invalid += 1
+                continue
+            config['subscription'] = url
+            configs.append(config)
+        return {"status": response.status_code, "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'), "configs": configs, "invalid": invalid}
+
+
+def _address(config: dict) -> tuple:
+    return normalize_host(config['server']), int(config['server_port'])
+
+
+def diff_servers(current: list, fetched: list) -> dict:
+    """
+    Compares the stored servers of a subscription with a fresh download.
+
+    Servers are matched on identity(). A server whose name or key changed is reported as replaced, and so is one
+    that kept its host and port but got a new method or password, so its card is updated rather than recreated.
+
+    Returns:
+        {"added": [configs], "removed": [ids], "replaced": [(old id, new config)], "unchanged": count}
+    """
+    remaining = {identity(config): config for config in current}
+    seen = set()
+    new = []
+    replaced = []
+    unchanged = 0
+    for config in fetched:
+        key = identity(config)
+        if key in seen:
+            continue
+        seen.add(key)
+        old = remaining.pop(key, None)
+        if old is None:
+            new.append(config)
+        elif old['id'] != config['id'] or old.get('name') != config.get('name'):
+            replaced.append((old['id'], config))
+        else:
+            unchanged += 1
+
+    by_address = {}
+    for key, old in remaining.items():
+        by_address.setdefault(_address(old), []).append(key)
+    added = []
+    for config in new:
+        keys = by_address.get(_address(config))
+        if keys:
+            replaced.append((remaining.pop(keys.pop(0))['id'], config))
+        else:
+            added.append(config)
+    return {"added": added, "removed": [config['id'] for config in remaining.values()], "replaced": replaced,
+            "unchanged": unchanged}
+
+
+def sync_subscription(subscription: dict, registry) -> dict:
+    """
+    Refreshes one subscription and applies the difference to the registry in a single write.
+
+    The subscription's validators and sync status are updated in place.
+
+    Returns:
+        The diff_servers() result plus the URL and HTTP status; the diff is empty for a 304.
+    """
+    url = subscription['url']
+    result = fetch_subscription(url, subscription.get('etag'), subscription.get('last_modified'))
+    subscription.update(etag=result['etag'], last_modified=result['last_modified'], last_sync=time.time(),
+                        last_status=result['status'], last_error=None)
+    if result['status'] == 304:
+        return {"url": url, "status": 304, "added": [], "removed": [], "replaced": [], "unchanged": None}
+
+    current = [config for config in registry.all() if config.get('subscription') == url]
+    diff = diff_servers(current, result['configs'])
+    # Servers the user already has, added by hand or from another subscription, are not added twice.
+    diff['added'] = [config for config in diff['added']
+                     if not registry.contains(config['id']) and registry.find_duplicate(config) is None]
+    registry.apply_changes(diff['added'], diff['removed'], diff['replaced'])
+    diff.update(url=url, status=result['status'], invalid=result['invalid'])
+    return diff
+
+
+class SubscriptionWorker(QThread):
+    """
+    Syncs subscriptions one after another off the GUI thread.
+
+    It works on copies of the subscriptions and hands them back, with their new validators and sync status, through
+    finished, so the manager's own list is only ever touched on the GUI thread.
+    """
+    synced = pyqtSignal(dict)
+    finished = pyqtSignal(list)
+
+    def __init__(self, subscriptions: list, registry, parent=None):
+        super().__init__(parent)
+        self.subscriptions = [dict(subscription) for subscription in subscriptions]
+        self.registry = registry
+
+    def run(self):
+        import requests
+        for subscription in self.subscriptions:
+            if self.isInterruptionRequested():
+                break
+            try:
+                diff = sync_subscription(subscription, self.registry)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                subscription.update(last_sync=time.time(), last_error=str(e) or e.__class__.__name__)
+                diff = {"url": subscription['url'], "error": subscription['last_error']}
+            self.synced.emit(diff)
+        self.finished.emit(self.subscriptions)
+
+
+class SubscriptionManager(QObject):
+    """
+    Keeps the subscription list and refreshes every subscription on a schedule.
+
+    servers_changed is emitted with each diff that added, removed or replaced servers, after the registry has
+    been updated, so the UI only has to update the affected cards.
+    """
+    servers_changed = pyqtSignal(dict)
+    sync_finished = pyqtSignal()
+
+    def __init__(self, registry, parent=None, interval: float = SYNC_INTERVAL):
+        super().__init__(parent)
+        self.registry = registry
+        self.subscriptions = load_subscriptions()
+        self.worker = None
+        self.sync_again = False
+        self.results = {}
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.sync_now)
+
+    def start(self):
+        """Starts the schedule, syncing right away if any subscription is due."""
+        self.timer.start()
+        due = time.time() - self.timer.interval() / 1000
+        if any((subscription.get('last_sync') or 0) < due for subscription in self.subscriptions):
+            self.sync_now()
+
+    def add(self, url: str) -> bool:
+        if any(subscription['url'] == url for subscription in self.subscriptions):
+            return False
+        self.subscriptions.append({"url": url})
+        save_subscriptions(self.subscriptions)
+        self.sync_now()
+        return True
+
+    def remove(self, url: str):
+        """Removes a subscription together with its servers."""
+        self.subscriptions = [subscription for subscription in self.subscriptions if subscription['url'] != url]
+        save_subscriptions(self.subscriptions)
+        removed = [config['id'] for config in self.registry.all() if config.get('subscription') == url]
+        self.registry.apply_changes(removed=removed)
+        if removed:
+            self.servers_changed.emit({"url": url, "added": [], "removed": removed, "replaced": []})
+
+    def is_syncing(self) -> bool:
+        return self.worker is not None
+
+    def sync_now(self):
+        if self.worker:
+            self.sync_again = True
+            return
+        if not self.subscriptions:
+            return
+        self.worker = SubscriptionWorker(self.subscriptions, self.registry)
+        self.worker.synced.connect(self.on_synced)
+        self.worker.finished.connect(self.on_worker_finished)
+        self.worker.start()
+
+    def on_synced(self, diff):
+        if not any(subscription['url'] == diff['url'] for subscription in self.subscriptions):
+            # Removed while it was being synced.
+            self.remove(diff['url'])
+            return
+        self.results[diff['url']] = diff
+        if diff.get('error'):
+            print(f"Subscription: {diff['url']} failed: {diff['error']}")
+        elif diff['status'] == 304:
+            print(f"Subscription: {diff['url']} unchanged")
+        else:
+            print(f"Subscription: {diff['url']} +{len(diff['added'])} -{len(diff['removed'])} "
+                  f"~{len(diff['replaced'])}")
+        if diff.get('added') or diff.get('removed') or diff.get('replaced'):
+            self.servers_changed.emit(diff)
+
+    def on_worker_finished(self, synced: list):
+        self.worker = None
+        by_url = {subscription['url']: subscription for subscription in synced}
+        for subscription in self.subscriptions:
+            # Subscriptions added while the worker ran are not in its list.
+            subscription.update(by_url.get(subscription['url'], {}))
+        save_subscriptions(self.subscriptions)
+        self.sync_finished.emit()
+        if self.sync_again:
+            self.sync_again = False
+            self.sync_now()
+
+    def stop(self):
+        self.timer.stop()
+        self.sync_again = False
+        if self.worker:
+            self.worker.requestInterruption()
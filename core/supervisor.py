@@ -0,0 +1,214 @@
+import json
+import threading
+import time
+
+from core import storage
+from core.tunnel_log import get_tunnel_log
+from utils.network import release_port
+
+PID_FILE = storage.APP_SUPPORT_DIR / "tunnels.json"
+STOP_GRACE = 2.0
+RESTART_DELAY = 0.5
+MAX_RESTART_DELAY = 30.0
+MAX_RESTARTS = 5
+STABLE_AFTER = 60.0
+
+
+class Tunnel:
+    """
+    A tunnel process started by the TunnelSupervisor.
+
+    Offers the subset of the subprocess.Popen interface the connection code uses, and keeps answering for the
+    tunnel while it is restarted after a crash, so holders never see the short-lived process objects.
+    """
+
+    def __init__(self, start, port: int, name: str):
+        self.start = start
+        self.port = port
+        self.name = name
+        self.process = None
+        self.restart = False
+        self.restarts = 0
+        self.returncode = None
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def pid(self):
+        process = self.process
+        return process.pid if process else None
+
+    @property
+    def counters(self):
+        return getattr(self.process, 'counters', None)
+
+    def poll(self):
+        """Returns None while the tunnel runs or is about to be restarted, otherwise its exit code."""
+        if self.returncode is not None:
+            return self.returncode
+        if self.restart and not self.stopping.is_set():
+            return None
+        return self.process.poll()
+
+
+class TunnelSupervisor:
+    """
+    Owns every tunnel process ProxyPal starts.
+
+    The PIDs are kept in memory and mirrored to a pidfile, so the processes left behind by a crash can be stopped
+    on the next launch without touching ss-local instances started by anything else. Each tunnel has a monitor
+    thread that waits on it: stopping only signals the process and returns, and a tunnel that dies on its own is
+    restarted on the same port with exponential backoff.
+    """
+
+    def __init__(self, pid_file=PID_FILE):
+        self.pid_file = pid_file
+        self.tunnels = set()
+        self.orphans = []
+        self._lock = threading.Lock()
+
+    def launch(self, start, port: int, name: str = "ss-local") -> Tunnel:
+        """
+        Starts a tunnel process and takes ownership of it and of its port.
+
+        Args:
+            start: Callable returning a new Popen-like process; called again for every restart.
+            port: The local port reserved for the tunnel with allocate_port(), released when it stops.
+            name: The executable name, checked before stopping leftover processes on the next launch.
+
+        Returns:
+            The Tunnel. Set its restart attribute once it is known to work to have crashes restarted.
+        """
+        tunnel = Tunnel(start, port, name)
+        tunnel.process = start()
+        with self._lock:
+            self.tunnels.add(tunnel)
+            self._save()
+        threading.Thread(target=self._monitor, args=(tunnel,), name=f"Tunnel-{port}", daemon=True).start()
+        return tunnel
+
+    def stop(self, tunnel: Tunnel):
+        """Asks the tunnel to exit and returns immediately; it is killed if still running after STOP_GRACE."""
+        with tunnel.lock:
+            if tunnel.stopping.is_set():
+                return
+            tunnel.stopping.set()
+            process = tunnel.process
+            if process.poll() is None:
+                process.terminate()
+        killer = threading.Timer(STOP_GRACE, self._kill, args=(process,))
+        killer.daemon = True
+        killer.start()
+
+    def stop_all(self):
+        with self._lock:
+            tunnels = list(self.tunnels)
+        for tunnel in tunnels:
+            self.stop(tunnel)
+
+    @staticmethod
+    def _kill(process):
+        if process.poll() is None:
+            print(f"Tunnel process {process.pid} ignored SIGTERM; killing it")
+            process.kill()
+
+    def _monitor(self, tunnel: Tunnel):
+        """Waits for the tunnel's process to exit and restarts it unless it was stopped or keeps crashing."""
+        while True:
+            process = tunnel.process
+            started = time.monotonic()
+            returncode = process.wait()
+            if tunnel.stopping.is_set() or not tunnel.restart:
+                break
+            if time.monotonic() - started >= STABLE_AFTER:
+                tunnel.restarts = 0
+            if tunnel.restarts >= MAX_RESTARTS:
+                self._report(tunnel, f"crashed {MAX_RESTARTS} times in a row; giving up")
+                break
+            delay = min(RESTART_DELAY * 2 ** tunnel.restarts, MAX_RESTART_DELAY)
+            tunnel.restarts += 1
+            self._report(tunnel, f"exited with code {returncode}; restarting in {delay:.1f} s")
+            if tunnel.stopping.wait(delay):
+                break
+            with tunnel.lock:
+                if tunnel.stopping.is_set():
+                    break
+                try:
+                    tunnel.process = tunnel.start()
+                except OSError as e:
+                    self._report(tunnel, f"could not be restarted: {e}")
+                    break
+            with self._lock:
+                self._save()
+        tunnel.returncode = tunnel.process.poll()
+        with self._lock:
+            self.tunnels.discard(tunnel)
+            self._save()
+        release_port(tunnel.port)
+
+    @staticmethod
+    def _report(tunnel: Tunnel, message: str):
+        print(f"Tunnel on port {tunnel.port} {message}")
+        get_tunnel_log().append(f"ERROR: {tunnel.name} {message}", tunnel.port, "supervisor")
+
+    def _save(self):
+        """
+        Mirrors the running tunnels to the pidfile. Called with the lock held, also from the background event loop
+        when a tunnel is launched, so the write is not flushed to disk: the pidfile only has to outlive a crash of
+        ProxyPal, and after a crash of the machine there are no tunnels left to reap.
+        """
+        entries = self.orphans + [{"pid": tunnel.pid, "port": tunnel.port, "name": tunnel.name}
+                                  for tunnel in self.tunnels if tunnel.pid is not None]
+        try:
+            if entries:
+                self.pid_file.parent.mkdir(parents=True, exist_ok=True)
+                storage.write_atomic(self.pid_file, json.dumps(entries), durable=False)
+            elif self.pid_file.exists():
+                self.pid_file.unlink()
+        except OSError as e:
+            print(f"Error saving tunnel pidfile: {e}")
+
+    def reap_orphans(self):
+        """
+        Stops tunnels left running by a previous ProxyPal that did not shut down cleanly.
+
+        Only PIDs from the pidfile are considered, and only while they still belong to the recorded executable
+        listening on the recorded port, so a reused PID is never signalled. The work runs on a background thread.
+        """
+        try:
+            with open(self.pid_file) as f:
+                orphans = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self._lock:
+            self.orphans = orphans
+        threading.Thread(target=self._reap, args=(orphans,), name="TunnelReaper", daemon=True).start()
+
+    def _reap(self, orphans: list):
+        import psutil
+        for entry in orphans:
+            try:
+                process = psutil.Process(entry["pid"])
+                if entry["name"] in process.name() and str(entry["port"]) in process.cmdline():
+                    process.terminate()
+                    try:
+                        process.wait(timeout=STOP_GRACE)
+                    except psutil.TimeoutExpired:
+                        process.kill()
+                    print(f"Stopped leftover {entry['name']} process {entry['pid']} on port {entry['port']}")
+            except (psutil.NoSuchProcess, psutil.AccessDenied, KeyError, TypeError):
+                pass
+        with self._lock:
+            self.orphans = []
+            self._save()
+
+
+_supervisor = None
+
+
+def get_supervisor() -> TunnelSupervisor:
+    """Returns the application's tunnel supervisor, created on first use."""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = TunnelSupervisor()
+    return _supervisor
@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+from itertools import islice
+
+LOG_CAPACITY = 5000
+RECENT_LINES = 20
+
+# ss-local prefixes its lines with an optional timestamp and a level, e.g. " 2024-05-01 10:00:00 INFO: ...".
+LINE_PATTERN = re.compile(r'^\s*(?:\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\s+)?(?P<level>[A-Z]+):\s*(?P<message>.*)$')
+
+# Known ss-local messages, checked in order; the first match names the event and supplies its fields.
+EVENT_PATTERNS = (
+    ("listening", re.compile(r'listening at (?P<address>\S+)')),
+    ("cipher", re.compile(r'initializing ciphers\.*\s*(?P<method>\S+)')),
+    ("connect", re.compile(r'^connect to (?P<target>\S+)')),
+    ("bad_key", re.compile(r'invalid password or cipher|authentication error|failed to decrypt', re.I)),
+    ("port_in_use", re.compile(r'Address already in use')),
+    ("resolve_failed", re.compile(r'getaddrinfo|failed to resolve|unable to resolve', re.I)),
+    ("connection_reset", re.compile(r'Connection reset by peer')),
+    ("connection_refused", re.compile(r'Connection refused')),
+    ("timeout", re.compile(r'timed out|timeout', re.I)),
+    ("exited", re.compile(r'exited with code (?P<code>-?\d+)')),
+)
+
+ERROR_LEVELS = ("ERROR", "FATAL")
+
+
+def parse_line(line: str) -> dict:
+    """
+    Splits one line of ss-local output into its level, message and, for messages ProxyPal knows, an event.
+
+    Returns:
+        {"level": "INFO"/"ERROR"/... or None, "message": text, "event": kind or None, plus the event's fields}
+    """
+    match = LINE_PATTERN.match(line)
+    level, message = (match['level'], match['message']) if match else (None, line.strip())
+    entry = {"level": level, "message": message, "event": None}
+    for kind, pattern in EVENT_PATTERNS:
+        event = pattern.search(message)
+        if event:
+            entry["event"] = kind
+            entry.update(event.groupdict())
+            break
+    return entry
+
+
+class LogBuffer:
+    """
+    A thread-safe ring buffer of parsed tunnel output, shared by every tunnel.
+
+    Holds at most `capacity` entries, dropping the oldest, so memory stays the same however long tunnels run.
+    Each entry carries a sequence number, so readers can poll for what arrived since their last read.
+    """
+
+    def __init__(self, capacity: int = LOG_CAPACITY):
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.last_seq = 0
+        self._event_counts = Counter()
+
+    def append(self, line: str, port: int = None, source: str = "ss-local", stream: str = "stderr") -> dict:
+        """Parses a line of output and stores it with a timestamp. Returns the new entry."""
+        entry = parse_line(line)
+        entry.update(time=time.time(), port=port, source=source, stream=stream)
+        with self._lock:
+            self.last_seq += 1
+            entry["seq"] = self.last_seq
+            self._entries.append(entry)
+            if entry["event"]:
+                self._event_counts[entry["event"]] += 1
+        return entry
+
+    def entries(self, since: int = 0, port: int = None, event: str = None, errors_only: bool = False) -> list:
+        """
+        Returns the buffered entries, oldest first.
+
+        Args:
+            since: Only return entries with a higher sequence number, i.e. those after an earlier read.
+            port: Only return output from the tunnel on this local port.
+            event: Only return entries for this kind of event, e.g. "bad_key".
+            errors_only: Only return entries logged at an error level.
+        """
+        with self._lock:
+            # Sequence numbers are contiguous, so the new entries are the last (last_seq - since) ones.
+            skip = max(0, len(self._entries) - (self.last_seq - since))
+            selected = list(islice(self._entries, skip, None))
+        return [entry for entry in selected
+                if (port is None or entry["port"] == port) and (event is None or entry["event"] == event)
+                and (not errors_only or entry["level"] in ERROR_LEVELS)]
+
+    def event_counts(self) -> dict:
+        """Returns how often each kind of event has been seen since the buffer was last cleared."""
+        with self._lock:
+            return dict(self._event_counts)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._event_counts.clear()
+
+
+class OutputWatcher:
+    """
+    Drains a tunnel process's stdout and stderr on background threads for as long as it runs, so a full pipe can
+    never stall it. Lines go to the shared LogBuffer; the last few are also kept here for error messages, and
+    waiters are woken on every new line.
+    """
+
+    def __init__(self, process, port: int = None, source: str = "ss-local", log: LogBuffer = None):
+        self.port = port
+        self.source = source
+        self.log = log or get_tunnel_log()
+        self.recent = deque(maxlen=RECENT_LINES)
+        self.activity = threading.Event()
+        self.listening = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._drain, args=(stream, name), daemon=True)
+                         for stream, name in ((process.stdout, "stdout"), (process.stderr, "stderr"))
+                         if stream is not None]
+        for thread in self._threads:
+            thread.start()
+
+    def _drain(self, stream, name: str):
+        for line in iter(stream.readline, ''):
+            entry = self.log.append(line, self.port, self.source, name)
+            with self._lock:
+                self.recent.append(line.rstrip())
+            if entry["event"] == "listening":
+                self.listening.set()
+            self.activity.set()
+        self.activity.set()
+
+    def join(self, timeout: float):
+        """Waits briefly for the reader threads so the final lines of a dead process are collected."""
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def text(self) -> str:
+        with self._lock:
+            return "\n".join(self.recent)
+
+
+_tunnel_log = None
+_tunnel_log_lock = threading.Lock()
+
+
+def get_tunnel_log() -> LogBuffer:
+    """Returns the process-wide buffer that every tunnel's output is captured into."""
+    global _tunnel_log
+    with _tunnel_log_lock:
+        if _tunnel_log is None:
+            _tunnel_log = LogBuffer()
+        return _tunnel_log
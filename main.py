@@ -1,21 +1,31 @@
+from utils import startup
+import json
+import multiprocessing
 import sys
-import subprocess
 from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QEvent
+from PyQt6.QtGui import QPalette
+from PyQt6.QtCore import Qt, QEvent
+startup.mark("import PyQt6")
 
 from ui.main_window import ProxyPalWindow
 from ui.theme import LIGHT_THEME, DARK_THEME
 from ui.styles import get_stylesheet
+from ui.icons import clear_icon_cache
+startup.mark("import ui")
 
+PROFILE_STARTUP_FLAG = "--profile-startup"
 
-def is_dark_mode_macos() -> bool:
-    """Checks if macOS is in dark mode using a shell command."""
-    try:
-        cmd = 'defaults read -g AppleInterfaceStyle'
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        return p.communicate()[0].decode('utf-8').strip() == 'Dark'
-    except Exception:
-        return False
+
+def is_dark_mode(app: QApplication) -> bool:
+    """
+    Checks if the system is in dark mode through Qt's style hints, without starting a process.
+
+    Falls back to the lightness of the system palette when the platform does not report a color scheme.
+    """
+    scheme = app.styleHints().colorScheme()
+    if scheme != Qt.ColorScheme.Unknown:
+        return scheme == Qt.ColorScheme.Dark
+    return app.palette().color(QPalette.ColorRole.Window).lightness() < 128
 
 
 class ThemedApplication(QApplication):
@@ -26,7 +36,9 @@ class ThemedApplication(QApplication):
     def __init__(self, argv):
         super().__init__(argv)
         self.main_window = None
+        self.theme = None
         self.apply_theme()
+        self.styleHints().colorSchemeChanged.connect(self.apply_theme)
 
     def event(self, e: QEvent) -> bool:
         """
@@ -40,27 +52,56 @@ class ThemedApplication(QApplication):
 
         return super().event(e)
 
-    def apply_theme(self):
-        """Detects the current system theme and applies the corresponding stylesheet."""
-        theme = DARK_THEME if is_dark_mode_macos() else LIGHT_THEME
+    def apply_theme(self, *args):
+        """
+        Detects the current system theme and applies the corresponding stylesheet.
+
+        Palette change events also arrive when nothing visible changed, so widgets are only re-polished when the
+        theme is different from the applied one.
+        """
+        theme = DARK_THEME if is_dark_mode(self) else LIGHT_THEME
+        if theme is self.theme:
+            return
+        self.theme = theme
         stylesheet = get_stylesheet(theme)
         self.setStyleSheet(stylesheet)
         self.setProperty("connectedColor", theme["PIE_CONNECTED"])
         self.setProperty("disconnectedColor", theme["PIE_DISCONNECTED"])
+        clear_icon_cache()
+        if self.main_window:
+            self.main_window.refresh_icons()
+
+
+def print_startup_profile():
+    """Prints the startup phases as one line of JSON and quits. Used by --profile-startup."""
+    print(json.dumps(startup.report()), flush=True)
+    QApplication.instance().quit()
 
 
 def main():
-    """The main entry point for the ProxyPal application."""
-    app = ThemedApplication(sys.argv)
+    """
+    The main entry point for the ProxyPal application.
+
+    With --profile-startup, the time spent in each startup phase is printed as JSON once the window is
+    interactive, and the application quits.
+    """
+    profile = PROFILE_STARTUP_FLAG in sys.argv
+    app = ThemedApplication([arg for arg in sys.argv if arg != PROFILE_STARTUP_FLAG])
+    startup.mark("application")
 
     app.setQuitOnLastWindowClosed(False)
 
     window = ProxyPalWindow()
+    startup.mark("window")
 
     app.main_window = window
+    if profile:
+        window.startup_finished.connect(print_startup_profile)
 
     sys.exit(app.exec())
 
 
 if __name__ == '__main__':
+    # The importer validates keys in worker processes; frozen builds must start those instead of another window.
+    multiprocessing.freeze_support()
     main()
@@ -2,12 +2,24 @@
 
 #==============================================================================
 # Proxy Manager: A script to control the system SOCKS proxy and launch a GUI.
+#
+# "start" sends all traffic through the SOCKS port; "pac" points the system at
+# ProxyPal's PAC file instead, which splits traffic by the rules in
+# ~/Library/Application Support/ProxyPal/rules and always names the port the
+# tunnel is actually on. Both take an optional port (see Copy PAC URL); pass
+# the routing relay's port to "start" (1081, see Copy Routing Proxy Address)
+# to apply the same rules, block lists included, to every connection. "http"
+# sets ProxyPal's HTTP proxy front-end as the web and secure web proxy instead,
+# for software that ignores the SOCKS setting.
 #==============================================================================
 
 # --- Configuration ---
 readonly NETWORK_SERVICE="Wi-Fi"
 readonly PROXY_HOST="127.0.0.1"
-readonly PROXY_PORT="1080"
+readonly PROXY_PORT="${2:-1080}"
+readonly PAC_PORT="${2:-1090}"
+readonly HTTP_PROXY_PORT="${2:-1087}"
+readonly PAC_URL="http://$PROXY_HOST:$PAC_PORT/proxy.pac"
 readonly PYTHON_APP_COMMAND="python3 main.py"
 
 # --- Functions ---
@@ -22,9 +34,34 @@ start_proxy() {
     fi
 }
 
+start_pac() {
+    echo "🔄 Enabling automatic proxy configuration for '$NETWORK_SERVICE' from $PAC_URL..."
+    sudo networksetup -setautoproxyurl "$NETWORK_SERVICE" "$PAC_URL"
+    sudo networksetup -setautoproxystate "$NETWORK_SERVICE" on
+    if [ $? -eq 0 ]; then
+        echo "✅ Split tunneling CONNECTED."
+    else
+        echo "❌ Error: Failed to enable the PAC file." >&2; exit 1
+    fi
+}
+
+start_http() {
+    echo "🔄 Enabling HTTP and HTTPS proxy for '$NETWORK_SERVICE'..."
+    sudo networksetup -setwebproxy "$NETWORK_SERVICE" "$PROXY_HOST" "$HTTP_PROXY_PORT"
+    sudo networksetup -setsecurewebproxy "$NETWORK_SERVICE" "$PROXY_HOST" "$HTTP_PROXY_PORT"
+    if [ $? -eq 0 ]; then
+        echo "✅ HTTP proxy CONNECTED."
+    else
+        echo "❌ Error: Failed to enable the HTTP proxy." >&2; exit 1
+    fi
+}
+
 stop_proxy() {
     echo "🔄 Disabling system proxy for '$NETWORK_SERVICE'..."
     sudo networksetup -setsocksfirewallproxystate "$NETWORK_SERVICE" off
+    sudo networksetup -setautoproxystate "$NETWORK_SERVICE" off
+    sudo networksetup -setwebproxystate "$NETWORK_SERVICE" off
+    sudo networksetup -setsecurewebproxystate "$NETWORK_SERVICE" off
     echo "🔌 Proxy DISCONNECTED."
 }
 
@@ -37,7 +74,17 @@ case "$1" in
         echo "🚀 Launching Python GUI..."
         exec $PYTHON_APP_COMMAND
         ;;
+    pac)
+        start_pac
+        echo "🚀 Launching Python GUI..."
+        exec $PYTHON_APP_COMMAND
+        ;;
+    http)
+        start_http
+        echo "🚀 Launching Python GUI..."
+        exec $PYTHON_APP_COMMAND
+        ;;
     *)
-        echo "Usage: $0 start"; exit 1
+        echo "Usage: $0 start [SOCKS_PORT] | pac [PAC_PORT] | http [HTTP_PORT]"; exit 1
         ;;
 esac
\ No newline at end of file
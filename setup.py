@@ -2,8 +2,11 @@ from setuptools import setup
 
 APP = ["main.py"]
 DATA_FILES = []
+# Startup target: first paint within 1 s of launch, measured with
+#   python -m benchmarks.bench_startup --command dist/ProxyPal.app/Contents/MacOS/ProxyPal
+# argv_emulation is off because it waits for Apple Events before main.py runs, and ProxyPal opens no documents.
 OPTIONS = {
-    "argv_emulation": True,
+    "argv_emulation": False,
     "plist": {
         "LSMinimumSystemVersion": "12.0",
         "NSNetworkUsageDescription": "This app requires network access to connect to a proxy server.",
@@ -11,6 +14,7 @@ OPTIONS = {
         "com.apple.security.network.client": True
     },
     "packages": ["PyQt6"],
+    "excludes": ["tkinter"],
     "iconfile": None
 }
 
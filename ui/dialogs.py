@@ -1,4 +1,10 @@
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QMessageBox
+import time
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTextEdit, QMessageBox,
+                             QListWidget, QListWidgetItem, QComboBox, QFileDialog, QLineEdit, QPlainTextEdit)
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFont
+
+from core.tunnel_log import get_tunnel_log
 
 
 class AddServerDialog(QDialog):
@@ -70,3 +76,303 @@ class FeedbackDialog(QMessageBox):
 
     def get_feedback(self):
         return self.text_edit.toPlainText().strip()
+
+
+class BalanceDialog(QDialog):
+    """Dialog for choosing the servers and policy used by the local load balancer."""
+
+    def __init__(self, server_configs, policies, parent=None):
+        super().__init__(parent)
+        self.setObjectName("BalanceDialog")
+        self.setFixedSize(450, 420)
+        self.setWindowTitle("Load Balance")
+        self.server_configs = server_configs
+        self.policies = policies
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 25, 25, 25)
+        layout.setSpacing(15)
+
+        title = QLabel("Load balance across servers")
+        title.setStyleSheet("font-size: 22px; font-weight: 500;")
+        subtitle = QLabel("Connections are spread over one tunnel per selected server.")
+
+        self.server_list = QListWidget()
+        for config in self.server_configs:
+            item = QListWidgetItem(config.get("name", config.get("server")))
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked)
+            item.setData(Qt.ItemDataRole.UserRole, config)
+            self.server_list.addItem(item)
+
+        self.policy_combo = QComboBox()
+        self.policy_combo.addItems(self.policies)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        cancel_button = QPushButton("CANCEL")
+        confirm_button = QPushButton("START")
+        confirm_button.setObjectName("ConfirmButton")
+        button_layout.addWidget(cancel_button)
+        button_layout.addWidget(confirm_button)
+
+        layout.addWidget(title)
+        layout.addWidget(subtitle)
+        layout.addWidget(self.server_list, 1)
+        layout.addWidget(self.policy_combo)
+        layout.addLayout(button_layout)
+
+        cancel_button.clicked.connect(self.reject)
+        confirm_button.clicked.connect(self.accept)
+
+    def get_selected_configs(self):
+        return [self.server_list.item(i).data(Qt.ItemDataRole.UserRole) for i in range(self.server_list.count())
+                if self.server_list.item(i).checkState() == Qt.CheckState.Checked]
+
+    def get_policy(self):
+        return self.policy_combo.currentText()
+
+
+class ImportDialog(QDialog):
+    """Dialog for importing many access keys at once, pasted or from a file."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("ImportDialog")
+        self.setFixedSize(450, 380)
+        self.setWindowTitle("Import Servers")
+        self.file_path = None
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 25, 25, 25)
+        layout.setSpacing(15)
+
+        title = QLabel("Import servers")
+        title.setStyleSheet("font-size: 22px; font-weight: 500;")
+        subtitle = QLabel("Paste ss:// keys, a base64 subscription or SIP008 JSON, or choose a file.")
+        subtitle.setWordWrap(True)
+
+        self.text_input = QTextEdit()
+        self.text_input.setAcceptRichText(False)
+        self.text_input.setPlaceholderText("ss://...\nss://...")
+
+        button_layout = QHBoxLayout()
+        file_button = QPushButton("CHOOSE FILE...")
+        button_layout.addWidget(file_button)
+        button_layout.addStretch()
+        cancel_button = QPushButton("CANCEL")
+        confirm_button = QPushButton("IMPORT")
+        confirm_button.setObjectName("ConfirmButton")
+        button_layout.addWidget(cancel_button)
+        button_layout.addWidget(confirm_button)
+
+        layout.addWidget(title)
+        layout.addWidget(subtitle)
+        layout.addWidget(self.text_input, 1)
+        layout.addLayout(button_layout)
+
+        file_button.clicked.connect(self.choose_file)
+        cancel_button.clicked.connect(self.reject)
+        confirm_button.clicked.connect(self.accept)
+
+    def choose_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Servers", "", "Key lists (*.txt *.json *.conf);;All files (*)")
+        if path:
+            self.file_path = path
+            self.accept()
+
+    def get_file_path(self):
+        return self.file_path
+
+    def get_text(self):
+        return self.text_input.toPlainText()
+
+
+class SubscriptionDialog(QDialog):
+    """Dialog for managing subscription URLs that keep the server list up to date."""
+
+    def __init__(self, subscription_manager, parent=None):
+        super().__init__(parent)
+        self.setObjectName("SubscriptionDialog")
+        self.setFixedSize(500, 420)
+        self.setWindowTitle("Subscriptions")
+        self.manager = subscription_manager
+        self.init_ui()
+        self.refresh()
+        self.manager.sync_finished.connect(self.refresh)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 25, 25, 25)
+        layout.setSpacing(15)
+
+        title = QLabel("Subscriptions")
+        title.setStyleSheet("font-size: 22px; font-weight: 500;")
+        subtitle = QLabel("Servers from these URLs (SIP008 JSON or ss:// lists) are refreshed automatically.")
+        subtitle.setWordWrap(True)
+
+        self.subscription_list = QListWidget()
+
+        add_layout = QHBoxLayout()
+        self.url_input = QLineEdit()
+        self.url_input.setPlaceholderText("https://...")
+        add_button = QPushButton("ADD")
+        add_button.setObjectName("ConfirmButton")
+        add_layout.addWidget(self.url_input, 1)
+        add_layout.addWidget(add_button)
+
+        button_layout = QHBoxLayout()
+        remove_button = QPushButton("REMOVE")
+        self.sync_button = QPushButton("SYNC NOW")
+        close_button = QPushButton("CLOSE")
+        button_layout.addWidget(remove_button)
+        button_layout.addWidget(self.sync_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+
+        layout.addWidget(title)
+        layout.addWidget(subtitle)
+        layout.addWidget(self.subscription_list, 1)
+        layout.addLayout(add_layout)
+        layout.addLayout(button_layout)
+
+        add_button.clicked.connect(self.add_subscription)
+        self.url_input.returnPressed.connect(self.add_subscription)
+        remove_button.clicked.connect(self.remove_subscription)
+        self.sync_button.clicked.connect(self.sync_now)
+        close_button.clicked.connect(self.accept)
+
+    @staticmethod
+    def describe(subscription: dict) -> str:
+        if not subscription.get('last_sync'):
+            status = "Not synced yet"
+        elif subscription.get('last_error'):
+            status = f"Failed: {subscription['last_error']}"
+        else:
+            status = time.strftime("Updated %Y-%m-%d %H:%M", time.localtime(subscription['last_sync']))
+        return f"{subscription['url']}\n{status}"
+
+    def refresh(self):
+        self.subscription_list.clear()
+        for subscription in self.manager.subscriptions:
+            item = QListWidgetItem(self.describe(subscription))
+            item.setData(Qt.ItemDataRole.UserRole, subscription['url'])
+            self.subscription_list.addItem(item)
+        self.sync_button.setEnabled(not self.manager.is_syncing())
+
+    def add_subscription(self):
+        url = self.url_input.text().strip()
+        if not url.startswith(("http://", "https://")):
+            return
+        self.url_input.clear()
+        self.manager.add(url)
+        self.refresh()
+
+    def remove_subscription(self):
+        item = self.subscription_list.currentItem()
+        if item:
+            self.manager.remove(item.data(Qt.ItemDataRole.UserRole))
+            self.refresh()
+
+    def sync_now(self):
+        self.manager.sync_now()
+        self.refresh()
+
+
+class LogDialog(QDialog):
+    """Non-modal window showing the captured tunnel output, polled from the shared log buffer while open."""
+    FILTERS = ("All Output", "Errors", "Events")
+    POLL_INTERVAL = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("LogDialog")
+        self.resize(640, 420)
+        self.setWindowTitle("Tunnel Log")
+        self.log = get_tunnel_log()
+        self.last_seq = 0
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(self.POLL_INTERVAL)
+        self.poll_timer.timeout.connect(self.append_new_entries)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 25, 25, 25)
+        layout.setSpacing(15)
+
+        title_layout = QHBoxLayout()
+        title = QLabel("Tunnel Log")
+        title.setStyleSheet("font-size: 22px; font-weight: 500;")
+        self.filter_combo = QComboBox()
+        self.filter_combo.addItems(self.FILTERS)
+        title_layout.addWidget(title, 1)
+        title_layout.addWidget(self.filter_combo)
+
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setMaximumBlockCount(self.log.capacity)
+        self.output.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.output.setFont(QFont("Menlo", 11))
+        self.summary_label = QLabel()
+
+        button_layout = QHBoxLayout()
+        clear_button = QPushButton("CLEAR")
+        close_button = QPushButton("CLOSE")
+        button_layout.addWidget(clear_button)
+        button_layout.addStretch()
+        button_layout.addWidget(close_button)
+
+        layout.addLayout(title_layout)
+        layout.addWidget(self.output, 1)
+        layout.addWidget(self.summary_label)
+        layout.addLayout(button_layout)
+
+        self.filter_combo.currentIndexChanged.connect(self.reload)
+        clear_button.clicked.connect(self.clear)
+        close_button.clicked.connect(self.close)
+
+    @staticmethod
+    def format_entry(entry: dict) -> str:
+        stamp = time.strftime("%H:%M:%S", time.localtime(entry["time"]))
+        level = f"{entry['level']}: " if entry["level"] else ""
+        return f"{stamp}  {entry['source']}:{entry['port']}  {level}{entry['message']}"
+
+    def matches(self, entry: dict) -> bool:
+        index = self.filter_combo.currentIndex()
+        if index == 1:
+            return entry["level"] in ("ERROR", "FATAL")
+        return index == 0 or entry["event"] is not None
+
+    def append_new_entries(self):
+        entries = self.log.entries(since=self.last_seq)
+        if entries:
+            self.last_seq = entries[-1]["seq"]
+            lines = [self.format_entry(entry) for entry in entries if self.matches(entry)]
+            if lines:
+                self.output.appendPlainText("\n".join(lines))
+        counts = ", ".join(f"{kind} {count}" for kind, count in
+                           sorted(self.log.event_counts().items(), key=lambda item: -item[1])[:4])
+        self.summary_label.setText(f"Events: {counts}" if counts else "No events yet.")
+
+    def reload(self):
+        self.output.clear()
+        self.last_seq = 0
+        self.append_new_entries()
+
+    def clear(self):
+        self.log.clear()
+        self.reload()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.reload()
+        self.poll_timer.start()
+
+    def hideEvent(self, event):
+        self.poll_timer.stop()
+        super().hideEvent(event)
@@ -1,51 +1,118 @@
-from PyQt6.QtGui import QIcon, QPixmap, QPainter, QColor
+from collections import OrderedDict
+from PyQt6.QtGui import QIcon, QPixmap, QPainter, QColor, QGuiApplication
 from PyQt6.QtSvg import QSvgRenderer
 from PyQt6.QtCore import QSize
 
+STYLE_FILLED = "filled"
+STYLE_OUTLINED = "outlined"
+# Pixmaps are kept for the most recently used (path, color, size, device pixel ratio, style) combinations.
+ICON_CACHE_SIZE = 128
 
-def create_icon(svg_data: str, size: int = 24):
+_pixmap_cache = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0}
+
+
+def device_pixel_ratio() -> float:
+    """The highest device pixel ratio of the connected screens, so icons stay sharp on any of them."""
+    app = QGuiApplication.instance()
+    return app.devicePixelRatio() if app else 1.0
+
+
+def render_pixmap(svg_data: str, size: int = 24, dpr: float = 1.0) -> QPixmap:
     renderer = QSvgRenderer(svg_data.encode('utf-8'))
-    pixmap = QPixmap(QSize(size, size))
+    pixmap = QPixmap(QSize(round(size * dpr), round(size * dpr)))
     pixmap.fill(QColor("transparent"))
     painter = QPainter(pixmap)
     renderer.render(painter)
     painter.end()
-    return QIcon(pixmap)
+    pixmap.setDevicePixelRatio(dpr)
+    return pixmap
+
+
+def create_icon(svg_data: str, size: int = 24):
+    return QIcon(render_pixmap(svg_data, size, device_pixel_ratio()))
+
+
+def _svg_data(svg_path: str, color: str, size: int, style: str) -> str:
+    if style == STYLE_OUTLINED:
+        stroke_width = 2.0
+        return f"""
+    <svg width="{size}" height="{size}" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
+      <path d='{svg_path}' fill='none' stroke='{color}' stroke-width='{stroke_width}' stroke-linecap='round' stroke-linejoin='round'/>
+    </svg>
+    """
+    return f"""
+    <svg width="{size}" height="{size}" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
+      <path d='{svg_path}' fill='{color}'/>
+    </svg>
+    """
+
+
+def cached_pixmap(svg_path: str, color: str, size: int, style: str, dpr: float = None) -> QPixmap:
+    """
+    Returns the rendered icon pixmap, rendering it only if it is not in the cache.
+
+    The least recently used pixmap is evicted once the cache holds ICON_CACHE_SIZE of them.
+    """
+    dpr = dpr or device_pixel_ratio()
+    key = (svg_path, color, size, dpr, style)
+    pixmap = _pixmap_cache.get(key)
+    if pixmap is not None:
+        _pixmap_cache.move_to_end(key)
+        _cache_stats["hits"] += 1
+        return pixmap
+    _cache_stats["misses"] += 1
+    pixmap = render_pixmap(_svg_data(svg_path, color, size, style), size, dpr)
+    _pixmap_cache[key] = pixmap
+    if len(_pixmap_cache) > ICON_CACHE_SIZE:
+        _pixmap_cache.popitem(last=False)
+    return pixmap
+
+
+def clear_icon_cache():
+    """Drops every cached pixmap, e.g. after the theme changed."""
+    _pixmap_cache.clear()
+
+
+def icon_cache_info() -> dict:
+    return {"size": len(_pixmap_cache), "max_size": ICON_CACHE_SIZE, **_cache_stats}
 
 
 def create_filled_icon(svg_path: str, color: str, size: int = 24) -> QIcon:
     """
-    Creates a standard, solid-filled QIcon from an SVG path.
+    Creates a standard, solid-filled QIcon from an SVG path. The pixmap is cached.
 
     Args:
         svg_path: The SVG path data.
         color: The color for the icon's fill.
         size: The desired width and height of the icon.
     """
-    svg_data = f"""
-    <svg width="{size}" height="{size}" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
-      <path d='{svg_path}' fill='{color}'/>
-    </svg>
-    """
-    return create_icon(svg_data, size)
+    return QIcon(cached_pixmap(svg_path, color, size, STYLE_FILLED))
 
 
 def create_outlined_icon(svg_path: str, color: str, size: int = 24) -> QIcon:
     """
-    Creates a bold, outlined QIcon from an SVG path using a thick stroke.
+    Creates a bold, outlined QIcon from an SVG path using a thick stroke. The pixmap is cached.
 
     Args:
         svg_path: The SVG path data.
         color: The color for the icon's outline.
         size: The desired width and height of the icon.
     """
-    stroke_width = 2.0
-    svg_data = f"""
-    <svg width="{size}" height="{size}" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">
-      <path d='{svg_path}' fill='none' stroke='{color}' stroke-width='{stroke_width}' stroke-linecap='round' stroke-linejoin='round'/>
-    </svg>
+    return QIcon(cached_pixmap(svg_path, color, size, STYLE_OUTLINED))
+
+
+def create_tray_icons(size: int = 48) -> dict:
+    """
+    Renders the menu bar icon for both connection states, keyed by connected.
+
+    The icons are masks, which macOS tints to suit the menu bar, so they are drawn in black.
     """
-    return create_icon(svg_data, size)
+    icons = {True: create_filled_icon(TRAY_ICON_CONNECTED, "#000000", size),
+             False: create_outlined_icon(TRAY_ICON_DISCONNECTED, "#000000", size)}
+    for icon in icons.values():
+        icon.setIsMask(True)
+    return icons
 
 
 # Icon paths
@@ -1,42 +1,96 @@
 import platform
-import requests
-from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QMessageBox, QApplication, QSystemTrayIcon, QMenu,
-                             QScrollArea, QSpacerItem)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QAction
-
-from .dialogs import AddServerDialog, FeedbackDialog
-from .server_widget import ServerWidget
+from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QMessageBox, QApplication,
+                             QSystemTrayIcon, QMenu, QProgressDialog, QLineEdit, QComboBox, QListView, QInputDialog)
+from PyQt6.QtCore import Qt, QTimer, QEvent, QUrl, pyqtSignal
+from PyQt6.QtGui import QAction, QDesktopServices
+
+from .dialogs import AddServerDialog, FeedbackDialog, BalanceDialog, ImportDialog, SubscriptionDialog, LogDialog
+from .server_widget import ServerWidget, format_stats, STATE_CONNECTED, STATE_CONNECTING, STATE_DISCONNECTED
+from .server_list import ServerListModel, ServerFilterModel, ServerDelegate, SORT_KEYS, ID_ROLE
 from .onboarding_widget import OnboardingWidget
-from .icons import (create_filled_icon, create_outlined_icon, FEEDBACK_ICON_PATH,
-                    CONTACT_ICON_PATH, ADD_ICON_PATH, APP_ICON_PATH, TRAY_ICON_CONNECTED, TRAY_ICON_DISCONNECTED)
+from .icons import (create_filled_icon, create_tray_icons, FEEDBACK_ICON_PATH, CONTACT_ICON_PATH, ADD_ICON_PATH,
+                    APP_ICON_PATH)
 from core.parser import parse_access_key
-from core.connection import ConnectionManager
-from core.storage import load_servers, add_server as save_new_server, delete_server as remove_server, save_servers
+from core.storage import get_registry
+from utils import startup
 
 
 class ProxyPalWindow(QMainWindow):
-    """The main application window, with all features and fixes."""
+    """
+    The main application window, with all features and fixes.
+
+    Servers are listed in a QListView over ServerListModel, so only the visible rows are painted; a single
+    ServerWidget card above the list shows the selected or connected server.
+
+    Startup happens in two phases: the window and its menus are built and painted first, then finish_startup()
+    loads the servers, creates the tray icon and imports the tunnel modules (and asyncio with them).
+    startup_finished is emitted once the window is fully interactive.
+    """
+    startup_finished = pyqtSignal()
 
     def __init__(self):
         super().__init__()
         self.setObjectName("MainWindow")
         self.setWindowTitle("ProxyPal")
         self.setMinimumSize(450, 650)
-        self.resize(450, 650)
+        self.resize(450, 760)
 
         self.setWindowIcon(create_filled_icon(APP_ICON_PATH, "#263238", size=128))
 
-        self.server_widgets = []
-        self.connection_manager = ConnectionManager()
+        self.server_model = ServerListModel(self)
+        self.card_server_id = None
+        self.connection_manager = None
+        self.health_monitor = None
+        self.subscription_manager = None
+        self.tray_icon = None
+        self.startup_scheduled = False
         self.active_connection_id = None
+        self.probe_worker = None
+        self.import_worker = None
+        self.import_progress = None
+        self.log_dialog = None
+        self.ranked_server_ids = []
+        self.unhealthy_server_ids = set()
+        self.failover_tried_ids = set()
+        self.balanced_server_ids = set()
+        self.connect_to_fastest_pending = False
+        self.usage_totals = None
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(1000)
+        self.stats_timer.timeout.connect(self.update_stats)
 
         self.init_ui()
-        self.create_tray_icon()
-        self.setup_initial_state()
-
         self.show()
 
+    def finish_startup(self):
+        """The second startup phase, run once the window has been painted."""
+        startup.mark("first paint")
+        from core.connection import ConnectionManager
+        from core.monitor import HealthMonitor
+        from core.subscription import SubscriptionManager
+        from core import ss_engine
+
+        self.connection_manager = ConnectionManager()
+        self.health_monitor = HealthMonitor(self)
+        self.health_monitor.failover_needed.connect(self.handle_failover)
+        self.engine_action.setEnabled(ss_engine.is_available())
+        for action in self.startup_actions:
+            action.setEnabled(True)
+        startup.mark("tunnel modules")
+        self.setup_initial_state()
+        startup.mark("servers")
+        self.create_tray_icon()
+        startup.mark("tray")
+        self.subscription_manager = SubscriptionManager(get_registry(), self)
+        self.subscription_manager.servers_changed.connect(self.apply_subscription_changes)
+        self.subscription_manager.start()
+        self.connection_manager.service_failed.connect(self.on_service_failed, Qt.ConnectionType.QueuedConnection)
+        self.connection_manager.start_enabled_services()
+        for name, action in self.service_actions.items():
+            action.setChecked(name in self.connection_manager.services)
+        startup.mark("interactive")
+        self.startup_finished.emit()
+
     def init_ui(self):
         self.create_menu_bar()
         central_widget = QWidget()
@@ -47,130 +101,442 @@ class ProxyPalWindow(QMainWindow):
         self.onboarding_widget.add_server_requested.connect(self.show_add_server_dialog)
         main_layout.addWidget(self.onboarding_widget)
         self.onboarding_widget.hide()
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        main_layout.addWidget(self.scroll_area)
-        self.scroll_area.hide()
-        self.scroll_content_widget = QWidget()
-        self.scroll_area.setWidget(self.scroll_content_widget)
-        self.card_container_layout = QVBoxLayout(self.scroll_content_widget)
-        self.card_container_layout.setSpacing(15)
-        self.card_container_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+
+        self.servers_panel = QWidget()
+        panel_layout = QVBoxLayout(self.servers_panel)
+        panel_layout.setContentsMargins(0, 0, 0, 0)
+        panel_layout.setSpacing(15)
+        panel_layout.addStretch(0)
+        self.server_card = ServerWidget({})
+        self.server_card.connect_request.connect(self.handle_connection_request)
+        self.server_card.delete_request.connect(self.handle_delete_server)
+        self.server_card.rename_request.connect(self.handle_rename_server)
+        panel_layout.addWidget(self.server_card, 0, Qt.AlignmentFlag.AlignHCenter)
+
+        self.search_bar = QWidget()
+        search_layout = QHBoxLayout(self.search_bar)
+        search_layout.setContentsMargins(0, 0, 0, 0)
+        self.search_edit = QLineEdit()
+        self.search_edit.setObjectName("ServerSearch")
+        self.search_edit.setPlaceholderText("Search by name or host")
+        self.search_edit.setClearButtonEnabled(True)
+        self.sort_combo = QComboBox()
+        self.sort_combo.setObjectName("ServerSort")
+        self.sort_combo.addItems(SORT_KEYS)
+        search_layout.addWidget(self.search_edit, 1)
+        search_layout.addWidget(self.sort_combo)
+        panel_layout.addWidget(self.search_bar)
+
+        self.server_filter = ServerFilterModel(self)
+        self.server_filter.setSourceModel(self.server_model)
+        # Filtering 10k servers takes tens of milliseconds, so it waits for a pause in typing.
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(lambda: self.server_filter.setFilterFixedString(self.search_edit.text()))
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.sort_combo.currentTextChanged.connect(self.server_model.set_sort_key)
+        self.server_list = QListView()
+        self.server_list.setObjectName("ServerList")
+        self.server_list.setModel(self.server_filter)
+        self.server_list.setItemDelegate(ServerDelegate(self.server_list))
+        self.server_list.setUniformItemSizes(True)
+        self.server_list.setMouseTracking(True)
+        self.server_list.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.server_list.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.server_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.server_list.customContextMenuRequested.connect(self.show_server_menu)
+        self.server_list.selectionModel().currentChanged.connect(
+            lambda current: self.show_card(current.data(ID_ROLE)) if current.isValid() else None)
+        self.server_list.activated.connect(self.toggle_server_at)
+        panel_layout.addWidget(self.server_list, 1)
+        panel_layout.addStretch(0)
+        main_layout.addWidget(self.servers_panel)
+        self.servers_panel.hide()
 
     def setup_initial_state(self):
-        self.clear_all_servers_from_ui()
-        all_servers = load_servers()
-        if not all_servers:
-            self.show_onboarding_screen()
-        else:
-            self.scroll_area.show()
-            self.onboarding_widget.hide()
-            for config in all_servers:
-                self._add_server_widget_to_ui(config)
-            self._update_layout()
-
-    def _add_server_widget_to_ui(self, config: dict):
-        server_widget = ServerWidget(config)
-        server_widget.connect_request.connect(self.handle_connection_request)
-        server_widget.delete_request.connect(self.handle_delete_server)
-        server_widget.rename_request.connect(self.handle_rename_server)
-        self.card_container_layout.addWidget(server_widget)
-        self.server_widgets.append(server_widget)
+        registry = get_registry()
+        all_servers = registry.all()
+        self.server_model.set_servers(all_servers, {config['id']: registry.get_metadata(config['id'])['latency_ms']
+                                                    for config in all_servers})
+        self._update_layout()
+        if all_servers:
+            self.show_card(all_servers[0]['id'])
+            from core.resolver import get_resolver
+            get_resolver().prefetch(config['server'] for config in all_servers)
 
     def _update_layout(self):
-        for i in reversed(range(self.card_container_layout.count())):
-            item = self.card_container_layout.itemAt(i)
-            if isinstance(item, QSpacerItem):
-                self.card_container_layout.removeItem(item)
-                break
-        if len(self.server_widgets) == 1:
-            self.card_container_layout.insertStretch(0, 1)
-            self.card_container_layout.addStretch(1)
-        else:
-            self.card_container_layout.addStretch(1)
+        """Shows the onboarding screen, a single centred card, or the card above the searchable list."""
+        count = self.server_model.rowCount()
+        if not count:
+            self.show_onboarding_screen()
+            return
+        self.onboarding_widget.hide()
+        self.servers_panel.show()
+        single = count == 1
+        self.search_bar.setVisible(not single)
+        self.server_list.setVisible(not single)
+        layout = self.servers_panel.layout()
+        layout.setStretch(0, int(single))
+        layout.setStretch(layout.count() - 1, int(single))
+
+    def _add_servers_to_ui(self, configs: list):
+        was_empty = not self.server_model.rowCount()
+        self.server_model.add_servers(configs)
+        self._update_layout()
+        if was_empty and configs:
+            self.show_card(configs[0]['id'])
+        from core.resolver import get_resolver
+        get_resolver().prefetch(config['server'] for config in configs)
+
+    def show_card(self, server_id):
+        """Shows a server on the card above the list."""
+        config = self.server_model.config(server_id)
+        if config is None:
+            return
+        self.card_server_id = server_id
+        self.server_card.show_server(config, self.server_model.state(server_id),
+                                     self.server_model.probe_result(server_id))
+
+    def select_server(self, server_id):
+        """Shows a server on the card and highlights its row, if the current filter shows it."""
+        self.show_card(server_id)
+        index = self.server_filter.mapFromSource(self.server_model.index_of(server_id))
+        if index.isValid():
+            self.server_list.setCurrentIndex(index)
+            self.server_list.scrollTo(index)
+
+    def set_server_state(self, server_id, state):
+        self.server_model.set_state(server_id, state)
+        if server_id is not None and server_id == self.card_server_id:
+            if state == STATE_CONNECTING:
+                self.server_card.set_is_connecting()
+            else:
+                self.server_card.set_connection_state(state == STATE_CONNECTED)
+
+    def toggle_server_at(self, index):
+        server_id = index.data(ID_ROLE)
+        config = self.server_model.config(server_id)
+        if config:
+            self.handle_connection_request(config, self.server_model.state(server_id) != STATE_CONNECTED)
+
+    def show_server_menu(self, position):
+        index = self.server_list.indexAt(position)
+        if not index.isValid():
+            return
+        server_id = index.data(ID_ROLE)
+        connected = self.server_model.state(server_id) == STATE_CONNECTED
+        menu = QMenu(self)
+        menu.addAction("Disconnect" if connected else "Connect").triggered.connect(
+            lambda: self.toggle_server_at(index))
+        menu.addAction("Rename").triggered.connect(lambda: self.prompt_rename_server(server_id))
+        menu.addAction("Forget").triggered.connect(lambda: self.handle_delete_server(server_id))
+        menu.exec(self.server_list.viewport().mapToGlobal(position))
+
+    def prompt_rename_server(self, server_id):
+        config = self.server_model.config(server_id)
+        if config is None:
+            return
+        new_name, ok = QInputDialog.getText(self, 'Rename Server', 'Enter new name:', text=config.get("name"))
+        if ok and new_name:
+            self.handle_rename_server(server_id, new_name)
 
     def add_server(self, key):
         try:
             config = parse_access_key(key)
-            if any(s['id'] == config['id'] for s in load_servers()):
+            if not get_registry().add(config):
                 self.show_message("Server Exists", "This server has already been added.", informative=True)
                 return
-            save_new_server(config)
-            if not self.server_widgets:
-                self.onboarding_widget.hide()
-                self.scroll_area.show()
-            self._add_server_widget_to_ui(config)
-            self._update_layout()
+            self._add_servers_to_ui([config])
         except Exception as e:
             self.show_message("Invalid Key", f"Could not parse access key.\n\n<i style='color:#78909C'>{e}</i>")
 
     def handle_delete_server(self, server_id):
-        widget_to_remove = next((w for w in self.server_widgets if w.server_config['id'] == server_id), None)
-        if widget_to_remove:
+        self._remove_servers_from_ui([server_id])
+        get_registry().remove(server_id)
+
+    def _remove_servers_from_ui(self, server_ids):
+        """Removes servers from the list, first closing any tunnel to them."""
+        removed = {server_id for server_id in server_ids if self.server_model.contains(server_id)}
+        if not removed:
+            return
+        for server_id in removed:
             if self.active_connection_id == server_id:
+                self.health_monitor.stop()
                 self.connection_manager.disconnect()
                 self.active_connection_id = None
                 self.update_global_ui_state()
-            widget_to_remove.deleteLater()
-            self.server_widgets.remove(widget_to_remove)
-            remove_server(server_id)
-            self._update_layout()
-        if not self.server_widgets:
-            self.show_onboarding_screen()
+            elif server_id in self.balanced_server_ids:
+                self.connection_manager.remove_balanced(server_id)
+                self.balanced_server_ids.discard(server_id)
+                self.update_global_ui_state()
+            else:
+                self.connection_manager.drop_standby(server_id)
+        self.ranked_server_ids = [i for i in self.ranked_server_ids if i not in removed]
+        self.server_model.remove_servers(removed)
+        if self.card_server_id in removed:
+            self.card_server_id = None
+            index = self.server_list.currentIndex()
+            ids = self.server_model.ids()
+            next_id = index.data(ID_ROLE) if index.isValid() else (ids[0] if ids else None)
+            self.show_card(next_id)
+        self._update_layout()
+
+    def apply_subscription_changes(self, diff):
+        """Updates only the rows of servers a subscription refresh added, removed or replaced."""
+        self._remove_servers_from_ui(diff['removed'])
+        for old_id, config in diff['replaced']:
+            if not self.server_model.replace_server(old_id, config):
+                continue
+            if self.active_connection_id == old_id:
+                self.active_connection_id = config['id']
+            if self.card_server_id == old_id:
+                self.card_server_id = config['id']
+                self.server_card.update_config(config)
+            self.ranked_server_ids = [config['id'] if i == old_id else i for i in self.ranked_server_ids]
+        if diff['added']:
+            self._add_servers_to_ui(diff['added'])
 
     def show_onboarding_screen(self):
-        self.scroll_area.hide()
+        self.servers_panel.hide()
         self.onboarding_widget.show()
 
     def handle_rename_server(self, server_id, new_name):
-        all_servers = load_servers()
-        for server in all_servers:
-            if server['id'] == server_id:
-                server['name'] = new_name
-                break
-        save_servers(all_servers)
-
-    def clear_all_servers_from_ui(self):
-        for widget in self.server_widgets:
-            widget.deleteLater()
-        self.server_widgets.clear()
+        get_registry().rename(server_id, new_name)
+        self.server_model.refresh(server_id)
+        if server_id == self.card_server_id:
+            self.server_card.update_config(self.server_model.config(server_id))
 
     def handle_connection_request(self, server_config, connect_flag):
-        self.connection_manager.disconnect()
+        """Connects to or disconnects from a server at the user's request, abandoning a failover in progress."""
+        self.cancel_failover()
         if connect_flag:
-            widget_to_connect = next((w for w in self.server_widgets if w.server_config['id'] == server_config['id']),
-                                     None)
-            if widget_to_connect:
-                widget_to_connect.set_is_connecting()
-            self.connection_manager.connect(server_config, self.on_connection_result)
+            self.connect_server(server_config)
         else:
+            self.health_monitor.stop()
+            self.connection_manager.disconnect()
+            self.clear_balanced_servers()
             self.on_connection_result(False, "Disconnected", 0, server_config['id'])
 
+    def connect_server(self, server_config):
+        # The active tunnel is torn down by connect(); stop checking it before its failures trigger a failover.
+        self.health_monitor.stop()
+        self.set_server_state(server_config['id'], STATE_CONNECTING)
+        self.clear_balanced_servers()
+        self.connection_manager.connect(server_config, self.on_connection_result)
+
+    def cancel_failover(self):
+        """Forgets a failover in progress, so the result of the user's own connect or disconnect ends it."""
+        self.health_monitor.cancel_failover()
+        self.failover_tried_ids.clear()
+
     def on_connection_result(self, success, message, port, server_id):
         if success:
             old_active_id = self.active_connection_id
             self.active_connection_id = server_id
             if old_active_id and old_active_id != server_id:
-                old_widget = next((w for w in self.server_widgets if w.server_config['id'] == old_active_id), None)
-                if old_widget:
-                    old_widget.set_connection_state(False)
-            new_widget = next((w for w in self.server_widgets if w.server_config['id'] == server_id), None)
-            if new_widget:
-                new_widget.set_connection_state(True)
+                self.set_server_state(old_active_id, STATE_DISCONNECTED)
+            self.set_server_state(server_id, STATE_CONNECTED)
+            if server_id != self.card_server_id:
+                self.select_server(server_id)
+            get_registry().record_connect(server_id)
+            self.health_monitor.start(server_id, port)
+            if self.health_monitor.is_failing_over():
+                self.health_monitor.complete_failover(True)
+                self.failover_tried_ids.clear()
+                config = self.server_model.config(server_id)
+                name = config.get('name') if config else server_id
+                self.tray_icon.showMessage("ProxyPal", f"Server stopped responding. Switched to {name}.")
+            self.prepare_standby()
         else:
             if self.active_connection_id == server_id:
                 self.active_connection_id = None
-            widget = next((w for w in self.server_widgets if w.server_config['id'] == server_id), None)
-            if widget:
-                widget.set_connection_state(False)
-            if "Connection Failed" in message or "refused" in message:
+                self.health_monitor.stop()
+            self.set_server_state(server_id, STATE_DISCONNECTED)
+            if self.health_monitor.is_failing_over():
+                self.handle_failover(server_id)
+            elif "Connection Failed" in message or "refused" in message:
                 self.show_message("Connection Failed", message)
             elif "Disconnected" not in message:
                 self.show_message("Connection Error", message)
         self.update_global_ui_state()
 
+    def probe_all_servers(self):
+        """Measures the latency of every saved server in the background."""
+        if self.probe_worker and self.probe_worker.isRunning():
+            return
+        configs = self.server_model.configs()
+        if not configs:
+            return
+        self.probe_action.setEnabled(False)
+        from core.prober import ProbeWorker
+        self.probe_worker = ProbeWorker(configs, self.connection_manager.engine)
+        self.probe_worker.result_ready.connect(self.on_probe_result)
+        self.probe_worker.finished.connect(self.on_probe_finished)
+        self.probe_worker.start()
+
+    def on_probe_result(self, result):
+        self.server_model.set_probe_result(result)
+        if result['id'] == self.card_server_id:
+            self.server_card.set_probe_result(result)
+        latency_ms = result.get('roundtrip_ms') or result.get('tcp_ms')
+        if latency_ms is not None:
+            get_registry().record_latency(result['id'], latency_ms)
+
+    def on_probe_finished(self, ranked):
+        self.probe_worker = None
+        self.probe_action.setEnabled(True)
+        self.ranked_server_ids = [r['id'] for r in ranked if r.get('roundtrip_ms') is not None]
+        self.unhealthy_server_ids = {r['id'] for r in ranked if r.get('roundtrip_ms') is None}
+        self.prepare_standby()
+        if self.connect_to_fastest_pending:
+            self.connect_to_fastest_pending = False
+            if self.ranked_server_ids:
+                self.connect_to_fastest()
+            else:
+                self.show_message("No Reachable Servers", "None of your servers passed the latency test.")
+
+    def connect_to_fastest(self):
+        """Connects to the best-ranked server, probing all servers first if no ranking exists yet."""
+        if not self.ranked_server_ids:
+            if not self.server_model.rowCount():
+                self.show_message("No Servers", "Add a server before connecting.", informative=True)
+                return
+            self.connect_to_fastest_pending = True
+            self.probe_all_servers()
+            return
+        fastest_id = self.ranked_server_ids[0]
+        if fastest_id == self.active_connection_id:
+            return
+        config = self.server_model.config(fastest_id)
+        if config:
+            self.handle_connection_request(config, True)
+
+    def toggle_standby(self, enabled):
+        self.connection_manager.set_standby_enabled(enabled)
+        self.prepare_standby()
+
+    def toggle_native_engine(self, enabled):
+        """Switches new connections between ss-local and the built-in Shadowsocks engine."""
+        from core.connection import ENGINE_NATIVE, ENGINE_SS_LOCAL
+        self.connection_manager.engine = ENGINE_NATIVE if enabled else ENGINE_SS_LOCAL
+
+    def prepare_standby(self):
+        """Keeps a warm standby tunnel for the next-best server: the fastest by ranking, else the next saved one."""
+        if not self.connection_manager.standby_enabled or not self.active_connection_id:
+            return
+        candidates = self.ranked_server_ids or self.server_model.ids()
+        next_id = next((server_id for server_id in candidates if server_id != self.active_connection_id), None)
+        config = self.server_model.config(next_id)
+        if config:
+            self.connection_manager.prepare_standby(config)
+
+    def handle_failover(self, failed_server_id):
+        """Moves the connection to the next healthy server after the active one stopped responding."""
+        self.failover_tried_ids.add(failed_server_id)
+        ids = self.server_model.ids()
+        standby_id = self.connection_manager.standby_server_id()
+        if standby_id and standby_id not in self.failover_tried_ids:
+            next_id = standby_id
+        else:
+            start = ids.index(failed_server_id) + 1 if failed_server_id in ids else 0
+            rotated = ids[start:] + ids[:start]
+            next_id = next((server_id for server_id in rotated if server_id not in self.failover_tried_ids
+                            and server_id not in self.unhealthy_server_ids), None)
+
+        config = self.server_model.config(next_id)
+        if config is None:
+            self.health_monitor.complete_failover(False)
+            self.failover_tried_ids.clear()
+            self.connection_manager.disconnect()
+            self.set_server_state(self.active_connection_id, STATE_DISCONNECTED)
+            self.active_connection_id = None
+            self.update_global_ui_state()
+            self.tray_icon.showMessage("ProxyPal", "Connection lost and no other server is reachable.",
+                                       QSystemTrayIcon.MessageIcon.Warning)
+            return
+        print(f"Failing over from {failed_server_id} to {next_id}")
+        self.connect_server(config)
+
+    def show_balance_dialog(self):
+        configs = self.server_model.configs()
+        if len(configs) < 2:
+            self.show_message("Load Balance", "Add at least two servers to balance across.", informative=True)
+            return
+        from core.balancer import POLICIES
+        dialog = BalanceDialog(configs, POLICIES, self)
+        if dialog.exec():
+            selected = dialog.get_selected_configs()
+            if selected:
+                self.start_balancing(selected, dialog.get_policy())
+
+    def start_balancing(self, configs, policy):
+        """Replaces the single active connection with a load-balanced set of tunnels."""
+        self.cancel_failover()
+        self.health_monitor.stop()
+        if self.active_connection_id:
+            self.set_server_state(self.active_connection_id, STATE_DISCONNECTED)
+            self.active_connection_id = None
+        self.clear_balanced_servers()
+        selected_ids = {config['id'] for config in configs}
+        for server_id in selected_ids:
+            self.set_server_state(server_id, STATE_CONNECTING)
+        self.connection_manager.connect_balanced(configs, policy, self.on_balanced_result)
+
+    def on_balanced_result(self, success, message, port, server_id):
+        self.set_server_state(server_id, STATE_CONNECTED if success else STATE_DISCONNECTED)
+        if success:
+            self.balanced_server_ids.add(server_id)
+        else:
+            print(f"Load balancer: {server_id} could not be started")
+        self.update_global_ui_state()
+
+    def clear_balanced_servers(self):
+        for server_id in self.balanced_server_ids:
+            self.set_server_state(server_id, STATE_DISCONNECTED)
+        self.balanced_server_ids.clear()
+        self.update_global_ui_state()
+
+    def update_stats(self):
+        """Refreshes the live traffic figures on the active card and in the tray menu."""
+        stats = self.connection_manager.get_stats()
+        if stats is None:
+            self.stats_timer.stop()
+            self.traffic_action.setVisible(False)
+            self.usage_totals = None
+            return
+        if self.active_connection_id is not None:
+            if self.active_connection_id == self.card_server_id:
+                self.server_card.set_stats(stats)
+            self.record_usage(stats)
+        text = format_stats(stats)
+        self.traffic_action.setText(text)
+        self.traffic_action.setVisible(bool(text))
+
+    def record_usage(self, stats):
+        """Adds the traffic since the previous sample to the active server's stored usage."""
+        totals = stats['bytes_in'], stats['bytes_out']
+        if None in totals:
+            return
+        previous = self.usage_totals
+        if previous is None or totals[0] < previous[0] or totals[1] < previous[1]:
+            # A new tunnel's counters start from zero.
+            previous = (0, 0)
+        if totals != previous:
+            get_registry().record_usage(self.active_connection_id, totals[0] - previous[0], totals[1] - previous[1])
+        self.usage_totals = totals
+
     def update_global_ui_state(self):
+        if self.balanced_server_ids or self.active_connection_id is not None:
+            if not self.stats_timer.isActive():
+                self.stats_timer.start()
+        else:
+            self.stats_timer.stop()
+            self.traffic_action.setVisible(False)
+        if self.balanced_server_ids:
+            self.update_tray_icon(connected=True)
+            self.status_action.setText(f"Balancing across {len(self.balanced_server_ids)} servers")
+            return
         is_any_server_connected = self.active_connection_id is not None
         self.update_tray_icon(connected=is_any_server_connected)
         if is_any_server_connected:
@@ -180,16 +546,29 @@ class ProxyPalWindow(QMainWindow):
 
     def create_tray_icon(self):
         self.tray_icon = QSystemTrayIcon(self)
+        self.tray_icons = create_tray_icons()
+        self.tray_connected = False
         self.update_tray_icon(connected=False)
+        app = QApplication.instance()
+        for signal in (app.screenAdded, app.screenRemoved, app.primaryScreenChanged):
+            signal.connect(self.refresh_icons)
         tray_menu = QMenu()
         open_action = QAction("Open\t⌘O", self)
         open_action.triggered.connect(self.show_window)
         self.status_action = QAction("Disconnected", self)
         self.status_action.setEnabled(False)
+        self.traffic_action = QAction("", self)
+        self.traffic_action.setEnabled(False)
+        self.traffic_action.setVisible(False)
         quit_action = QAction("Quit\t⌘Q", self)
         quit_action.triggered.connect(self.quit_application)
         tray_menu.addAction(open_action)
         tray_menu.addAction(self.status_action)
+        tray_menu.addAction(self.traffic_action)
+        tray_menu.addSeparator()
+        tray_fastest_action = QAction("Connect to Fastest", self)
+        tray_fastest_action.triggered.connect(self.connect_to_fastest)
+        tray_menu.addAction(tray_fastest_action)
         tray_menu.addSeparator()
         tray_menu.addAction(quit_action)
         self.tray_icon.setContextMenu(tray_menu)
@@ -201,15 +580,31 @@ class ProxyPalWindow(QMainWindow):
         self.raise_()
 
     def update_tray_icon(self, connected: bool):
-        if connected:
-            icon = create_filled_icon(TRAY_ICON_CONNECTED, "#000000", size=48)
-        else:
-            icon = create_outlined_icon(TRAY_ICON_DISCONNECTED, "#000000", size=48)
-        icon.setIsMask(True)
-        self.tray_icon.setIcon(icon)
+        self.tray_connected = connected
+        self.tray_icon.setIcon(self.tray_icons[connected])
+
+    def refresh_icons(self, *args):
+        """Re-renders the pre-rendered tray icons after the theme or the screens' pixel ratio changed."""
+        if self.tray_icon is None:
+            return
+        self.tray_icons = create_tray_icons()
+        self.update_tray_icon(self.tray_connected)
+
+    def event(self, event):
+        if event.type() == QEvent.Type.Paint and not self.startup_scheduled:
+            # Runs after this first frame has been painted.
+            self.startup_scheduled = True
+            QTimer.singleShot(0, self.finish_startup)
+        elif event.type() == QEvent.Type.DevicePixelRatioChange:
+            self.refresh_icons()
+        return super().event(event)
 
     def quit_application(self):
+        self.subscription_manager.stop()
+        self.health_monitor.stop()
         self.connection_manager.disconnect()
+        self.connection_manager.stop_services()
+        get_registry().flush()
         self.tray_icon.hide()
         QApplication.instance().quit()
 
@@ -223,10 +618,61 @@ class ProxyPalWindow(QMainWindow):
         add_action = QAction(create_filled_icon(ADD_ICON_PATH, "#263238"), "Add Server", self)
         add_action.triggered.connect(self.show_add_server_dialog)
         file_menu.addAction(add_action)
+        self.import_action = QAction("Import Servers...", self)
+        self.import_action.triggered.connect(self.show_import_dialog)
+        file_menu.addAction(self.import_action)
+        subscriptions_action = QAction("Subscriptions...", self)
+        subscriptions_action.triggered.connect(lambda: SubscriptionDialog(self.subscription_manager, self).exec())
+        file_menu.addAction(subscriptions_action)
         file_menu.addSeparator()
         quit_action = QAction("Quit ProxyPal", self)
         quit_action.triggered.connect(self.hide)
         file_menu.addAction(quit_action)
+        servers_menu = menu_bar.addMenu("Servers")
+        self.probe_action = QAction("Test All Servers", self)
+        self.probe_action.triggered.connect(self.probe_all_servers)
+        servers_menu.addAction(self.probe_action)
+        fastest_action = QAction("Connect to Fastest", self)
+        fastest_action.triggered.connect(self.connect_to_fastest)
+        servers_menu.addAction(fastest_action)
+        servers_menu.addSeparator()
+        standby_action = QAction("Keep Warm Standby", self)
+        standby_action.setCheckable(True)
+        standby_action.toggled.connect(self.toggle_standby)
+        servers_menu.addAction(standby_action)
+        balance_action = QAction("Load Balance...", self)
+        balance_action.triggered.connect(self.show_balance_dialog)
+        servers_menu.addAction(balance_action)
+        self.engine_action = QAction("Use Built-in Engine", self)
+        self.engine_action.setCheckable(True)
+        self.engine_action.setEnabled(False)
+        self.engine_action.toggled.connect(self.toggle_native_engine)
+        servers_menu.addAction(self.engine_action)
+        servers_menu.addSeparator()
+        self.service_actions = {}
+        self._add_service_actions(servers_menu, "http_proxy", "Run HTTP Proxy", "Copy HTTP Proxy Address",
+                                  self.copy_http_proxy_address)
+        self._add_service_actions(servers_menu, "dns", "Run DNS Server", "Copy DNS Server Address",
+                                  self.copy_dns_address)
+        split_menu = servers_menu.addMenu("Split Tunneling")
+        self._add_service_actions(split_menu, "pac", "Serve PAC File", "Copy PAC URL", self.copy_pac_url)
+        self._add_service_actions(split_menu, "router", "Run Routing Proxy", "Copy Routing Proxy Address",
+                                  self.copy_router_address)
+        split_menu.addSeparator()
+        rules_action = QAction("Open Rules Folder", self)
+        rules_action.triggered.connect(self.open_rules_folder)
+        split_menu.addAction(rules_action)
+        reload_rules_action = QAction("Reload Rules", self)
+        reload_rules_action.triggered.connect(lambda: self.connection_manager.reload_rules())
+        split_menu.addAction(reload_rules_action)
+        # These need the managers created by finish_startup(), which enables them.
+        self.startup_actions = [subscriptions_action, self.probe_action, fastest_action, standby_action,
+                                balance_action, reload_rules_action, *self.service_actions.values()]
+        for action in self.startup_actions:
+            action.setEnabled(False)
+        log_action = QAction("Tunnel Log", self)
+        log_action.triggered.connect(self.show_log_dialog)
+        servers_menu.addAction(log_action)
         help_menu = menu_bar.addMenu("Help")
         feedback_action = QAction(create_filled_icon(FEEDBACK_ICON_PATH, "#263238"), "Submit Feedback", self)
         feedback_action.triggered.connect(self.show_feedback_dialog)
@@ -237,6 +683,27 @@ class ProxyPalWindow(QMainWindow):
                                       informative=True))
         help_menu.addAction(contact_action)
 
+    def _add_service_actions(self, menu, name, title, copy_title, copy_slot):
+        """Adds a checkable action that runs one of the local services, and one that copies its address."""
+        toggle = QAction(title, self)
+        toggle.setCheckable(True)
+        # Only the user's choice is saved; a service that fails to start is unchecked without turning it off.
+        toggle.triggered.connect(lambda enabled: self.connection_manager.set_service_enabled(name, enabled))
+        copy_action = QAction(copy_title, self)
+        copy_action.setEnabled(False)
+        copy_action.triggered.connect(copy_slot)
+        toggle.toggled.connect(copy_action.setEnabled)
+        menu.addAction(toggle)
+        menu.addAction(copy_action)
+        self.service_actions[name] = toggle
+
+    def on_service_failed(self, name, message):
+        """Unchecks a local service that could not listen and says why; it is tried again on the next launch."""
+        self.service_actions[name].setChecked(False)
+        self.show_message("Local Service Unavailable", f"{message}<br><br>It keeps its port, so the addresses "
+                                                       "configured for it stay valid, and starts again with ProxyPal. "
+                                                       "To use it now, free the port and turn it on again.")
+
     def show_add_server_dialog(self):
         clipboard = QApplication.clipboard()
         clipboard_text = clipboard.text().strip()
@@ -253,11 +720,106 @@ class ProxyPalWindow(QMainWindow):
             if key:
                 self.add_server(key)
 
+    def copy_pac_url(self):
+        pac_server = self.connection_manager.services["pac"]
+        QApplication.clipboard().setText(pac_server.url)
+        self.show_message("Split Tunneling", f"Copied <b>{pac_server.url}</b>.<br><br>Use it as the automatic proxy "
+                                             "configuration URL in System Settings, or run "
+                                             f"<code>./proxy_manager.sh pac {pac_server.listen_port}</code>.",
+                          informative=True)
+
+    def copy_router_address(self):
+        router = self.connection_manager.services["router"]
+        QApplication.clipboard().setText(router.address)
+        self.show_message("Split Tunneling", f"Copied <b>{router.address}</b>.<br><br>Use it as the SOCKS5 proxy of "
+                                             "any app, or system-wide with "
+                                             f"<code>./proxy_manager.sh start {router.listen_port}</code>, to have "
+                                             "each connection go direct, through the tunnel or be blocked "
+                                             "according to the rule files.",
+                          informative=True)
+
+    def copy_http_proxy_address(self):
+        http_proxy = self.connection_manager.services["http_proxy"]
+        QApplication.clipboard().setText(http_proxy.address)
+        self.show_message("HTTP Proxy", f"Copied <b>{http_proxy.address}</b>.<br><br>Use it as the HTTP and HTTPS "
+                                        "proxy of tools that cannot use SOCKS5, e.g. "
+                                        f"<code>export https_proxy=http://{http_proxy.address}</code>, or "
+                                        f"system-wide with <code>./proxy_manager.sh http {http_proxy.listen_port}"
+                                        "</code>.",
+                          informative=True)
+
+    def copy_dns_address(self):
+        resolver = self.connection_manager.services["dns"]
+        QApplication.clipboard().setText(resolver.address)
+        stats = resolver.stats()
+        usage = f"{stats['hit_rate']:.0%} of {stats['queries']} queries answered from the cache." \
+            if stats["hit_rate"] is not None else "No lookups yet."
+        self.show_message("DNS Server", f"Copied <b>{resolver.address}</b>.<br><br>Lookups sent here are answered "
+                                        "from a cache or resolved through the tunnel, e.g. "
+                                        f"<code>dig @127.0.0.1 -p {resolver.listen_port} example.com</code>. On "
+                                        "macOS, a file in <code>/etc/resolver/</code> with <code>nameserver "
+                                        f"127.0.0.1</code> and <code>port {resolver.listen_port}</code> sends a "
+                                        f"domain's lookups here.<br><br>{usage}",
+                          informative=True)
+
+    def open_rules_folder(self):
+        from core.rules import RULES_DIR, ensure_rule_files
+        ensure_rule_files()
+        QDesktopServices.openUrl(QUrl.fromLocalFile(str(RULES_DIR)))
+
+    def show_log_dialog(self):
+        if self.log_dialog is None:
+            self.log_dialog = LogDialog(self)
+        self.log_dialog.show()
+        self.log_dialog.raise_()
+        self.log_dialog.activateWindow()
+
+    def show_import_dialog(self):
+        dialog = ImportDialog(self)
+        if not dialog.exec():
+            return
+        path, text = dialog.get_file_path(), dialog.get_text()
+        if not path and not text.strip():
+            return
+        self.import_action.setEnabled(False)
+        self.import_progress = QProgressDialog("Reading access keys...", "Cancel", 0, 0, self)
+        self.import_progress.setWindowTitle("Import Servers")
+        self.import_progress.setMinimumDuration(300)
+        from core.importer import ImportWorker
+        self.import_worker = ImportWorker(get_registry(), path=path, text=None if path else text)
+        self.import_worker.progress.connect(self.on_import_progress)
+        self.import_worker.finished.connect(self.on_import_finished)
+        self.import_progress.canceled.connect(self.import_worker.requestInterruption)
+        self.import_worker.start()
+
+    def on_import_progress(self, validated, read):
+        self.import_progress.setLabelText(f"Validated {validated:,} of {read:,} keys read so far...")
+
+    def on_import_finished(self, summary):
+        self.import_progress.close()
+        self.import_action.setEnabled(True)
+        self.import_worker = None
+        if summary["cancelled"]:
+            return
+        if summary.get("failed"):
+            self.show_message("Import Failed", f"<i style='color:#78909C'>{summary['errors'][0]}</i>")
+            return
+        added = summary["added"]
+        if added:
+            self._add_servers_to_ui(added)
+        text = f"Added {len(added):,} servers. Skipped {summary['duplicates']:,} duplicates"
+        text += f" and {summary['invalid']:,} invalid keys." if summary["invalid"] else "."
+        if summary["errors"]:
+            text += "<br><br><i style='color:#78909C'>" + "<br>".join(summary["errors"][:5]) + "</i>"
+        self.show_message("Import Complete", text, informative=True)
+
     def show_feedback_dialog(self):
         dialog = FeedbackDialog(self)
         if dialog.exec():
             feedback_message = dialog.get_feedback()
             if feedback_message:
+                # requests is only needed here, so it is not imported at startup.
+                import requests
                 formspree_url = "https://formspree.io/f/mvgqopya"
                 payload = {
                     "message": feedback_message,
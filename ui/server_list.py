@@ -0,0 +1,328 @@
+from PyQt6.QtWidgets import QApplication, QStyledItemDelegate, QStyle
+from PyQt6.QtGui import QColor, QFont, QFontMetrics
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QPointF, QRect, QSize, QSortFilterProxyModel, QTimer
+
+from .server_widget import STATE_CONNECTED, STATE_CONNECTING, STATE_DISCONNECTED
+from .theme import LIGHT_THEME
+
+CONFIG_ROLE = Qt.ItemDataRole.UserRole
+ID_ROLE = Qt.ItemDataRole.UserRole + 1
+STATE_ROLE = Qt.ItemDataRole.UserRole + 2
+LATENCY_ROLE = Qt.ItemDataRole.UserRole + 3
+PROBE_ROLE = Qt.ItemDataRole.UserRole + 4
+FILTER_ROLE = Qt.ItemDataRole.UserRole + 5
+
+SORT_KEYS = ("Order Added", "Name", "Host", "Latency")
+ROW_HEIGHT = 56
+# Removing more scattered rows than this resets the model instead, which is cheaper for the views.
+RESET_AFTER_RANGES = 50
+# Changes that affect the order, like a stream of probe results, are re-sorted together after this many ms.
+SORT_DELAY = 250
+
+
+def current_theme() -> dict:
+    return getattr(QApplication.instance(), "theme", None) or LIGHT_THEME
+
+
+class ServerListModel(QAbstractListModel):
+    """
+    The saved servers with each server's connection state and latency, sorted by one of SORT_KEYS.
+
+    Sorting is done here with sorted() rather than in a QSortFilterProxyModel, which would call data() from
+    Python for every comparison and take over a second for 10k servers. The configurations are the registry's
+    own dicts, so renames made through the registry show up after refresh().
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._configs = []
+        self._rows = {}
+        self._added = {}
+        self._next_added = 0
+        self._states = {}
+        self._probes = {}
+        self._latencies = {}
+        self.sort_key = SORT_KEYS[0]
+        self._sort_timer = QTimer(self)
+        self._sort_timer.setSingleShot(True)
+        self._sort_timer.setInterval(SORT_DELAY)
+        self._sort_timer.timeout.connect(self._sort)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._configs)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        config = self._configs[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return config.get("name", "Unknown Server")
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"{config.get('server')}:{config.get('server_port')}"
+        if role == CONFIG_ROLE:
+            return config
+        if role == ID_ROLE:
+            return config['id']
+        if role == STATE_ROLE:
+            return self._states.get(config['id'], STATE_DISCONNECTED)
+        if role == LATENCY_ROLE:
+            return self._latencies.get(config['id'])
+        if role == PROBE_ROLE:
+            return self._probes.get(config['id'])
+        if role == FILTER_ROLE:
+            return f"{config.get('name', '')}\n{config.get('server')}:{config.get('server_port')}"
+        return None
+
+    def _sort_function(self, key: str):
+        added = self._added
+        if key == "Name":
+            return lambda config: (config.get("name", "").casefold(), added[config['id']])
+        if key == "Host":
+            return lambda config: (config.get('server', '').lower(), int(config.get('server_port') or 0),
+                                   added[config['id']])
+        if key == "Latency":
+            latencies = self._latencies
+            infinity = float("inf")
+            return lambda config: (latencies.get(config['id'], infinity), added[config['id']])
+        return lambda config: added[config['id']]
+
+    def set_sort_key(self, key: str):
+        self.sort_key = key
+        self._sort()
+
+    def _schedule_sort(self, *keys):
+        if self.sort_key in keys and not self._sort_timer.isActive():
+            self._sort_timer.start()
+
+    def _sort(self):
+        """Reorders the rows, moving persistent indexes (the views' selection and current row) along with them."""
+        self._sort_timer.stop()
+        ordered = sorted(self._configs, key=self._sort_function(self.sort_key))
+        if all(a is b for a, b in zip(ordered, self._configs)):
+            return
+        self.layoutAboutToBeChanged.emit([], QAbstractListModel.LayoutChangeHint.VerticalSortHint)
+        old_indexes = self.persistentIndexList()
+        old_ids = [self._configs[index.row()]['id'] for index in old_indexes]
+        self._configs = ordered
+        self._rows = {config['id']: row for row, config in enumerate(ordered)}
+        self.changePersistentIndexList(old_indexes, [self.index(self._rows[server_id]) for server_id in old_ids])
+        self.layoutChanged.emit([], QAbstractListModel.LayoutChangeHint.VerticalSortHint)
+
+    def set_servers(self, configs: list, latencies: dict = None):
+        """Replaces all rows. latencies maps server ids to the last measured latency in milliseconds."""
+        self.beginResetModel()
+        self._added = {config['id']: added for added, config in enumerate(configs)}
+        self._next_added = len(configs)
+        self._states.clear()
+        self._probes.clear()
+        self._latencies = {server_id: latency for server_id, latency in (latencies or {}).items()
+                           if latency is not None}
+        self._configs = sorted(configs, key=self._sort_function(self.sort_key))
+        self._rows = {config['id']: row for row, config in enumerate(self._configs)}
+        self.endResetModel()
+
+    def add_servers(self, configs: list):
+        if not configs:
+            return
+        first = len(self._configs)
+        self.beginInsertRows(QModelIndex(), first, first + len(configs) - 1)
+        for row, config in enumerate(configs, first):
+            self._configs.append(config)
+            self._rows[config['id']] = row
+            self._added[config['id']] = self._next_added
+            self._next_added += 1
+        self.endInsertRows()
+        self._schedule_sort("Name", "Host", "Latency")
+
+    def remove_servers(self, server_ids):
+        """Removes the given servers, one contiguous range of rows at a time."""
+        rows = sorted((self._rows[server_id] for server_id in set(server_ids) if server_id in self._rows),
+                      reverse=True)
+        if not rows:
+            return
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][0] == row + 1:
+                ranges[-1][0] = row
+            else:
+                ranges.append([row, row])
+        removed = {self._configs[row]['id'] for row in rows}
+        if len(ranges) > RESET_AFTER_RANGES:
+            self.beginResetModel()
+            self._configs = [config for config in self._configs if config['id'] not in removed]
+            self.endResetModel()
+        else:
+            for first, last in ranges:
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self._configs[first:last + 1]
+                self.endRemoveRows()
+        self._rows = {config['id']: row for row, config in enumerate(self._configs)}
+        for server_id in removed:
+            self._added.pop(server_id, None)
+            self._states.pop(server_id, None)
+            self._probes.pop(server_id, None)
+            self._latencies.pop(server_id, None)
+
+    def replace_server(self, old_id: str, config: dict) -> bool:
+        """Puts a new configuration in a server's row, keeping its state and latency as the address is unchanged."""
+        row = self._rows.pop(old_id, None)
+        if row is None:
+            return False
+        self._configs[row] = config
+        self._rows[config['id']] = row
+        for values in (self._added, self._states, self._probes, self._latencies):
+            if old_id in values:
+                values[config['id']] = values.pop(old_id)
+        self._emit_changed(row)
+        self._schedule_sort("Name", "Host")
+        return True
+
+    def refresh(self, server_id: str):
+        """Repaints a server's row after its configuration was edited in place, e.g. renamed."""
+        row = self._rows.get(server_id)
+        if row is not None:
+            self._emit_changed(row)
+            self._schedule_sort("Name")
+
+    def set_state(self, server_id: str, state: str):
+        if server_id not in self._rows:
+            return
+        if state == STATE_DISCONNECTED:
+            self._states.pop(server_id, None)
+        else:
+            self._states[server_id] = state
+        self._emit_changed(self._rows[server_id])
+
+    def set_probe_result(self, result: dict):
+        server_id = result['id']
+        if server_id not in self._rows:
+            return
+        self._probes[server_id] = result
+        latency_ms = result.get('roundtrip_ms') or result.get('tcp_ms')
+        if latency_ms is None:
+            self._latencies.pop(server_id, None)
+        else:
+            self._latencies[server_id] = latency_ms
+        self._emit_changed(self._rows[server_id])
+        self._schedule_sort("Latency")
+
+    def _emit_changed(self, row: int):
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def contains(self, server_id: str) -> bool:
+        return server_id in self._rows
+
+    def config(self, server_id: str):
+        row = self._rows.get(server_id)
+        return None if row is None else self._configs[row]
+
+    def state(self, server_id: str) -> str:
+        return self._states.get(server_id, STATE_DISCONNECTED)
+
+    def probe_result(self, server_id: str):
+        return self._probes.get(server_id)
+
+    def index_of(self, server_id: str) -> QModelIndex:
+        row = self._rows.get(server_id)
+        return QModelIndex() if row is None else self.index(row)
+
+    def ids(self) -> list:
+        """Returns the server ids in the order they were added, whatever the display order."""
+        return sorted(self._rows, key=self._added.__getitem__)
+
+    def configs(self) -> list:
+        """Returns the configurations in the order they were added."""
+        return [self._configs[self._rows[server_id]] for server_id in self.ids()]
+
+
+class ServerFilterModel(QSortFilterProxyModel):
+    """Filters servers on their name, host and port, keeping the source model's order."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterRole(FILTER_ROLE)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+
+
+class ServerDelegate(QStyledItemDelegate):
+    """
+    Paints a server as a compact row: a status dot, the name and address, and the last measured latency.
+
+    Rows have a fixed height, so with QListView.setUniformItemSizes() only the visible rows are ever measured
+    or painted.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.name_font = QFont()
+        self.name_font.setPixelSize(14)
+        self.name_font.setWeight(QFont.Weight.Medium)
+        self.detail_font = QFont()
+        self.detail_font.setPixelSize(12)
+        self.name_metrics = QFontMetrics(self.name_font)
+        self.detail_metrics = QFontMetrics(self.detail_font)
+        self._colors = {}
+
+    def colors(self, theme: dict) -> dict:
+        colors = self._colors.get(id(theme))
+        if colors is None:
+            colors = {key: QColor(value) for key, value in theme.items() if isinstance(value, str)}
+            self._colors = {id(theme): colors}
+        return colors
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ROW_HEIGHT)
+
+    def latency_text(self, index, colors: dict) -> tuple:
+        probe = index.data(PROBE_ROLE)
+        if probe is not None:
+            if probe.get('roundtrip_ms') is not None:
+                return f"{probe['roundtrip_ms']:.0f} ms", colors["ACCENT_PRIMARY"]
+            if probe.get('tcp_ms') is not None:
+                return "Tunnel failed", colors["DISABLED_TEXT"]
+            return "Unreachable", colors["DISABLED_TEXT"]
+        latency = index.data(LATENCY_ROLE)
+        if latency is not None:
+            return f"{latency:.0f} ms", colors["SECONDARY_TEXT"]
+        return "", None
+
+    def paint(self, painter, option, index):
+        colors = self.colors(current_theme())
+        rect = option.rect
+        painter.save()
+        highlighted = option.state & (QStyle.StateFlag.State_Selected | QStyle.StateFlag.State_MouseOver)
+        painter.fillRect(rect, colors["HOVER_BACKGROUND" if highlighted else "CARD_BACKGROUND"])
+        painter.setPen(colors["BORDER"])
+        painter.drawLine(rect.left(), rect.bottom(), rect.right(), rect.bottom())
+
+        state = index.data(STATE_ROLE)
+        dot = {STATE_CONNECTED: "ACCENT_PRIMARY", STATE_CONNECTING: "SECONDARY_TEXT"}.get(state, "DISABLED_TEXT")
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(colors[dot])
+        painter.drawEllipse(QPointF(rect.left() + 20, rect.top() + rect.height() / 2), 5, 5)
+
+        latency, latency_color = self.latency_text(index, colors)
+        latency_width = self.detail_metrics.horizontalAdvance(latency) if latency else 0
+        right = rect.right() - 16
+        text_left = rect.left() + 36
+        text_width = max(0, right - text_left - latency_width - 12)
+        if latency:
+            painter.setFont(self.detail_font)
+            painter.setPen(latency_color)
+            painter.drawText(QRect(right - latency_width, rect.top(), latency_width, rect.height()),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, latency)
+
+        name = self.name_metrics.elidedText(index.data(), Qt.TextElideMode.ElideRight, text_width)
+        painter.setFont(self.name_font)
+        painter.setPen(colors["PRIMARY_TEXT"])
+        painter.drawText(QRect(text_left, rect.top() + 8, text_width, 20),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, name)
+        address = self.detail_metrics.elidedText(index.data(Qt.ItemDataRole.ToolTipRole),
+                                                 Qt.TextElideMode.ElideRight, text_width)
+        painter.setFont(self.detail_font)
+        painter.setPen(colors["SECONDARY_TEXT"])
+        painter.drawText(QRect(text_left, rect.top() + 28, text_width, 18),
+                         Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, address)
+        painter.restore()
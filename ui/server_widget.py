@@ -6,9 +6,38 @@ from PyQt6.QtCore import Qt, pyqtSignal, QSize
 from .status_indicator import PieStatusIndicator
 from .icons import create_filled_icon, MORE_VERT_ICON_PATH
 
+STATE_DISCONNECTED = "disconnected"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+
+
+def format_bytes(value: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def format_stats(stats: dict) -> str:
+    """Formats a ConnectionManager.get_stats() snapshot as a single line."""
+    parts = []
+    if stats.get("rate_in") is not None:
+        parts.append(f"↓ {format_bytes(stats['rate_in'])}/s  ↑ {format_bytes(stats['rate_out'])}/s")
+    elif stats.get("bytes_in") is not None:
+        parts.append(f"↓ {format_bytes(stats['bytes_in'])}  ↑ {format_bytes(stats['bytes_out'])}")
+    if stats.get("connections") is not None:
+        parts.append(f"{stats['connections']} conn")
+    if stats.get("cpu_percent") is not None:
+        parts.append(f"CPU {stats['cpu_percent']:.0f}%  {format_bytes(stats['rss'])}")
+    dns = stats.get("dns")
+    if dns and dns["hit_rate"] is not None:
+        miss = f", {dns['miss_ms']['median']:.0f} ms miss" if dns["miss_ms"] else ""
+        parts.append(f"DNS {dns['hit_rate']:.0%} cached{miss}")
+    return " · ".join(parts)
+
 
 class ServerWidget(QFrame):
-    """A widget card representing a single server, styled like Outline."""
+    """A widget card representing a single server, styled like Outline. show_server() points it at another one."""
     connect_request = pyqtSignal(dict, bool)
     delete_request = pyqtSignal(str)
     rename_request = pyqtSignal(str, str)
@@ -45,8 +74,12 @@ class ServerWidget(QFrame):
         self.server_name_label.setObjectName("ServerNameLabel")
         self.server_ip_label = QLabel(f"{self.server_config.get('server')}:{self.server_config.get('server_port')}")
         self.server_ip_label.setObjectName("ServerIpLabel")
+        self.latency_label = QLabel("")
+        self.latency_label.setObjectName("ServerLatencyLabel")
+        self.latency_label.hide()
         details_layout.addWidget(self.server_name_label)
         details_layout.addWidget(self.server_ip_label)
+        details_layout.addWidget(self.latency_label)
         top_layout.addLayout(details_layout)
         top_layout.addStretch()
 
@@ -65,8 +98,13 @@ class ServerWidget(QFrame):
         self.status_text_label = QLabel("Disconnected")
         self.status_text_label.setObjectName("StatusTextLabel")
         self.status_text_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.stats_label = QLabel("")
+        self.stats_label.setObjectName("ServerStatsLabel")
+        self.stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.stats_label.hide()
         status_layout.addWidget(self.pie_indicator, 1, Qt.AlignmentFlag.AlignCenter)
         status_layout.addWidget(self.status_text_label)
+        status_layout.addWidget(self.stats_label)
         main_layout.addLayout(status_layout, 1)
 
         self.connect_button = QPushButton("CONNECT")
@@ -84,6 +122,26 @@ class ServerWidget(QFrame):
         menu.addAction(forget_action)
         self.card_menu_button.setMenu(menu)
 
+    def update_config(self, config: dict):
+        """Shows a server's new details, e.g. after a subscription refresh, keeping the card and its state."""
+        self.server_config = config
+        self.server_name_label.setText(config.get("name", "Unknown Server"))
+        self.server_ip_label.setText(f"{config.get('server')}:{config.get('server_port')}")
+
+    def show_server(self, config: dict, state: str, probe_result: dict = None):
+        """Shows another server on the card, with its connection state and last probe result."""
+        self.update_config(config)
+        if state == STATE_CONNECTING:
+            self.is_connected = False
+            self.set_is_connecting()
+        elif (state == STATE_CONNECTED) != self.is_connected or not self.connect_button.isEnabled():
+            self.set_connection_state(state == STATE_CONNECTED)
+        self.stats_label.hide()
+        if probe_result:
+            self.set_probe_result(probe_result)
+        else:
+            self.latency_label.hide()
+
     def rename_server(self):
         new_name, ok = QInputDialog.getText(self, 'Rename Server', 'Enter new name:',
                                             text=self.server_config.get("name"))
@@ -121,6 +179,34 @@ class ServerWidget(QFrame):
             self.status_text_label.setText("Disconnected")
             self.status_text_label.setProperty("connected", False)
             self.connect_button.setText("CONNECT")
+            self.stats_label.hide()
 
         self.status_text_label.style().unpolish(self.status_text_label)
         self.status_text_label.style().polish(self.status_text_label)
+
+    def set_stats(self, stats: dict):
+        """Shows live traffic and resource usage while connected. Totals are kept in the tooltip."""
+        self.stats_label.setText(format_stats(stats))
+        if stats.get("bytes_in") is not None:
+            self.stats_label.setToolTip(f"Received {format_bytes(stats['bytes_in'])}, "
+                                        f"sent {format_bytes(stats['bytes_out'])}")
+        self.stats_label.setVisible(self.is_connected)
+
+    def set_probe_result(self, result: dict):
+        """Shows the latest latency probe result under the server address."""
+        if result.get("roundtrip_ms") is not None:
+            text = f"Ping {result['tcp_ms']:.0f} ms · Round-trip {result['roundtrip_ms']:.0f} ms"
+            reachable = True
+        elif result.get("tcp_ms") is not None:
+            text = f"Ping {result['tcp_ms']:.0f} ms · Tunnel failed"
+            reachable = False
+        else:
+            text = "Unreachable"
+            reachable = False
+        self.latency_label.setText(text)
+        self.latency_label.setToolTip(result.get("error") or "")
+        self.latency_label.setProperty("reachable", reachable)
+        self.latency_label.show()
+
+        self.latency_label.style().unpolish(self.latency_label)
+        self.latency_label.style().polish(self.latency_label)
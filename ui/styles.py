@@ -61,12 +61,26 @@ QLabel#ServerIpLabel {{
     color: {SECONDARY_TEXT};
 }}
 
+QLabel#ServerLatencyLabel {{
+    font-size: 12px;
+    color: {DISABLED_TEXT};
+}}
+
+QLabel#ServerLatencyLabel[reachable="true"] {{
+    color: {ACCENT_PRIMARY};
+}}
+
 QLabel#StatusTextLabel {{
     font-size: 16px;
     color: {SECONDARY_TEXT};
     font-weight: 500;
 }}
 
+QLabel#ServerStatsLabel {{
+    font-size: 12px;
+    color: {SECONDARY_TEXT};
+}}
+
 QLabel#StatusTextLabel[connected="true"] {{
     color: {ACCENT_PRIMARY};
 }}
@@ -94,14 +108,35 @@ QPushButton#CardMenuButton {{
     padding: 8px;
 }}
 
+/* Server List */
+QListView#ServerList {{
+    background-color: {CARD_BACKGROUND};
+    border: 1px solid {BORDER};
+    border-radius: 8px;
+    outline: none;
+}}
+
+QLineEdit#ServerSearch, QComboBox#ServerSort {{
+    background-color: {INPUT_BACKGROUND};
+    border: 1px solid {BORDER};
+    border-radius: 4px;
+    color: {PRIMARY_TEXT};
+    padding: 6px 8px;
+}}
+QLineEdit#ServerSearch:focus {{
+    border: 1px solid {ACCENT_PRIMARY};
+}}
+
 /* Dialog Styling */
-#AddServerDialog, #FeedbackDialog, QMessageBox {{
+#AddServerDialog, #FeedbackDialog, #BalanceDialog, #ImportDialog, #SubscriptionDialog, #LogDialog, QMessageBox {{
     background-color: {DIALOG_BACKGROUND};
 }}
-#AddServerDialog QLabel, #FeedbackDialog QLabel, QMessageBox QLabel {{
+#AddServerDialog QLabel, #FeedbackDialog QLabel, #BalanceDialog QLabel, #ImportDialog QLabel, #SubscriptionDialog QLabel,
+#LogDialog QLabel, QMessageBox QLabel {{
     color: {PRIMARY_TEXT};
 }}
-#AddServerDialog QPushButton, #FeedbackDialog QPushButton, QMessageBox QPushButton {{
+#AddServerDialog QPushButton, #FeedbackDialog QPushButton, #BalanceDialog QPushButton, #ImportDialog QPushButton,
+#SubscriptionDialog QPushButton, #LogDialog QPushButton, QMessageBox QPushButton {{
     background-color: {HOVER_BACKGROUND};
     color: {PRIMARY_TEXT};
     border: 1px solid {BORDER};
@@ -109,27 +144,35 @@ QPushButton#CardMenuButton {{
     border-radius: 4px;
     min-width: 80px;
 }}
-#AddServerDialog QPushButton:hover, #FeedbackDialog QPushButton:hover, QMessageBox QPushButton:hover {{
+#AddServerDialog QPushButton:hover, #FeedbackDialog QPushButton:hover, #BalanceDialog QPushButton:hover,
+#ImportDialog QPushButton:hover, #SubscriptionDialog QPushButton:hover, #LogDialog QPushButton:hover,
+QMessageBox QPushButton:hover {{
     background-color: {DIALOG_HOVER_BACKGROUND};
 }}
 
-#AddServerDialog QPushButton#ConfirmButton, #FeedbackDialog QPushButton#OkButton {{
+#AddServerDialog QPushButton#ConfirmButton, #FeedbackDialog QPushButton#OkButton, #BalanceDialog QPushButton#ConfirmButton,
+#ImportDialog QPushButton#ConfirmButton, #SubscriptionDialog QPushButton#ConfirmButton {{
     background-color: {ACCENT_PRIMARY};
     color: {ACCENT_TEXT};
     border: none;
 }}
-#AddServerDialog QPushButton#ConfirmButton:hover, #FeedbackDialog QPushButton#OkButton:hover {{
+#AddServerDialog QPushButton#ConfirmButton:hover, #FeedbackDialog QPushButton#OkButton:hover,
+#BalanceDialog QPushButton#ConfirmButton:hover, #ImportDialog QPushButton#ConfirmButton:hover,
+#SubscriptionDialog QPushButton#ConfirmButton:hover {{
     background-color: {ACCENT_PRIMARY_HOVER};
 }}
 
-#AddServerDialog QTextEdit, #FeedbackDialog QTextEdit {{
+#AddServerDialog QTextEdit, #FeedbackDialog QTextEdit, #BalanceDialog QListWidget, #BalanceDialog QComboBox,
+#ImportDialog QTextEdit, #SubscriptionDialog QListWidget, #SubscriptionDialog QLineEdit, #LogDialog QPlainTextEdit,
+#LogDialog QComboBox {{
     background-color: {INPUT_BACKGROUND};
     border: 1px solid {BORDER};
     border-radius: 4px;
     color: {PRIMARY_TEXT};
     padding: 8px;
 }}
-#AddServerDialog QTextEdit:focus, #FeedbackDialog QTextEdit:focus {{
+#AddServerDialog QTextEdit:focus, #FeedbackDialog QTextEdit:focus, #ImportDialog QTextEdit:focus,
+#SubscriptionDialog QLineEdit:focus {{
     border: 1px solid {ACCENT_PRIMARY};
 }}
 
@@ -174,8 +217,16 @@ QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
 """
 
 
+_stylesheets = {}
+
+
 def get_stylesheet(theme: dict) -> str:
     """
     Generates the full stylesheet by formatting the template with the given theme's colors.
+
+    The result is cached per theme dict, so switching back and forth reuses the same string.
     """
-    return STYLESHEET_TEMPLATE.format(**theme)
+    cached = _stylesheets.get(id(theme))
+    if cached is None or cached[0] is not theme:
+        cached = _stylesheets[id(theme)] = (theme, STYLESHEET_TEMPLATE.format(**theme))
+    return cached[1]
@@ -1,24 +1,76 @@
+import os
 import socket
+import threading
 
+# Lets the probe bind a port whose only sockets are closed connections in TIME_WAIT, as ss-local and asyncio
+# listeners can, so a port that just served a connection is not taken for busy. On Windows SO_REUSEADDR would also
+# allow binding a port another program is listening on, and asyncio does not set it there either.
+REUSE_ADDRESS = os.name == 'posix'
 
-def find_available_port(start_port: int) -> int:
+_reserved_ports = set()
+_reserved_lock = threading.Lock()
+
+
+def allocate_port(preferred: int = None, exact: bool = False) -> int:
     """
-    Finds an available TCP port on localhost, starting from a given port.
+    Reserves a free TCP port on localhost for a listener that will bind it shortly, e.g. a new ss-local.
+
+    The preferred port is taken if it can be bound, otherwise the operating system picks a free one, so this
+    costs one or two bind() calls instead of a scan. Reserved ports are never handed out twice, which keeps
+    tunnels started at the same time from racing for a port before either has bound it.
 
     Args:
-        start_port: The port number to start searching from.
+        preferred: A port to try first, such as the well-known 1080.
+        exact: Fail rather than fall back to another port when preferred is taken, for listeners whose address
+            is configured elsewhere and must not change.
 
     Returns:
-        An available port number.
+        The reserved port number. Hand it back with release_port() once its listener has stopped.
 
     Raises:
-        IOError: If no free ports are found.
+        IOError: If no free port could be bound, or with exact, if the preferred port is taken.
     """
-    port = start_port
-    while port < 65535:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            if s.connect_ex(('127.0.0.1', port)) != 0:
+    candidates = [preferred] if exact else ([preferred] if preferred else []) + [0] * 8
+    with _reserved_lock:
+        for candidate in candidates:
+            if candidate in _reserved_ports:
+                continue
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                if REUSE_ADDRESS:
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                try:
+                    s.bind(('127.0.0.1', candidate))
+                except OSError:
+                    continue
+                port = s.getsockname()[1]
+            # An OS-assigned port may still be reserved by a listener that has not bound it yet.
+            if port not in _reserved_ports:
+                _reserved_ports.add(port)
                 return port
-        port += 1
-    raise IOError("No free ports found on localhost.")
+    raise IOError(f"Port {preferred} is in use." if exact else "No free ports found on localhost.")
+
+
+def normalize_host(host: str) -> str:
+    """Returns the form of a server host used to compare addresses: lowercase, without IPv6 brackets."""
+    return host.strip('[]').lower()
+
+
+def release_port(port: int):
+    """Returns a port reserved by allocate_port() once nothing listens on it any more."""
+    with _reserved_lock:
+        _reserved_ports.discard(port)
 
+
+def is_port_open(port: int, host: str = '127.0.0.1') -> bool:
+    """
+    Checks whether something is accepting TCP connections on the given local port.
+
+    Args:
+        port: The port number to check.
+        host: The address to connect to.
+
+    Returns:
+        True if a listener accepted the connection.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        return s.connect_ex((host, port)) == 0
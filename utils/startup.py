@@ -0,0 +1,24 @@
+import time
+
+_start = time.perf_counter()
+_phases = []
+
+
+def mark(phase: str):
+    """Records the end of a startup phase. Cheap enough to leave in place when not profiling."""
+    _phases.append((phase, time.perf_counter()))
+
+
+def report() -> dict:
+    """
+    Returns the recorded phases, timed from when this module was first imported.
+
+    Returns:
+        {"phases": [{"phase": name, "ms": duration, "at_ms": time since start}], "total_ms": time to last phase}
+    """
+    phases = []
+    previous = _start
+    for phase, at in _phases:
+        phases.append({"phase": phase, "ms": round((at - previous) * 1000, 2), "at_ms": round((at - _start) * 1000, 2)})
+        previous = at
+    return {"phases": phases, "total_ms": phases[-1]["at_ms"] if phases else 0.0}